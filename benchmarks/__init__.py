@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# 性能基准脚本集合，使用方式见各模块的文档字符串。
@@ -0,0 +1,110 @@
+# benchmarks/bench_cleaner.py
+# Version: v3.8.0
+# Last Updated: 2026-10-17
+# Description: 章节清洗基准：旧版 BeautifulSoup(html.parser) 路径 vs. lxml 清洗引擎，输入完全相同。
+"""
+用法:
+    python -m benchmarks.bench_cleaner [book1.epub book2.epub ...] [--repeat N]   (在仓库根目录执行)
+不传 EPUB 时自动生成一本文字密集的合成书籍。两条路径的输出会做文本等价校验。
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import ebooklib
+from bs4 import BeautifulSoup
+from ebooklib import epub
+
+from core.html_cleaner import parse_body, inner_html
+
+
+def _rewrite(src):
+    return f"file:///tmp/images/{os.path.basename(src)}"
+
+
+def clean_bs4(content):
+    """v3.7.1 的清洗实现 (保留作为对照)"""
+    soup = BeautifulSoup(content, 'html.parser')
+    for img in soup.find_all('img'):
+        src = img.get('src')
+        if src: img['src'] = _rewrite(src)
+    return soup.find('body').decode_contents() if soup.find('body') else None
+
+
+def clean_lxml(content):
+    body = parse_body(content, _rewrite)
+    return inner_html(body) if body is not None else None
+
+
+def _plain_text(fragment):
+    return re.sub(r'\s+', '', re.sub(r'<[^>]+>', '', fragment or ''))
+
+
+def make_text_book(path, chapters=200, paragraphs=300):
+    book = epub.EpubBook()
+    book.set_identifier('bench-cleaner')
+    book.set_title('Cleaner Benchmark')
+    book.set_language('zh')
+    items = []
+    para = '<p>天地玄黄，宇宙洪荒。日月盈昃，辰宿列张。寒来暑往，秋收冬藏。</p>'
+    for i in range(chapters):
+        c = epub.EpubHtml(title=f'第{i + 1}章', file_name=f'c{i:04d}.xhtml',
+                          content=f'<html><body><h1>第{i + 1}章</h1>{para * paragraphs}'
+                                  f'<img src="../images/p{i}.jpg"/></body></html>')
+        book.add_item(c)
+        items.append(c)
+    # ebooklib 为 EpubHtml 写出的章节都带 XML 声明；另加一章原样写入、没有任何编码声明的章节 (部分制书工具的产物)
+    raw = epub.EpubItem(uid='raw', file_name='raw.xhtml', media_type='application/xhtml+xml',
+                        content=f'<html><body><h1>无声明章节</h1>{para * paragraphs}</body></html>'.encode('utf-8'))
+    book.add_item(raw)
+    book.toc = [epub.Link(c.file_name, c.title, c.file_name) for c in items]
+    book.spine = items + [raw]
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+
+
+def bench(paths, repeat):
+    print(f"{'书籍':<30} {'章节':>6} {'bs4 (s)':>10} {'lxml (s)':>10} {'加速比':>8}  等价")
+    for path in paths:
+        # 取 EPUB 中存储的原始字节：EpubHtml.get_content() 会重新序列化并补上 XML 声明，掩盖编码探测问题
+        docs = [i.content for i in epub.read_epub(path).get_items()
+                if i.get_type() == ebooklib.ITEM_DOCUMENT]
+
+        timings = {}
+        outputs = {}
+        for name, fn in (('bs4', clean_bs4), ('lxml', clean_lxml)):
+            best = None
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                outputs[name] = [fn(d) for d in docs]
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+
+        same = all(_plain_text(a) == _plain_text(b) and (a or '').count('<img') == (b or '').count('<img')
+                   for a, b in zip(outputs['bs4'], outputs['lxml']))
+        print(f"{os.path.basename(path)[:30]:<30} {len(docs):>6} {timings['bs4']:>10.3f} {timings['lxml']:>10.3f} "
+              f"{timings['bs4'] / max(timings['lxml'], 1e-9):>7.1f}x  {'✅' if same else '❌'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="章节清洗基准 (BeautifulSoup vs lxml)")
+    parser.add_argument('epubs', nargs='*')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.epubs:
+        bench(args.epubs, args.repeat)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic_text.epub')
+        make_text_book(path)
+        bench([path], args.repeat)
+
+
+if __name__ == '__main__':
+    main()
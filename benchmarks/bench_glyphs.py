@@ -0,0 +1,111 @@
+# benchmarks/bench_glyphs.py
+# Version: v3.8.0
+# Last Updated: 2026-10-17
+# Description: 字数统计准确度报告：内容流字形计数 (glyph) vs. extract_text 提取 (extract)，逐页对比误差与耗时。
+"""
+用法 (在仓库根目录执行):
+    python -m benchmarks.bench_glyphs [extra1.pdf extra2.pdf ...] [--scale S] [--no-convert] [--tolerance 0.02]
+
+- 语料：benchmarks.corpus 的 large_pdf (Type1 简单字体)，以及各合成 EPUB 经单文件模式转换得到的 PDF
+  (WeasyPrint 输出的 Type0 + ToUnicode 字体)；可追加任意 PDF。
+- 报告每个文件的总字数误差、逐页平均/最大绝对误差与两种方式的耗时；
+  任一文件的总字数相对误差超过 tolerance 时退出码为 1。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from pypdf import PdfReader
+
+from benchmarks.corpus import EPUB_GENERATORS, build_corpus
+from core.glyph_counter import count_pages
+from core.text_index import page_char_count
+from utils.logger import CallbackManager
+
+
+def _convert(corpus):
+    """单文件模式转换合成 EPUB；WeasyPrint 不可用时跳过"""
+    from core.converter import ConverterEngine
+    silent = CallbackManager(None, None, None)
+    pdfs = []
+    for name in EPUB_GENERATORS:
+        if name not in corpus: continue
+        src = corpus[name]
+        out = os.path.splitext(src)[0] + ".pdf"
+        settings = {'paper': 'A4', 'font_size': 12, 'margin_lr': 20, 'margin_tb': 20, 'mode': 'single',
+                    'render_cache': False}
+        ok, msg, _t, path, _cleanup = ConverterEngine(src, out, settings, silent).run()
+        if ok: pdfs.append(path or out)
+        else: print(f"  ⚠️ {name} 转换失败，跳过: {msg}")
+    return pdfs
+
+
+def measure(pdf_path):
+    """返回 (逐页 glyph 计数, 逐页 extract 计数, glyph 耗时, extract 耗时)；各自使用新的 PdfReader"""
+    t0 = time.perf_counter()
+    glyphs = count_pages(PdfReader(pdf_path))
+    t_glyph = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    chars = [page_char_count(page.extract_text() or "") for page in PdfReader(pdf_path).pages]
+    t_extract = time.perf_counter() - t0
+    return glyphs, chars, t_glyph, t_extract
+
+
+def report(pdfs, tolerance):
+    print(f"\n{'文件':<28} {'页数':>5} {'extract':>9} {'glyph':>9} {'总误差':>8} {'页均误差':>8} {'页最大':>6} "
+          f"{'extract(s)':>10} {'glyph(s)':>9} {'加速':>6}")
+    failures = 0
+    sum_chars = sum_glyphs = 0
+    sum_te = sum_tg = 0.0
+    for path in pdfs:
+        glyphs, chars, t_glyph, t_extract = measure(path)
+        total_c, total_g = sum(chars), sum(glyphs)
+        diffs = [abs(g - c) for g, c in zip(glyphs, chars)]
+        err = abs(total_g - total_c) / total_c if total_c else (0.0 if not total_g else 1.0)
+        page_err = sum(d / c for d, c in zip(diffs, chars) if c) / max(1, sum(1 for c in chars if c))
+        if err > tolerance: failures += 1
+        sum_chars += total_c
+        sum_glyphs += total_g
+        sum_te += t_extract
+        sum_tg += t_glyph
+        print(f"{os.path.basename(path)[:28]:<28} {len(chars):>5} {total_c:>9} {total_g:>9} {err:>7.2%} "
+              f"{page_err:>8.2%} {max(diffs, default=0):>6} {t_extract:>10.3f} {t_glyph:>9.3f} "
+              f"{t_extract / t_glyph if t_glyph else 0:>5.1f}x{'  ❌' if err > tolerance else ''}")
+
+    if sum_chars:
+        print(f"\n合计: extract {sum_chars} / glyph {sum_glyphs} 字，总误差 "
+              f"{abs(sum_glyphs - sum_chars) / sum_chars:.2%}，耗时 {sum_te:.2f}s -> {sum_tg:.2f}s "
+              f"({sum_te / sum_tg if sum_tg else 0:.1f}x)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字形计数准确度报告")
+    parser.add_argument('pdfs', nargs='*', help="额外参与对比的 PDF")
+    parser.add_argument('--scale', type=float, default=0.2, help="语料规模系数")
+    parser.add_argument('--no-convert', action='store_true', help="不转换合成 EPUB (仅 large_pdf 与额外 PDF)")
+    parser.add_argument('--tolerance', type=float, default=0.02, help="允许的总字数相对误差")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"生成语料 (scale={args.scale})...", flush=True)
+        corpus = build_corpus(os.path.join(work_dir, "corpus"), args.scale)
+        pdfs = [corpus['large_pdf']]
+        if not args.no_convert:
+            try:
+                pdfs.extend(_convert(corpus))
+            except (ImportError, OSError) as e:  # WeasyPrint 缺少原生库 (Pango 等) 时抛出 OSError
+                print(f"  ⚠️ 无法导入转换依赖，跳过 EPUB 语料: {e}")
+        pdfs.extend(args.pdfs)
+        failures = report(pdfs, args.tolerance)
+
+    print(f"\n超出误差上限的文件: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# benchmarks/bench_pipeline.py
+# Version: v3.8.0
+# Last Updated: 2026-10-17
+# Description: 端到端性能基准：在合成语料上计时转换 (各模式)、合并与分割工具，并与已保存的基线对比。
+"""
+用法 (在仓库根目录执行):
+    python -m benchmarks.bench_pipeline [--scale S] [--repeat N] [--only 关键字,...]
+                                        [--save-baseline] [--baseline PATH] [--tolerance 0.15]
+
+- 语料由 benchmarks.corpus 按 scale 确定性生成 (默认 0.2，约数分钟跑完)。
+- 每个用例取 repeat 次中的最短耗时；渲染缓存关闭，避免缓存命中掩盖真实耗时。
+- --save-baseline 将本次结果写为基线；否则与基线对比，耗时超出 (1 + tolerance) 倍即判定为回归，
+  存在回归时退出码为 1，便于接入 CI。基线与机器相关，不纳入版本库。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from pypdf import PdfReader
+
+from config import APP_VERSION
+from benchmarks.corpus import EPUB_GENERATORS, build_corpus
+from core.converter import ConverterEngine
+from core.merger import PDFMergerEngine
+from core.splitter import PDFSplitterEngine
+from utils.logger import CallbackManager
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MODES = ('single', 'split', 'auto')
+
+
+def _settings(mode, workers):
+    return {'paper': 'A4', 'font_size': 12, 'margin_lr': 20, 'margin_tb': 20, 'mode': mode,
+            'auto_merge': True, 'render_cache': False, 'workers': workers}
+
+
+def _clean_outputs(epub_path):
+    """删除上一次转换的产物 (单文件 PDF、分卷目录、合并全本)"""
+    base = os.path.splitext(epub_path)[0]
+    for path in (base + ".pdf", base + "_全本.pdf"):
+        if os.path.exists(path): os.remove(path)
+    if os.path.isdir(base + "_分卷"): shutil.rmtree(base + "_分卷")
+
+
+def _top_level_indices(pdf_path):
+    """一级目录节点在平铺目录 (与 split_by_toc_indices 的序号一致) 中的位置"""
+    indices = []
+    count = 0
+
+    def walk(nodes, top):
+        nonlocal count
+        for node in nodes:
+            if isinstance(node, list):
+                walk(node, False)
+            else:
+                if top: indices.append(count)
+                count += 1
+
+    walk(PdfReader(pdf_path).outline, True)
+    return indices
+
+
+def build_cases(corpus, work_dir, workers):
+    """返回 [(用例名, 准备函数, 计时函数)]；计时函数返回 (成功, 说明)"""
+    cases = []
+    silent = CallbackManager(None, None, None)
+
+    for name in EPUB_GENERATORS:
+        if name not in corpus: continue
+        src = corpus[name]
+        for mode in MODES:
+            def run(src=src, mode=mode):
+                ok, msg, _t, _path, _cleanup = ConverterEngine(
+                    src, os.path.splitext(src)[0] + ".pdf", _settings(mode, workers), silent).run()
+                return ok, msg
+            cases.append((f"convert/{name}/{mode}", lambda src=src: _clean_outputs(src), run))
+
+    pdf = corpus.get('large_pdf')
+    if pdf:
+        splitter = PDFSplitterEngine()
+        volumes_dir = os.path.join(work_dir, "volumes")
+        words_dir = os.path.join(work_dir, "by_words")
+        toc_dir = os.path.join(work_dir, "by_toc")
+
+        def reset(path):
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+
+        def info():
+            ok, pages, chars = splitter.get_pdf_info(pdf)
+            return ok, f"{pages} 页 / {chars} 字"
+
+        text_chars = {}
+
+        def by_words():
+            if 'n' not in text_chars: text_chars['n'] = splitter.get_pdf_info(pdf)[2]
+            return splitter.split_by_word_count(pdf, max(1, text_chars['n'] // 10), words_dir)
+
+        def by_toc():
+            return splitter.split_by_toc_indices(pdf, _top_level_indices(pdf), toc_dir)
+
+        def merge():
+            files = sorted(os.path.join(volumes_dir, f) for f in os.listdir(volumes_dir))
+            ok, out = PDFMergerEngine().merge(files, os.path.join(work_dir, "merged.pdf"), None)
+            return ok, out if not ok else f"{len(files)} 卷"
+
+        def prepare_merge():
+            if not os.listdir(volumes_dir):
+                splitter.split_by_toc_indices(pdf, range(len(splitter.get_toc(pdf))), volumes_dir)
+
+        os.makedirs(volumes_dir, exist_ok=True)
+        cases.extend([
+            ("splitter/get_pdf_info", lambda: None, info),
+            ("splitter/split_by_word_count", lambda: reset(words_dir), by_words),
+            ("splitter/split_by_toc_indices", lambda: reset(toc_dir), by_toc),
+            ("merger/merge", prepare_merge, merge),
+        ])
+    return cases
+
+
+def run_cases(cases, repeat, only):
+    results = {}
+    for name, prepare, fn in cases:
+        if only and not any(key in name for key in only): continue
+        best = None
+        note = ""
+        ok = True
+        for _ in range(repeat):
+            prepare()
+            t0 = time.perf_counter()
+            try:
+                ok, note = fn()
+            except Exception as e:
+                ok, note = False, str(e)
+            elapsed = time.perf_counter() - t0
+            if not ok: break
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {'seconds': round(best, 4) if ok else None, 'ok': ok, 'note': str(note)[:60]}
+        status = f"{best:9.3f}s" if ok else "     失败"
+        print(f"  {name:<42} {status}  {note if not ok else ''}", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """打印对比表；返回回归用例数"""
+    base = baseline.get('results', {})
+    regressions = 0
+    print(f"\n{'用例':<42} {'基线 (s)':>10} {'本次 (s)':>10} {'比值':>7}  结论")
+    for name, rec in results.items():
+        old = (base.get(name) or {}).get('seconds')
+        new = rec['seconds']
+        if new is None:
+            verdict, ratio = "❌ 失败", None
+            regressions += 1
+        elif not old:
+            verdict, ratio = "— 无基线", None
+        else:
+            ratio = new / old
+            if ratio > 1 + tolerance:
+                verdict = "🔺 回归"
+                regressions += 1
+            elif ratio < 1 - tolerance:
+                verdict = "🔻 提升"
+            else:
+                verdict = "= 持平"
+        print(f"{name:<42} {old if old else '-':>10} {new if new is not None else '-':>10} "
+              f"{f'{ratio:.2f}x' if ratio else '-':>7}  {verdict}")
+    return regressions
+
+
+def _meta(args):
+    try:
+        import weasyprint
+        wp_version = weasyprint.__version__
+    except Exception:
+        wp_version = "unknown"
+    return {'app_version': APP_VERSION, 'scale': args.scale, 'workers': args.workers, 'repeat': args.repeat,
+            'python': platform.python_version(), 'platform': platform.platform(), 'weasyprint': wp_version,
+            'time': time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EPUB2PDF 端到端性能基准")
+    parser.add_argument('--scale', type=float, default=0.2, help="语料规模系数")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=2, help="分卷模式渲染进程数")
+    parser.add_argument('--only', default="", help="只运行名称包含这些关键字的用例 (逗号分隔)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+    only = [k for k in args.only.split(',') if k]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"生成语料 (scale={args.scale})...", flush=True)
+        t0 = time.perf_counter()
+        corpus = build_corpus(os.path.join(work_dir, "corpus"), args.scale)
+        print(f"语料就绪，用时 {time.perf_counter() - t0:.1f}s", flush=True)
+        results = run_cases(build_cases(corpus, work_dir, args.workers), args.repeat, only)
+
+    report = {'meta': _meta(args), 'results': results}
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n未找到基线 {args.baseline}，可使用 --save-baseline 生成")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('meta', {}).get('scale') != args.scale:
+        print(f"\n⚠️ 基线 scale={baseline.get('meta', {}).get('scale')} 与本次 {args.scale} 不一致，对比仅供参考")
+    regressions = compare(results, baseline, args.tolerance)
+    print(f"\n回归用例: {regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
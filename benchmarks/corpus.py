@@ -0,0 +1,170 @@
+# benchmarks/corpus.py
+# Version: v3.8.0
+# Last Updated: 2026-10-17
+# Description: 合成基准语料：四类典型 EPUB (多小章节/单体 XHTML/图片密集/中文密集) 与带深层目录的大体积 PDF。
+"""
+所有生成器都是确定性的 (固定随机种子)，同一 scale 下多次生成的内容完全一致，保证基准结果可比。
+scale 为整体规模系数，1.0 约为一本中等长度的网文。
+"""
+
+import io
+import os
+import random
+
+from ebooklib import epub
+from PIL import Image
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+_LATIN_WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+                "incididunt ut labore et dolore magna aliqua").split()
+
+
+def _cjk_text(rng, chars):
+    return ''.join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(chars))
+
+
+def _paragraphs(rng, count, chars):
+    return ''.join(f'<p>{_cjk_text(rng, chars)}。</p>' for _ in range(count))
+
+
+def _new_book(identifier, title):
+    book = epub.EpubBook()
+    book.set_identifier(identifier)
+    book.set_title(title)
+    book.set_language('zh')
+    return book
+
+
+def _finish_book(book, path, items, toc):
+    book.toc = toc
+    book.spine = items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+    return path
+
+
+def make_small_chapters(path, scale=1.0):
+    """多小章节：每章一个文件，结构规范 (分卷模式的典型输入)"""
+    rng = random.Random(1)
+    book = _new_book('bench-small', 'Small Chapters')
+    items = []
+    for i in range(max(2, int(300 * scale))):
+        c = epub.EpubHtml(title=f'第{i + 1}章', file_name=f'c{i:04d}.xhtml',
+                          content=f'<html><body><h1>第{i + 1}章</h1>{_paragraphs(rng, 20, 80)}</body></html>')
+        book.add_item(c)
+        items.append(c)
+    return _finish_book(book, path, items, [epub.Link(c.file_name, c.title, c.file_name) for c in items])
+
+
+def make_monolithic(path, scale=1.0):
+    """单体 XHTML：全部章节位于同一文件，目录以锚点区分 (密度检测判定为臃肿)"""
+    rng = random.Random(2)
+    book = _new_book('bench-mono', 'Monolithic')
+    chapters = max(2, int(200 * scale))
+    body = ''.join(f'<h2 id="s{i}">第{i + 1}章</h2>{_paragraphs(rng, 15, 80)}' for i in range(chapters))
+    c = epub.EpubHtml(title='正文', file_name='text.xhtml', content=f'<html><body>{body}</body></html>')
+    book.add_item(c)
+    toc = [epub.Link(f'text.xhtml#s{i}', f'第{i + 1}章', f's{i}') for i in range(chapters)]
+    return _finish_book(book, path, [c], toc)
+
+
+def make_image_heavy(path, scale=1.0):
+    """图片密集：每章数张大尺寸 JPEG，另有少量未被引用的图片 (检验按需提取)"""
+    rng = random.Random(3)
+    book = _new_book('bench-images', 'Image Heavy')
+    items = []
+    images = max(4, int(60 * scale))
+    for n in range(images + images // 4):
+        # 低分辨率噪声放大：近似扫描插图的体积与解码开销，又不至于让语料过大
+        img = Image.effect_noise((400, 600), 40 + n % 30).convert('RGB').resize((1600, 2400), Image.BICUBIC)
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=90)
+        book.add_item(epub.EpubItem(uid=f'img{n}', file_name=f'images/p{n:04d}.jpg',
+                                    media_type='image/jpeg', content=buf.getvalue()))
+    per_chapter = 3
+    for i in range(images // per_chapter):
+        imgs = ''.join(f'<p><img src="images/p{i * per_chapter + k:04d}.jpg"/></p>' for k in range(per_chapter))
+        c = epub.EpubHtml(title=f'插图{i + 1}', file_name=f'c{i:04d}.xhtml',
+                          content=f'<html><body><h1>插图{i + 1}</h1>{_paragraphs(rng, 3, 60)}{imgs}</body></html>')
+        book.add_item(c)
+        items.append(c)
+    return _finish_book(book, path, items, [epub.Link(c.file_name, c.title, c.file_name) for c in items])
+
+
+def make_cjk_dense(path, scale=1.0):
+    """中文密集：少量章节、超长段落 (考验排版与分块)"""
+    rng = random.Random(4)
+    book = _new_book('bench-cjk', 'CJK Dense')
+    items = []
+    for i in range(max(2, int(40 * scale))):
+        c = epub.EpubHtml(title=f'卷{i + 1}', file_name=f'v{i:03d}.xhtml',
+                          content=f'<html><body><h1>卷{i + 1}</h1>{_paragraphs(rng, 120, 400)}</body></html>')
+        book.add_item(c)
+        items.append(c)
+    return _finish_book(book, path, items, [epub.Link(c.file_name, c.title, c.file_name) for c in items])
+
+
+EPUB_GENERATORS = {
+    'small_chapters': make_small_chapters,
+    'monolithic': make_monolithic,
+    'image_heavy': make_image_heavy,
+    'cjk_dense': make_cjk_dense,
+}
+
+
+def _text_page(writer, font, lines):
+    page = writer.add_blank_page(width=595, height=842)
+    ops = ["BT /F1 10 Tf 12 TL 50 800 Td"]
+    for line in lines:
+        ops.append(f"({line}) Tj T*")
+    ops.append("ET")
+    stream = DecodedStreamObject()
+    stream.set_data("\n".join(ops).encode('latin-1'))
+    page[NameObject('/Contents')] = writer._add_object(stream)
+    page[NameObject('/Resources')] = DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})})
+
+
+def make_large_pdf(path, scale=1.0, depth=3, fanout=5):
+    """
+    大体积 PDF：每页约 60 行可提取文本 (Helvetica)，目录为 depth 层、每层 fanout 个子节点的树。
+    返回 (路径, 页数)。
+    """
+    rng = random.Random(5)
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+    pages = max(fanout ** depth, int(2000 * scale))
+    for _ in range(pages):
+        _text_page(writer, font, [' '.join(rng.choice(_LATIN_WORDS) for _ in range(12)) for _ in range(60)])
+
+    def add_level(parent, level, first, span, prefix):
+        step = max(1, span // fanout)
+        for k in range(fanout):
+            start = first + k * step
+            if start >= first + span: break
+            title = f"{prefix}{k + 1}"
+            item = writer.add_outline_item(title=f"Section {title}", page_number=start, parent=parent)
+            if level < depth: add_level(item, level + 1, start, step, title + ".")
+
+    add_level(None, 1, 0, pages, "")
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return path, pages
+
+
+def build_corpus(out_dir, scale=1.0, kinds=None):
+    """生成全部语料；返回 {名称: 路径}"""
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = {}
+    for name, gen in EPUB_GENERATORS.items():
+        if kinds and name not in kinds: continue
+        corpus[name] = gen(os.path.join(out_dir, f"{name}.epub"), scale)
+    if not kinds or 'large_pdf' in kinds:
+        corpus['large_pdf'] = make_large_pdf(os.path.join(out_dir, "large_pdf.pdf"), scale)[0]
+    return corpus
@@ -1,4 +1,61 @@
 # config.py
+import os
 
-LARGE_FILE_THRESHOLD_MB = 20
-APP_VERSION = "v3.7.1"
\ No newline at end of file
+LARGE_FILE_THRESHOLD_MB = 20  # [v3.8.0] 仅在成本模型特征提取失败时作为自动模式的兜底规则
+APP_VERSION = "v3.8.0"
+
+# [v3.8.0] 批量调度：同时转换的书籍数与内存预算
+BATCH_MAX_PARALLEL = 2
+BATCH_RAM_BUDGET_RATIO = 0.7  # 可用于转换任务的物理内存比例
+BATCH_JOB_RAM_ESTIMATE_MB = 1024  # 尚无实测数据时，单本书的内存预估
+
+# [v3.8.0] 单文件模式分块渲染：每块累计的 HTML 字符数上限 (决定峰值内存)
+SINGLE_CHUNK_CHARS = 1_000_000
+# 拼接分块时重建内部链接：WeasyPrint 锚点/链接坐标为 CSS px (96dpi)，换算为 PDF pt (72dpi)
+PX_TO_PT = 0.75
+
+# [v3.8.0] 内存看门狗：单本书进程树 RSS 超出预算时终止并降级重试
+WATCHDOG_MAX_RETRIES = 2  # 内存超限后的降级重试次数
+WATCHDOG_MIN_CHUNK_CHARS = 50_000  # 降级时分块上限的下限
+
+# [v3.8.0] 批量任务的阶段超时 (秒)：单次进入某阶段后持续超过该时长即判定为异常书籍并终止
+STAGE_TIMEOUTS = {
+    'read': 120,  # 读取 EPUB
+    'extract': 300,  # 解析/清洗 HTML、提取图片
+    'layout': 900,  # WeasyPrint 排版 (单个分块或章节)
+    'write': 600,  # 写出 PDF、拼接与合并
+}
+
+# [v3.8.0] 本地缓存根目录 (渲染缓存等)
+CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".epub2pdf")
+RENDER_CACHE_DIR = os.path.join(CACHE_ROOT, "render_cache")
+RENDER_CACHE_MAX_MB = 2048
+
+# [v3.8.0] 图片管线：降采样目标 DPI (0 表示不缩放)、JPEG 重压质量与处理结果缓存
+IMAGE_TARGET_DPI = 150
+IMAGE_JPEG_QUALITY = 85
+IMAGE_CACHE_DIR = os.path.join(CACHE_ROOT, "image_cache")
+IMAGE_CACHE_MAX_MB = 1024
+
+# [v3.8.0] 智能自动模式：成本模型的历史实测记录 (用于校准)
+COST_HISTORY_PATH = os.path.join(CACHE_ROOT, "cost_history.json")
+COST_HISTORY_MAX = 500
+
+# [v3.8.0] PDF 逐页文本索引 (按内容哈希)：统计与按字数分割共用；默认只存每页字数
+TEXT_INDEX_DIR = os.path.join(CACHE_ROOT, "text_index")
+TEXT_INDEX_MAX_MB = 256
+TEXT_INDEX_STORE_TEXT = False
+TEXT_EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # 建索引时的并行提取进程数
+TEXT_EXTRACT_MIN_PAGES = 200  # 页数少于此值时串行提取 (进程启动开销不划算)
+TEXT_EXTRACT_SHARD_PAGES = 50  # 每个分片的页数 (也是进度汇报的粒度)
+
+# [v3.8.0] 结构化计时：批次追踪文件 (JSONL，每个 span 一行) 的存放目录
+TRACE_DIR = os.path.join(CACHE_ROOT, "traces")
+
+# [v3.8.0] 合并：输入文件数达到此值时自动改用流式写出 (内存只取决于最大的单个输入)
+MERGE_STREAMING_MIN_FILES = 32
+# [v3.8.0] 合并预检：并发打开全部输入 (校验、页数、目录树)；文件数少于此值时在当前进程串行预检
+MERGE_PREFLIGHT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+MERGE_PREFLIGHT_MIN_FILES = 16
+# [v3.8.0] 合并/分割/拼接输出时合并内容相同的对象 (各分卷重复嵌入的字体程序、图片等)
+PDF_DEDUPE = True
@@ -0,0 +1,117 @@
+# core/analyzer.py
+# Version: v3.8.0_Fast_Analyzer
+# Last Updated: 2026-10-17
+# Description: Zip 级结构分析。只读取 container.xml、OPF 与 NCX/nav 三个成员，不解压正文与图片，毫秒级完成密度判定。
+
+import posixpath
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from urllib.parse import unquote
+
+NS = {
+    'c': 'urn:oasis:names:tc:opendocument:xmlns:container',
+    'opf': 'http://www.idpf.org/2007/opf',
+    'ncx': 'http://www.daisy.org/z3986/2005/ncx/',
+    'x': 'http://www.w3.org/1999/xhtml',
+}
+EPUB_TYPE = '{http://www.idpf.org/2007/ops}type'
+
+# 与 v3.5.1 密度检测保持一致的判定阈值
+DENSITY_THRESHOLD = 5.0
+
+
+def _resolve(base_dir, href):
+    """相对 href -> zip 内成员路径 (去除锚点)"""
+    href = unquote(href.split('#')[0])
+    return posixpath.normpath(posixpath.join(base_dir, href)) if href else ""
+
+
+def _ncx_hrefs(root, base_dir):
+    nav_map = root.find('ncx:navMap', NS)
+    if nav_map is None: return []
+    hrefs = []
+    for point in nav_map.findall('ncx:navPoint', NS):
+        content = point.find('ncx:content', NS)
+        hrefs.append(_resolve(base_dir, content.get('src', '')) if content is not None else "")
+    return hrefs
+
+
+def _nav_hrefs(root, base_dir):
+    for nav in root.iter(f"{{{NS['x']}}}nav"):
+        if 'toc' not in (nav.get(EPUB_TYPE) or '').split(): continue
+        ol = nav.find('x:ol', NS)
+        if ol is None: return []
+        hrefs = []
+        for li in ol.findall('x:li', NS):
+            a = li.find('x:a', NS)
+            if a is None: a = li.find('x:span', NS)
+            hrefs.append(_resolve(base_dir, a.get('href', '')) if a is not None else "")
+        return hrefs
+    return []
+
+
+def scan_epub(epub_path):
+    """
+    结构扫描，返回字典：
+    toc_count / file_count / density / is_monolithic —— 与 analyze_structure 相同的密度判定
+    spine_count —— spine 中的正文文件数
+    text_bytes / image_bytes / image_count —— 正文与图片的解压后体积合计 (来自 zip 目录，不解压)
+    files / images —— [(zip 内路径, 字节数), ...]
+    elapsed_ms —— 扫描耗时
+    """
+    start = time.perf_counter()
+    with zipfile.ZipFile(epub_path) as zf:
+        sizes = {info.filename: info.file_size for info in zf.infolist()}
+
+        container = ET.fromstring(zf.read('META-INF/container.xml'))
+        opf_path = container.find('.//c:rootfile', NS).get('full-path')
+        opf_dir = posixpath.dirname(opf_path)
+        opf = ET.fromstring(zf.read(opf_path))
+
+        manifest = {}
+        nav_path = None
+        images = []
+        for item in opf.findall('opf:manifest/opf:item', NS):
+            path = _resolve(opf_dir, item.get('href', ''))
+            media_type = item.get('media-type', '')
+            manifest[item.get('id')] = (path, media_type)
+            if 'nav' in (item.get('properties') or '').split(): nav_path = path
+            if media_type.startswith('image/') and path in sizes:
+                images.append((path, sizes[path]))
+
+        spine = opf.find('opf:spine', NS)
+        files = []
+        ncx_path = None
+        if spine is not None:
+            toc_id = spine.get('toc')
+            if toc_id in manifest: ncx_path = manifest[toc_id][0]
+            for ref in spine.findall('opf:itemref', NS):
+                entry = manifest.get(ref.get('idref'))
+                if entry: files.append((entry[0], sizes.get(entry[0], 0)))
+        if not ncx_path:
+            ncx_path = next((p for p, t in manifest.values() if t == 'application/x-dtbncx+xml'), None)
+
+        # 与 ebooklib (ignore_ncx=False) 一致：优先 NCX，缺失时使用 EPUB3 nav
+        toc_hrefs = []
+        if ncx_path and ncx_path in sizes:
+            toc_hrefs = _ncx_hrefs(ET.fromstring(zf.read(ncx_path)), posixpath.dirname(ncx_path))
+        if not toc_hrefs and nav_path and nav_path in sizes:
+            toc_hrefs = _nav_hrefs(ET.fromstring(zf.read(nav_path)), posixpath.dirname(nav_path))
+
+    toc_count = len(toc_hrefs)
+    file_count = len({h for h in toc_hrefs if h}) or 1
+    density = toc_count / file_count
+    return {
+        'toc_count': toc_count,
+        'file_count': file_count,
+        'density': density,
+        'is_monolithic': (density > DENSITY_THRESHOLD) or (toc_count > 50 and file_count < 5),
+        'spine_count': len(files),
+        'text_bytes': sum(size for _, size in files),
+        'image_bytes': sum(size for _, size in images),
+        'image_count': len(images),
+        'files': files,
+        'images': images,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
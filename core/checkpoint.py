@@ -0,0 +1,71 @@
+# core/checkpoint.py
+# Version: v3.8.0_Split_Checkpoint
+# Last Updated: 2026-10-17
+# Description: 分卷模式断点续传。_分卷 目录中的清单记录每个已完成分卷的章节哈希，重新运行时跳过仍然有效的分卷。
+
+import hashlib
+import json
+import os
+import tempfile
+
+from config import APP_VERSION
+
+MANIFEST_NAME = ".epub2pdf_manifest.json"
+
+
+def settings_fingerprint(css_string, settings):
+    """影响分卷输出的设置指纹：程序版本 + 生成的 CSS + 图片降采样参数"""
+    h = hashlib.sha256()
+    for part in (APP_VERSION, css_string, str(settings.get('image_dpi')), str(settings.get('image_quality'))):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class SplitManifest:
+    """
+    分卷清单 ({目录}/.epub2pdf_manifest.json)：
+    {"fingerprint": 设置指纹, "volumes": {文件名: {"key": 章节哈希, "size": 字节数}}}
+    - 设置指纹不一致时整体作废，重新开始记录。
+    - 分卷仅在 文件存在、大小一致、章节哈希一致 时视为有效。
+    - 每完成一卷即原子写回 (临时文件 + os.replace)，进程在任意时刻被杀都不会留下损坏的清单。
+    """
+
+    def __init__(self, target_dir, fingerprint):
+        self.path = os.path.join(target_dir, MANIFEST_NAME)
+        self.target_dir = target_dir
+        self.fingerprint = fingerprint
+        self.volumes = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get('fingerprint') == fingerprint:
+                self.volumes = data.get('volumes', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def is_valid(self, out_path, key):
+        entry = self.volumes.get(os.path.basename(out_path))
+        if not entry or entry.get('key') != key: return False
+        try:
+            return os.path.getsize(out_path) == entry.get('size')
+        except OSError:
+            return False
+
+    def mark(self, out_path, key):
+        try:
+            size = os.path.getsize(out_path)
+        except OSError:
+            return
+        self.volumes[os.path.basename(out_path)] = {'key': key, 'size': size}
+        self.save()
+
+    def save(self):
+        data = json.dumps({'fingerprint': self.fingerprint, 'volumes': self.volumes}, ensure_ascii=False)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.target_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
@@ -1,21 +1,29 @@
 # core/converter.py
-# Version: v3.6.1_Final_Lite
-# Last Updated: 2026-01-06
-# Description: 移除所有冗余的ETA时间计算代码；保留密度检测；仅专注于转换核心逻辑。
+# Version: v3.8.0_Chunked_Render
+# Last Updated: 2026-10-17
+# Description: [v3.8.0] 分卷模式多进程渲染；单文件模式分块排版，峰值内存不随书籍体积增长；各阶段结构化计时；
+#              分卷 + 自动合并可直接在内存中合成全本，一次写出。
 
 import os
+import shutil
 import tempfile
 import time
 
-import ebooklib
-from bs4 import BeautifulSoup
 from ebooklib import epub
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
 
-from config import LARGE_FILE_THRESHOLD_MB
+from config import LARGE_FILE_THRESHOLD_MB, SINGLE_CHUNK_CHARS
+from core.analyzer import scan_epub, DENSITY_THRESHOLD
+from core.checkpoint import SplitManifest, settings_fingerprint
+from core.cost_model import CostModel, extract_features
+from core.html_cleaner import parse_body, inner_html
+from core.html_slicer import SpineSlicer, body_blocks
+from core.images import ImagePipeline
 from core.merger import PDFMergerEngine
+from core.render_cache import RenderCache
+from core.render_pool import ChapterRenderPool, render_chunk_job, render_direct_job
 from utils.helpers import sanitize_filename
+from utils.memory import PeakRssSampler
+from utils.telemetry import Telemetry, file_size
 
 
 class ConverterEngine:
@@ -24,160 +32,274 @@ class ConverterEngine:
         self.output_path = os.path.abspath(output_path)
         self.settings = settings
         self.cb = callback_manager
-        self.image_manifest = {}
+        self.images = None
+        self.pool = None
         self.stop_flag = False
+        self.current_stage = None
+        # [v3.8.0] 结构化计时：各阶段 span 通过 CallbackManager 上报，结束时输出阶段耗时摘要
+        self.telemetry = Telemetry(callback_manager, os.path.basename(self.epub_path))
+        self.pages_total = 0
+        # [v3.8.0] 渲染缓存：相同 HTML + CSS + 图片 + WeasyPrint 版本的章节直接复用已渲染的 PDF
+        self.cache = RenderCache() if settings.get('render_cache', True) else None
 
     # =========================================================================
     # [v3.5.1] 密度检测算法 (保留)
     # 核心逻辑：计算“平均每个物理文件包含多少个章节”。
+    # [v3.8.0] 改为 zip 级扫描 (core.analyzer)，不再通过 read_epub 加载整本书。
     # =========================================================================
     @staticmethod
     def analyze_structure(epub_path):
         try:
-            book = epub.read_epub(epub_path, options={'ignore_ncx': False})
-            toc_count = len(book.toc)
-
-            unique_files = set()
-            for node in book.toc:
-                href = ""
-                if isinstance(node, tuple):
-                    if hasattr(node[0], 'href'): href = node[0].href
-                elif hasattr(node, 'href'):
-                    href = node.href
-                if href: unique_files.add(href.split('#')[0])
-
-            file_count = len(unique_files)
-            if file_count == 0: file_count = 1
-
-            density = toc_count / file_count
-            is_monolithic = (density > 5.0) or (toc_count > 50 and file_count < 5)
-
+            info = scan_epub(epub_path)
             report = (
                 f"📊 结构深度分析:\n"
-                f"• 逻辑章节: {toc_count} | 物理文件: {file_count}\n"
-                f"• 内容密度: {density:.2f} (阈值: 5.0)\n"
-                f"• 判定结果: {'⚠️ 结构臃肿/单体' if is_monolithic else '✅ 结构规范/散列'}"
+                f"• 逻辑章节: {info['toc_count']} | 物理文件: {info['file_count']}\n"
+                f"• 内容密度: {info['density']:.2f} (阈值: {DENSITY_THRESHOLD})\n"
+                f"• 判定结果: {'⚠️ 结构臃肿/单体' if info['is_monolithic'] else '✅ 结构规范/散列'}"
             )
-            return is_monolithic, report
+            return info['is_monolithic'], report
         except Exception as e:
             return False, f"分析失败: {str(e)}"
 
     def stop(self):
+        # [v3.8.0] 除设置标志外，立即强杀渲染池子进程，不必等待正在进行的 write_pdf 结束
         self.stop_flag = True
         self.cb.log("🛑 正在响应停止指令...")
+        if self.pool: self.pool.terminate()
 
     def _check_stop(self):
         if self.stop_flag: raise InterruptedError("用户手动中止")
 
+    def _stage(self, name):
+        """[v3.8.0] 阶段切换时上报 (read / extract / layout / write)，供调度器做阶段超时监控"""
+        if name != self.current_stage:
+            self.current_stage = name
+            self.cb.stage(name)
+
     def run(self):
         # start_time 仅用于最终日志的简要耗时记录，不参与逻辑控制
         start_time = time.time()
         self.stop_flag = False
         try:
-            file_size = os.path.getsize(self.epub_path) / (1024 * 1024)
             mode = self.settings.get('mode', 'auto')
 
             self.cb.log(f"开始任务: {os.path.basename(self.epub_path)}")
             self._check_stop()
+            self._stage('read')
+
+            # [v3.8.0] 特征提取供成本模型决策与校准；失败时退回文件体积规则
+            features = None
+            try:
+                with self.telemetry.span('features', bytes_in=file_size(self.epub_path)):
+                    features = extract_features(self.epub_path)
+            except Exception as e:
+                self.cb.log(f"特征提取失败，退回体积规则: {e}")
 
             is_split_mode = False
             if mode == 'split':
                 is_split_mode = True
             elif mode == 'single':
                 is_split_mode = False
+            elif features:
+                strategy, report = CostModel().choose(features, self.settings)
+                self.cb.log(report)
+                is_split_mode = (strategy == 'split')
             else:
-                is_split_mode = (file_size >= LARGE_FILE_THRESHOLD_MB)
-
-            success = False
-            result_msg = ""
-            final_path = ""
-            cleanup_path = None
-
-            if is_split_mode:
-                self.cb.log(">>> 执行标准分卷逻辑...")
-                success, files, folder = self.convert_split_mode()
-
-                if success and self.settings.get('auto_merge', True):
-                    self._check_stop()
-                    self.cb.log("正在执行合并...")
-                    merger = PDFMergerEngine()
-                    merge_out = os.path.join(os.path.dirname(self.epub_path),
-                                             f"{os.path.splitext(os.path.basename(self.epub_path))[0]}_全本.pdf")
-                    # 合并进度条
-                    ok, path = merger.merge(files, merge_out,
-                                            lambda c, t, m: self.cb.update_progress(90 + int(c / t * 10), m))
-                    if ok:
-                        result_msg = "分卷及合并完成"
-                        final_path = path
-                        cleanup_path = folder
-                    else:
-                        result_msg = "分卷完成，合并失败"
-                        final_path = folder
-                else:
-                    result_msg = "分卷已生成"
-                    final_path = folder
-            else:
-                self.cb.log(">>> 执行单文件逻辑...")
-                success, msg = self.convert_single_mode()
-                result_msg = msg
-                final_path = self.output_path
-
-            duration = int(time.time() - start_time)
-            m, s = divmod(duration, 60)
+                size_mb = os.path.getsize(self.epub_path) / (1024 * 1024)
+                is_split_mode = (size_mb >= LARGE_FILE_THRESHOLD_MB)
+
+            strategy = 'split' if is_split_mode else 'single'
+            with PeakRssSampler(os.getpid()) as rss, \
+                    self.telemetry.span('book', bytes_in=file_size(self.epub_path), strategy=strategy) as book_span:
+                success, result_msg, final_path, cleanup_path = self._execute(is_split_mode)
+                book_span['bytes_out'] = file_size(final_path)
+                book_span['pages'] = self.pages_total
+
+            summary = self.telemetry.summary()
+            if summary: self.cb.log(summary)
+            elapsed = time.time() - start_time
+            if success and features:
+                CostModel().record(features, strategy, self.settings, elapsed, rss.peak_mb)
+
+            m, s = divmod(int(elapsed), 60)
             return success, result_msg, f"{m}分{s}秒", final_path, cleanup_path
 
         except InterruptedError:
             return False, "任务中止", "0分0秒", "", None
         except Exception as e:
+            # 停止时渲染池被强杀，池内异常同样视为中止
+            if self.stop_flag: return False, "任务中止", "0分0秒", "", None
             return False, str(e), "0分0秒", "", None
 
+    def _execute(self, is_split_mode):
+        """执行选定的策略；返回 (success, result_msg, final_path, cleanup_path)"""
+        if is_split_mode:
+            merge_out = os.path.join(os.path.dirname(self.epub_path),
+                                     f"{os.path.splitext(os.path.basename(self.epub_path))[0]}_全本.pdf")
+            if self.settings.get('auto_merge', True) and self.settings.get('direct_merge', False):
+                self.cb.log(">>> 执行分卷直接合并逻辑 (不生成分卷文件)...")
+                success, msg = self.convert_split_direct(merge_out)
+                return success, msg, merge_out if success else "", None
+
+            self.cb.log(">>> 执行标准分卷逻辑...")
+            success, files, folder = self.convert_split_mode()
+
+            if success and self.settings.get('auto_merge', True):
+                self._check_stop()
+                self.cb.log("正在执行合并...")
+                self._stage('write')
+                merger = PDFMergerEngine(telemetry=self.telemetry, workers=self.settings.get('workers', 1))
+                # 合并进度条
+                ok, path = merger.merge(files, merge_out,
+                                        lambda c, t, m: self.cb.update_progress(90 + int(c / t * 10), m))
+                if ok:
+                    return success, "分卷及合并完成", path, folder
+                return success, "分卷完成，合并失败", folder, None
+            return success, "分卷已生成", folder, None
+
+        self.cb.log(">>> 执行单文件逻辑...")
+        success, msg = self.convert_single_mode()
+        return success, msg, self.output_path, None
+
     # === 单文件模式 ===
+    # [v3.8.0] 分块渲染：spine 按 HTML 体积切分为若干块逐块排版，每块写出后即释放布局树，
+    # 峰值内存只取决于块大小而非整本书；页码通过 @page :first 的 counter-reset 跨块连续，
+    # 目录由各块的书签 (层级/标题/页码) 统一重建。块边界即分页处：通常落在 spine 文件之间，
+    # 单个文件超过块大小时 (整本书存为一个 XHTML) 在其顶层块之间切分。
     def convert_single_mode(self):
         try:
-            # 这里的 start_t 仅用于控制台微观日志，不影响核心
-            start_t = time.time()
             self.cb.update_progress(10, "读取 EPUB...")
-            book = epub.read_epub(self.epub_path)
+            self._stage('read')
+            with self.telemetry.span('read', bytes_in=file_size(self.epub_path)):
+                book = epub.read_epub(self.epub_path)
             self._check_stop()
 
             with tempfile.TemporaryDirectory() as temp_dir:
-                self.cb.update_progress(20, "解压资源...")
-                self._extract_images_and_build_manifest(book, temp_dir)
+                self.cb.update_progress(20, "索引资源...")
+                self._build_image_pipeline(book, temp_dir)
+
+                # [v3.8.0] 分块在单个渲染子进程中排版 (子进程常驻 RenderContext，批量任务中跨书籍复用)，
+                # 停止时可直接强杀，不必等待正在进行的 write_pdf
+                self.pool = ChapterRenderPool(self._generate_css(), 1)
+                chunk_limit = self.settings.get('chunk_chars', SINGLE_CHUNK_CHARS)
 
-                full_html = []
+                chunk_html = []
+                chunk_size = 0
                 cover_html = self._get_cover_html(book, temp_dir)
-                if cover_html: full_html.append(cover_html)
+                if cover_html:
+                    chunk_html.append(cover_html)
+                    chunk_size += len(cover_html)
+
+                chunk_files = []
+                bookmarks = []
+                anchors = {}  # 锚点 -> (全局页码, x, y)，同名以首次出现为准
+                links = []  # 跨分块的内部链接 (全局页码, 锚点, 区域)
+                page_offset = 0
+                extract_s = 0.0  # 当前块累计的解析耗时
+
+                def flush():
+                    nonlocal chunk_html, chunk_size, page_offset, extract_s
+                    if not chunk_html: return
+                    self._check_stop()
+                    chunk_path = os.path.join(temp_dir, f"__chunk_{len(chunk_files):04d}.pdf")
+                    self.telemetry.emit('extract', extract_s, chapter=os.path.basename(chunk_path),
+                                        bytes_out=chunk_size)
+                    extract_s = 0.0
+                    pages, marks, chunk_anchors, chunk_links = self._render_chunk(
+                        ''.join(chunk_html), temp_dir, page_offset, chunk_path)
+                    bookmarks.extend((level, label, page_offset + p) for level, label, p in marks)
+                    for name, (p, x, y) in chunk_anchors.items():
+                        anchors.setdefault(name, (page_offset + p, x, y))
+                    links.extend((page_offset + p, name, rect) for p, name, rect in chunk_links)
+                    chunk_files.append(chunk_path)
+                    page_offset += pages
+                    chunk_html = []
+                    chunk_size = 0
 
                 self.cb.update_progress(30, "解析章节...")
                 total = len(book.spine)
                 for i, item_id in enumerate(book.spine):
                     self._check_stop()
+                    self._stage('extract')
                     item = book.get_item_with_id(item_id[0])
                     if item:
-                        c = self._clean_and_fix_html(item, temp_dir)
-                        if c: full_html.append(c)
+                        t0 = time.perf_counter()
+                        body = self._parse_and_fix_body(item, temp_dir)
+                        c = inner_html(body) if body is not None else None
+                        # 超过块大小的单个文件按顶层块切开，否则整本书存为一个文件时峰值内存不受块大小约束
+                        parts = body_blocks(body, chunk_limit) if c and len(c) > chunk_limit else [c]
+                        del body
+                        extract_s += time.perf_counter() - t0
+                        for part in parts:
+                            if part:
+                                chunk_html.append(part)
+                                chunk_size += len(part)
+                            if chunk_size >= chunk_limit:
+                                self.cb.log(f"渲染分块 {len(chunk_files) + 1} (已排 {page_offset} 页)...")
+                                flush()
                     if i % 10 == 0:
-                        elapsed = int(time.time() - start_t)
-                        self.cb.update_progress(30 + int(i / total * 30), f"解析中 {i}/{total}")
-
-                self.cb.log("生成排版 (CSS)...")
-                final_html = f"<html><body>{''.join(full_html)}</body></html>"
-                font_config = FontConfiguration()
-                css = CSS(string=self._generate_css(), font_config=font_config)
-
-                self.cb.update_progress(70, "渲染 PDF (WeasyPrint)...")
-                html = HTML(string=final_html, base_url=temp_dir)
+                        self.cb.update_progress(30 + int(i / total * 60), f"解析/排版中 {i}/{total}")
 
+                self.cb.update_progress(90, "渲染 PDF (WeasyPrint)...")
+                flush()
                 self._check_stop()
+
+                self._log_image_stats()
+                self._stage('write')
                 self.cb.log("写入磁盘 (IO)...")
-                html.write_pdf(self.output_path, stylesheets=[css], font_config=font_config)
+                if len(chunk_files) == 1:
+                    shutil.move(chunk_files[0], self.output_path)
+                elif chunk_files:
+                    self.cb.log(f"拼接 {len(chunk_files)} 个分块，共 {page_offset} 页")
+                    engine = PDFMergerEngine(telemetry=self.telemetry)
+                    ok, msg = engine.stitch(chunk_files, self.output_path, bookmarks, anchors=anchors, links=links)
+                    if not ok: raise RuntimeError(f"分块拼接失败: {msg}")
+                else:
+                    return False, "未找到可转换的正文"
 
             return True, f"转换成功"
         except Exception as e:
+            if self.pool: self.pool.shutdown(cancel=True)
             raise e
+        finally:
+            if self.pool: self.pool.shutdown()
+            self.pool = None
+
+    def _render_chunk(self, body_html, temp_dir, page_offset, out_path):
+        """排版单个分块并写盘；返回 (页数, [(层级, 标题, 块内页码)], 锚点, 跨块链接)，后两者供拼接时重建内部链接"""
+        html_string = f"<html><body>{body_html}</body></html>"
+        label = os.path.basename(out_path)
+        counter_css = f"@page :first {{ counter-reset: page {page_offset + 1}; }}" if page_offset else ""
+
+        cache_key = None
+        if self.cache:
+            # 起始页码影响页脚内容，需计入缓存键
+            cache_key = RenderCache.make_key(html_string, self._generate_css() + counter_css, temp_dir)
+            meta = self.cache.get(cache_key, out_path)
+            if meta and 'links' in meta:  # 旧缓存条目没有记录锚点，重新渲染
+                self.pages_total += meta['pages']
+                self.telemetry.emit('layout', 0.0, chapter=label, pages=meta['pages'], cache_hit=True)
+                return (meta['pages'], [tuple(m) for m in meta['bookmarks']],
+                        {name: tuple(a) for name, a in meta['anchors'].items()},
+                        [(p, name, tuple(rect)) for p, name, rect in meta['links']])
+
+        self._stage('layout')
+        pages, marks, anchors, links, stats = self.pool.call(render_chunk_job, html_string, temp_dir, out_path,
+                                             self.pool.css_string, counter_css, check_stop=self._check_stop)
+        self.telemetry.emit('layout', stats['layout_s'], chapter=label, bytes_in=len(html_string), pages=pages,
+                            peak_rss_mb=round(stats['peak_rss_mb'], 1))
+        self.telemetry.emit('write', stats['write_s'], chapter=label, bytes_out=file_size(out_path))
+        self.pages_total += pages
+
+        if cache_key:
+            self.cache.put(cache_key, out_path, meta={'pages': pages, 'bookmarks': marks, 'anchors': anchors,
+                                                      'links': links})
+        return pages, marks, anchors, links
 
     # === 分卷模式 (v3.6.1 极致精简版) ===
     # 删除了所有 ETA 计算代码，进度条只显示处理对象
+    # [v3.8.0] 章节渲染分发到进程池 (settings['workers'])，输出顺序与 NN_标题.pdf 命名不变
+    # [v3.8.0] 按锚点切片，单体 XHTML 的书籍也可直接分卷，不再需要强制单文件
     def convert_split_mode(self):
         try:
             epub_dir = os.path.dirname(self.epub_path)
@@ -185,70 +307,203 @@ class ConverterEngine:
             target_dir = os.path.join(epub_dir, folder_name)
             if not os.path.exists(target_dir): os.makedirs(target_dir)
 
-            book = epub.read_epub(self.epub_path)
+            self._stage('read')
+            with self.telemetry.span('read', bytes_in=file_size(self.epub_path)):
+                book = epub.read_epub(self.epub_path)
             if not book.toc: return False, [], None
 
-            generated = []
-
             with tempfile.TemporaryDirectory() as temp_dir:
-                self._extract_images_and_build_manifest(book, temp_dir)
-                font_config = FontConfiguration()
-                css = CSS(string=self._generate_css(), font_config=font_config)
+                self._build_image_pipeline(book, temp_dir)
+                # [v3.8.0] 章节排版交给渲染池，主进程只负责解析 HTML 与汇报进度
+                workers = self.settings.get('workers', 1)
+                css_string = self._generate_css()
+                cache_keys = {}
+                chapters = {}  # idx -> (标题, HTML 字节数)，供计时记录使用
+                # [v3.8.0] 断点续传：清单记录已完成分卷的章节哈希，重跑时跳过仍有效的分卷
+                manifest = None
+                if self.settings.get('resume', True):
+                    manifest = SplitManifest(target_dir, settings_fingerprint(css_string, self.settings))
+
+                def on_done(idx, out_path, stats):
+                    if self.cache and idx in cache_keys: self.cache.put(cache_keys[idx], out_path)
+                    if manifest and idx in cache_keys: manifest.mark(out_path, cache_keys[idx])
+                    title, size = chapters.get(idx, (None, 0))
+                    self.pages_total += stats['pages']
+                    self.telemetry.emit('layout', stats['duration_s'], chapter=title, bytes_in=size,
+                                        bytes_out=file_size(out_path), pages=stats['pages'],
+                                        peak_rss_mb=round(stats['peak_rss_mb'], 1))
+
+                pool = self.pool = ChapterRenderPool(css_string, workers, on_done=on_done)
+                if pool.workers > 1: self.cb.log(f"并行渲染: {pool.workers} 个进程")
 
                 total = len(book.toc)
-                for idx, node in enumerate(book.toc):
-                    self._check_stop()
-
-                    # [精简] 移除所有时间计算，只保留进度百分比和标题
-                    title = node.title if hasattr(node, 'title') else node[0].title
-                    safe_title = sanitize_filename(title)
-                    self.cb.update_progress(int((idx / total) * 90), f"处理: {safe_title}")
-
-                    hrefs = self._find_all_hrefs(node)
-                    chapter_html = []
-                    seen = set()
-                    for href in hrefs:
-                        parts = href.split('#');
-                        fname = parts[0];
-                        anchor = parts[1] if len(parts) > 1 else None
-                        if fname in seen and not anchor: continue
-                        seen.add(fname)
-                        item = book.get_item_with_href(fname)
-                        if item:
-                            c = self._clean_and_fix_html(item, temp_dir, anchor_id=anchor)
-                            if c: chapter_html.append(c)
-
-                    if chapter_html:
+                done = 0
+                hits = 0
+                resumed = 0
+                try:
+                    for idx, safe_title, html_string in self._iter_chapters(book, temp_dir):
+                        # [精简] 移除所有时间计算，只保留进度百分比和标题
+                        self.cb.update_progress(int((done / total) * 90), f"处理: {safe_title}")
+                        self._stage('layout')
                         out = os.path.join(target_dir, f"{idx + 1:02d}_{safe_title}.pdf")
-                        HTML(string=f"<html><body>{''.join(chapter_html)}</body></html>", base_url=temp_dir).write_pdf(
-                            out, stylesheets=[css], font_config=font_config)
-                        generated.append(out)
+                        chapters[idx] = (safe_title, len(html_string))
+                        if self.cache or manifest:
+                            cache_keys[idx] = RenderCache.make_key(html_string, css_string, temp_dir)
+                        if manifest and manifest.is_valid(out, cache_keys[idx]):
+                            pool.add_result(idx, out)
+                            done += 1
+                            resumed += 1
+                            continue
+                        if self.cache and self.cache.get(cache_keys[idx], out) is not None:
+                            if manifest: manifest.mark(out, cache_keys[idx])
+                            pool.add_result(idx, out)
+                            self.telemetry.emit('layout', 0.0, chapter=safe_title,
+                                                bytes_out=file_size(out), cache_hit=True)
+                            done += 1
+                            hits += 1
+                            continue
+                        done += pool.submit(idx, html_string, temp_dir, out)
+
+                    # 等待剩余章节完成，期间持续响应停止指令
+                    self._stage('layout')
+                    while pool.has_pending():
+                        self._check_stop()
+                        finished = pool.collect(timeout=0.5)
+                        if finished:
+                            done += finished
+                            self.cb.update_progress(int((done / total) * 90), f"渲染中 {done}/{total}")
+                except BaseException:
+                    pool.shutdown(cancel=True)
+                    raise
+                finally:
+                    self.pool = None
+
+                pool.shutdown()
+                generated = pool.ordered_results()
+                if resumed: self.cb.log(f"断点续传: 跳过已完成的 {resumed}/{len(generated)} 卷")
+                if hits: self.cb.log(f"渲染缓存命中 {hits}/{len(generated)} 章")
+                self._log_image_stats()
 
             return True, generated, target_dir
         except Exception as e:
             raise e
 
-    # === 辅助工具 ===
-    def _extract_images_and_build_manifest(self, b, t):
-        self.image_manifest = {}
-        for i in b.get_items():
+    # === 分卷 + 直接合并 ===
+    # [v3.8.0] auto_merge 且 direct_merge 时使用：章节在单个渲染子进程内逐个排版并保留 WeasyPrint 文档，
+    # 最后合成为一个文档一次写出全本，不写分卷文件、不经 pypdf 重新解析；停止时强杀该子进程。
+    # 目录与 PDFMergerEngine.merge 一致：每章一个一级书签，章内书签降一级挂在其下。
+    # 代价是全部章节的排版结果同时驻留内存 (成本模型按整本计算峰值)；不使用渲染缓存与断点续传。
+    def convert_split_direct(self, output_path):
+        self._stage('read')
+        with self.telemetry.span('read', bytes_in=file_size(self.epub_path)):
+            book = epub.read_epub(self.epub_path)
+        if not book.toc: return False, "EPUB 没有目录，无法按章节分卷"
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self._build_image_pipeline(book, temp_dir)
+            self.cb.update_progress(5, "解析章节...")
+            chapters = []
+            for _idx, safe_title, html_string in self._iter_chapters(book, temp_dir):
+                self._check_stop()
+                chapters.append((safe_title, html_string))
+            if not chapters: return False, "未找到可转换的正文"
+
+            def on_event(kind, n, total, title):
+                if kind != 'chapter': return
+                if n == total:
+                    self.cb.update_progress(90, f"写入全本 ({total} 章)...")
+                    self._stage('write')
+                else:
+                    self.cb.update_progress(int((n / total) * 90), f"排版: {title}")
+
+            self._stage('layout')
+            self.pool = ChapterRenderPool(self._generate_css(), 1)
+            try:
+                pages, stats, write_s, peak_mb = self.pool.call(
+                    render_direct_job, chapters, temp_dir, output_path, self.pool.css_string,
+                    check_stop=self._check_stop, on_event=on_event)
+            except BaseException:
+                self.pool.shutdown(cancel=True)
+                raise
+            finally:
+                self.pool = None
+
+            for (title, html_string), (_title, duration_s, chapter_pages) in zip(chapters, stats):
+                self.telemetry.emit('layout', duration_s, chapter=title, bytes_in=len(html_string),
+                                    pages=chapter_pages)
+            if not pages: return False, "未找到可转换的正文"
+            self._log_image_stats()
+            self.pages_total = pages
+            self.telemetry.emit('write', write_s, chapter=os.path.basename(output_path), pages=pages,
+                                bytes_out=file_size(output_path), peak_rss_mb=round(peak_mb, 1))
+        return True, "分卷排版并直接合并完成"
+
+    # [v3.8.0] 锚点切片：每个 spine 文件只解析一次，目录节点取 本锚点 -> 下一节点锚点 之间的内容
+    def _iter_chapters(self, book, temp_dir):
+        """按目录顺序产出 (序号, 安全标题, 章节 HTML)；没有正文的目录节点跳过"""
+        spine_items = [it for it in (book.get_item_with_id(i[0]) for i in book.spine) if it]
+        slicer = SpineSlicer(spine_items, lambda it: self._parse_and_fix_body(it, temp_dir))
+        starts = [slicer.locate((self._find_all_hrefs(node) or [None])[0]) for node in book.toc]
+
+        for idx, node in enumerate(book.toc):
             self._check_stop()
-            if i.get_type() == ebooklib.ITEM_IMAGE:
-                path = os.path.join(t, i.get_name())
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                with open(path, 'wb') as f: f.write(i.get_content())
-                self.image_manifest[os.path.basename(i.get_name())] = path
+            title = node.title if hasattr(node, 'title') else node[0].title
+            safe_title = sanitize_filename(title)
+
+            self._stage('extract')
+            t0 = time.perf_counter()
+            chapter_html = []
+            start = starts[idx]
+            end = next((loc for loc in starts[idx + 1:] if loc), None)
+            if start and (end is None or slicer.position(end) >= slicer.position(start)):
+                c = slicer.slice(start, end)
+                if c.strip(): chapter_html.append(c)
+                slicer.release(start[0])
+                if not chapter_html:
+                    # 多个目录节点指向同一文件 (无锚点或锚点找不到) 时切片为空：按 v3.7 行为渲染整个文件
+                    self.cb.log(f"⚠️ 目录节点《{title}》的锚点区间为空，改为渲染其指向的整个文件")
+            if not chapter_html:
+                # 目录指向 spine 之外、顺序错乱或切片为空：退回按文件整体读取
+                seen = set()
+                for href in self._find_all_hrefs(node):
+                    fname = href.split('#')[0]
+                    if fname in seen: continue
+                    seen.add(fname)
+                    c = self._clean_and_fix_html(book.get_item_with_href(fname), temp_dir)
+                    if c: chapter_html.append(c)
+
+            if not chapter_html:
+                self.cb.log(f"⚠️ 目录节点《{title}》没有可渲染的正文，已跳过")
+                continue
+            html_string = f"<html><body>{''.join(chapter_html)}</body></html>"
+            self.telemetry.emit('extract', time.perf_counter() - t0, chapter=safe_title,
+                                bytes_out=len(html_string))
+            yield idx, safe_title, html_string
 
-    def _clean_and_fix_html(self, item, temp_dir, anchor_id=None):
+    # === 辅助工具 ===
+    # [v3.8.0] 图片不再整体解压：仅建立索引，章节引用时由 ImagePipeline 按需提取并降采样
+    def _build_image_pipeline(self, book, temp_dir):
+        self.images = ImagePipeline(book, temp_dir, self.settings)
+
+    def _log_image_stats(self):
+        if self.images and self.images.resolved:
+            self.cb.log(f"图片: 引用 {len(self.images.resolved)}/{len(self.images.by_name)} 张，"
+                        f"{self.images.bytes_in / 1048576:.1f}MB -> {self.images.bytes_out / 1048576:.1f}MB")
+
+    # [v3.8.0] 清洗改用 lxml (core.html_cleaner)：解析、图片改写与 body 提取一次完成
+    def _parse_and_fix_body(self, item, temp_dir):
+        """解析章节并将图片地址改写为本地文件；返回 <body> 元素"""
         if not item: return None
-        soup = BeautifulSoup(item.get_content(), 'html.parser')
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src:
-                fname = os.path.basename(src)
-                if fname in self.image_manifest: img[
-                    'src'] = f"file:///{self.image_manifest[fname].replace(os.sep, '/')}"
-        return soup.find('body').decode_contents() if soup.find('body') else None
+
+        def rewrite(src):
+            path = self.images.resolve(src, item.get_name())
+            return f"file:///{path.replace(os.sep, '/')}" if path else None
+
+        return parse_body(item.get_content(), rewrite)
+
+    def _clean_and_fix_html(self, item, temp_dir):
+        body = self._parse_and_fix_body(item, temp_dir)
+        return inner_html(body) if body is not None else None
 
     def _find_all_hrefs(self, node):
         hrefs = []
@@ -0,0 +1,211 @@
+# core/cost_model.py
+# Version: v3.8.0_Cost_Model
+# Last Updated: 2026-10-17
+# Description: 智能自动模式的成本模型。根据正文体积、DOM 节点数、图片像素与目录密度预测两种策略的耗时与峰值内存，并用历史实测自我校准。
+
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+
+import psutil
+from PIL import Image
+
+from config import (COST_HISTORY_PATH, COST_HISTORY_MAX, BATCH_RAM_BUDGET_RATIO, SINGLE_CHUNK_CHARS)
+from core.analyzer import scan_epub
+
+_TAG_RE = re.compile(rb'<[^>]*>')
+
+# 初始系数 (先验值)。实际运行后由历史记录按策略整体缩放校准。
+BASE_MB = 150  # 解释器 + WeasyPrint 常驻开销
+LAYOUT_S_PER_HTML_MB = 12.0
+LAYOUT_S_PER_KNODE = 0.02
+LAYOUT_S_PER_MPIX = 0.08
+LAYOUT_S_FIXED = 2.0
+CHAPTER_OVERHEAD_S = 0.3  # 分卷：每章新建文档、写文件的固定开销
+MERGE_S_PER_CHAPTER = 0.05
+MEM_MB_PER_HTML_MB = 300  # 同时排版的 HTML 每 MB 对应的布局树内存
+MEM_MB_PER_MPIX = 4  # 解码后的位图 (RGBA)
+CHUNK_BYTES_PER_CHAR = 2  # 分块上限按字符计，折算字节时按平均每字符约 2 字节
+MIN_CALIBRATION_SAMPLES = 3
+HISTORY_LOCK_TIMEOUT_S = 5.0
+HISTORY_LOCK_STALE_S = 30.0  # 持锁进程崩溃遗留的锁文件，超过此时长视为失效
+
+
+@contextmanager
+def _history_lock(path):
+    """跨进程互斥 (O_EXCL 创建锁文件，Windows/POSIX 通用)；超时抛出 TimeoutError (OSError 子类)"""
+    lock = path + ".lock"
+    deadline = time.monotonic() + HISTORY_LOCK_TIMEOUT_S
+    while True:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > HISTORY_LOCK_STALE_S:
+                    os.remove(lock)
+                    continue
+            except OSError:
+                continue  # 锁刚被释放
+            if time.monotonic() > deadline: raise TimeoutError(f"等待锁超时: {lock}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+
+
+def extract_features(epub_path):
+    """
+    提取成本特征 (只读 zip，不经 ebooklib)：
+    html_mb / text_mchars —— spine 文档体积与去标签后的正文字符数 (百万)
+    largest_mb —— 最大的单个 spine 文档体积
+    knodes —— 元素节点数 (千)，按开始标签计数近似
+    mpix —— 全部图片的像素总数 (百万)，只读取图片头
+    chapters / density —— 目录章节数与密度
+    """
+    info = scan_epub(epub_path)
+    nodes = 0
+    chars = 0
+    pixels = 0
+    with zipfile.ZipFile(epub_path) as zf:
+        for path, _size in info['files']:
+            try:
+                data = zf.read(path)
+            except KeyError:
+                continue
+            nodes += data.count(b'<') - data.count(b'</') - data.count(b'<!') - data.count(b'<?')
+            chars += len(''.join(_TAG_RE.sub(b'', data).decode('utf-8', 'ignore').split()))
+        for path, _size in info['images']:
+            try:
+                with zf.open(path) as f:
+                    w, h = Image.open(f).size
+                pixels += w * h
+            except Exception:
+                continue
+
+    return {
+        'html_mb': info['text_bytes'] / (1024 * 1024),
+        'largest_mb': max((size for _path, size in info['files']), default=0) / (1024 * 1024),
+        'text_mchars': chars / 1e6,
+        'knodes': max(0, nodes) / 1000,
+        'mpix': pixels / 1e6,
+        'chapters': info['toc_count'],
+        'density': info['density'],
+    }
+
+
+class CostModel:
+    """
+    预测与选择：
+    - 单文件：串行分块排版；内存取决于块大小，且不低于最大的单个 spine 文档
+      (超大文件虽会按顶层块切开，但无法切分的大元素仍整体排版，按保守上界估计)。
+    - 分卷：按渲染进程数并行；内存为 (进程数 × 单章峰值)，另有每章固定开销与合并开销。
+    选择规则：排除预测内存超出预算的策略，在剩余策略中选预测耗时最短者；都超预算时选内存最小者。
+    校准：每次运行记录 (特征, 策略, 实测耗时, 实测峰值 RSS)，按策略取 实测/先验 之比的中位数作为缩放系数。
+    """
+
+    def __init__(self, history_path=COST_HISTORY_PATH):
+        self.history_path = history_path
+        self.history = self._load()
+
+    def _load(self):
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, list) else []
+        except (OSError, ValueError):
+            return []
+
+    # --- 先验模型 ---
+    @staticmethod
+    def _raw_predict(features, strategy, settings):
+        html_mb = features['html_mb']
+        layout_s = (LAYOUT_S_FIXED + LAYOUT_S_PER_HTML_MB * html_mb +
+                    LAYOUT_S_PER_KNODE * features['knodes'] + LAYOUT_S_PER_MPIX * features['mpix'])
+
+        if strategy == 'single':
+            chunk_mb = settings.get('chunk_chars', SINGLE_CHUNK_CHARS) * CHUNK_BYTES_PER_CHAR / (1024 * 1024)
+            chunk_mb = max(chunk_mb, features.get('largest_mb', 0))  # 旧历史记录没有该特征
+            share = min(1.0, chunk_mb / html_mb) if html_mb else 1.0
+            peak_mb = BASE_MB + MEM_MB_PER_HTML_MB * html_mb * share + MEM_MB_PER_MPIX * features['mpix'] * share
+            return layout_s, peak_mb
+
+        chapters = max(1, features['chapters'])
+        if settings.get('auto_merge', True) and settings.get('direct_merge', False):
+            # 直接合并：本进程串行排版，全部章节的排版结果驻留至全本写出
+            return (layout_s + CHAPTER_OVERHEAD_S * chapters,
+                    BASE_MB + MEM_MB_PER_HTML_MB * html_mb + MEM_MB_PER_MPIX * features['mpix'])
+        workers = max(1, min(int(settings.get('workers', 1) or 1), chapters))
+        time_s = (layout_s + CHAPTER_OVERHEAD_S * chapters) / workers
+        if settings.get('auto_merge', True): time_s += MERGE_S_PER_CHAPTER * chapters
+        per_worker = BASE_MB + (MEM_MB_PER_HTML_MB * html_mb + MEM_MB_PER_MPIX * features['mpix']) / chapters
+        return time_s, BASE_MB + workers * per_worker
+
+    def _calibration(self, strategy):
+        """返回 (耗时缩放, 内存缩放)；样本不足时为 1.0"""
+        time_ratios = []
+        mem_ratios = []
+        for rec in self.history:
+            if rec.get('strategy') != strategy: continue
+            raw_t, raw_m = self._raw_predict(rec['features'], strategy, rec['settings'])
+            if raw_t > 0 and rec.get('elapsed_s'): time_ratios.append(rec['elapsed_s'] / raw_t)
+            if raw_m > 0 and rec.get('peak_mb'): mem_ratios.append(rec['peak_mb'] / raw_m)
+        t = statistics.median(time_ratios) if len(time_ratios) >= MIN_CALIBRATION_SAMPLES else 1.0
+        m = statistics.median(mem_ratios) if len(mem_ratios) >= MIN_CALIBRATION_SAMPLES else 1.0
+        return t, m
+
+    def predict(self, features, strategy, settings):
+        raw_t, raw_m = self._raw_predict(features, strategy, settings)
+        t_scale, m_scale = self._calibration(strategy)
+        return raw_t * t_scale, raw_m * m_scale
+
+    # --- 决策 ---
+    def choose(self, features, settings):
+        """返回 (策略, 日志文本)"""
+        budget_mb = settings.get('ram_budget_mb') or \
+            psutil.virtual_memory().available / (1024 * 1024) * BATCH_RAM_BUDGET_RATIO
+
+        candidates = ['single'] + (['split'] if features['chapters'] > 0 else [])
+        predictions = {s: self.predict(features, s, settings) for s in candidates}
+        feasible = [s for s in candidates if predictions[s][1] <= budget_mb]
+        if feasible:
+            strategy = min(feasible, key=lambda s: predictions[s][0])
+        else:
+            strategy = min(candidates, key=lambda s: predictions[s][1])
+
+        names = {'single': '单文件', 'split': '分卷'}
+        detail = " | ".join(f"{names[s]} ≈{predictions[s][0]:.0f}秒/{predictions[s][1]:.0f}MB" for s in candidates)
+        return strategy, f"🧮 成本预测: {detail} (内存预算 {budget_mb:.0f}MB) -> 选择【{names[strategy]}】"
+
+    # --- 校准数据 ---
+    def record(self, features, strategy, settings, elapsed_s, peak_mb):
+        keys = ('workers', 'chunk_chars', 'auto_merge', 'direct_merge')
+        sample = {
+            'time': int(time.time()),
+            'features': features,
+            'strategy': strategy,
+            'settings': {k: settings[k] for k in keys if k in settings},
+            'elapsed_s': round(elapsed_s, 2),
+            'peak_mb': round(peak_mb, 1),
+        }
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            # 读取-追加-替换 必须在锁内完成，否则并行批处理进程会互相覆盖对方刚写入的样本
+            with _history_lock(self.history_path):
+                self.history = self._load() + [sample]
+                self.history = self.history[-COST_HISTORY_MAX:]
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.history_path), suffix=".tmp")
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self.history, f)
+                os.replace(tmp, self.history_path)
+        except OSError:
+            self.history.append(sample)
@@ -0,0 +1,370 @@
+# core/glyph_counter.py
+# Version: v3.8.0_Glyph_Count
+# Last Updated: 2026-10-17
+# Description: 快速字数统计。直接扫描页面内容流，按字体的 ToUnicode/编码统计 Tj/TJ/'/" 显示的非空白字形数，
+#              不做 extract_text 的版面重建；结果与 extract_text 口径近似 (误差见 benchmarks/bench_glyphs.py)。
+# 编码支持范围：
+#   - Type0：嵌入 CMap 的 codespacerange (1~4 字节变长编码)；预定义 CMap 按名称推断码长
+#     (Identity/UCS2/UTF16 为 2 字节，UTF32 为 4 字节，UTF8 按首字节，EUC/GBK/RKSJ/Big5 等为 1~2 字节混合)，
+#     其它未知名称按 2 字节处理。无 ToUnicode 时每个编码记一个字形。
+#   - 简单字体：ToUnicode 优先；否则按 /Encoding (命名编码或 /BaseEncoding + /Differences，字形名经 Adobe 字形表
+#     及 uniXXXX/uXXXX 规则转换) 解码，无 /Encoding 时使用 StandardEncoding (Symbol/ZapfDingbats 用其内置编码)。
+#   - 不支持：Type3 字形过程内部的文字、标注外观流、以及 ToUnicode 缺失且字形名无法识别时的空白判断 (按 1 个字形计)。
+# 编码表取自 pypdf 的内部模块 pypdf._codecs；该模块在某个版本中不可用时 AVAILABLE 为 False，
+# count_pages 退回 extract_text 逐页统计 (结果与 'extract' 方式一致，只是没有加速)。
+
+import re
+
+from pypdf.generic import IndirectObject
+
+try:
+    from pypdf._codecs import adobe_glyphs, charset_encoding
+    AVAILABLE = True
+except ImportError:
+    adobe_glyphs, charset_encoding = {}, {}
+    AVAILABLE = False
+
+# 内容流词法：空白、注释、名称、字典括号、十六进制串、数组括号、数字、操作符；字面串 "(" 单独处理 (可嵌套、含转义)
+_TOKEN = re.compile(
+    rb"[\s\x00]+|%[^\r\n]*|/[^\s\x00()<>\[\]{}/%]*|<<|>>|<[0-9A-Fa-f\s]*>|\[|\]|\(|[{}]"
+    rb"|[+-]?(?:\d+\.?\d*|\.\d+)|[^\s\x00()<>\[\]{}/%]+")
+_ESCAPES = {ord('n'): 10, ord('r'): 13, ord('t'): 9, ord('b'): 8, ord('f'): 12}
+_SHOW_OPS = {b"Tj", b"'", b'"', b"TJ"}
+_BFCHAR = re.compile(rb"beginbfchar(.*?)endbfchar", re.S)
+_BFRANGE = re.compile(rb"beginbfrange(.*?)endbfrange", re.S)
+_HEX = re.compile(rb"<([0-9A-Fa-f\s]*)>")
+_RANGE = re.compile(rb"<([0-9A-Fa-f\s]*)>\s*<([0-9A-Fa-f\s]*)>\s*(<[0-9A-Fa-f\s]*>|\[[^\]]*\])")
+_CODESPACE = re.compile(rb"begincodespacerange(.*?)endcodespacerange", re.S)
+_MAX_FORM_DEPTH = 8
+_FULL_2BYTE = [(2, b"\x00\x00", b"\xff\xff")]
+# 预定义 CMap 名称片段 -> codespace (与 Adobe 发布的 CMap 文件一致或近似)
+_MIXED_DBCS = [(1, b"\x00", b"\x80"), (2, b"\x81\x40", b"\xfe\xfe")]
+_PREDEFINED = (
+    ("UTF32", [(4, b"\x00\x00\x00\x00", b"\xff\xff\xff\xff")]),
+    ("UTF8", [(1, b"\x00", b"\x7f"), (2, b"\xc0\x80", b"\xdf\xbf"),
+              (3, b"\xe0\x80\x80", b"\xef\xbf\xbf"), (4, b"\xf0\x80\x80\x80", b"\xf7\xbf\xbf\xbf")]),
+    ("UCS2", _FULL_2BYTE), ("UTF16", _FULL_2BYTE), ("Identity", _FULL_2BYTE),
+    ("EUC", _MIXED_DBCS), ("GBK", _MIXED_DBCS), ("GBpc", _MIXED_DBCS), ("GBT", _MIXED_DBCS),
+    ("RKSJ", _MIXED_DBCS), ("B5", _MIXED_DBCS), ("ETen", _MIXED_DBCS), ("HKscs", _MIXED_DBCS),
+    ("KSCms", _MIXED_DBCS), ("KSCpc", _MIXED_DBCS), ("UHC", _MIXED_DBCS),
+)
+
+
+class _Str(bytes):
+    """内容流中的字符串操作数 (与数字、名称等其它词法单元区分)"""
+
+
+def _resolve(obj):
+    return obj.get_object() if isinstance(obj, IndirectObject) else obj
+
+
+def _hex_bytes(raw):
+    raw = re.sub(rb"\s", b"", raw)
+    if len(raw) % 2: raw += b"0"
+    return bytes.fromhex(raw.decode("ascii"))
+
+
+def _utf16(raw):
+    try:
+        return _hex_bytes(raw).decode("utf-16-be", "ignore")
+    except ValueError:
+        return ""
+
+
+def _nonspace(text):
+    return sum(1 for ch in text if not ch.isspace())
+
+
+def _literal(data, pos):
+    """解析以 data[pos] == '(' 开头的字面串；返回 (字节, 结束位置)"""
+    out = bytearray()
+    depth = 1
+    pos += 1
+    n = len(data)
+    while pos < n:
+        c = data[pos]
+        if c == 0x5C:  # 反斜杠
+            pos += 1
+            if pos >= n: break
+            c = data[pos]
+            if 0x30 <= c <= 0x37:  # 八进制，最多 3 位
+                end = pos
+                while end < n and end - pos < 3 and 0x30 <= data[end] <= 0x37: end += 1
+                out.append(int(data[pos:end], 8) & 0xFF)
+                pos = end
+                continue
+            if c in (0x0D, 0x0A):  # 续行
+                if c == 0x0D and pos + 1 < n and data[pos + 1] == 0x0A: pos += 1
+            else:
+                out.append(_ESCAPES.get(c, c))
+        elif c == 0x28:
+            depth += 1
+            out.append(c)
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0: return bytes(out), pos + 1
+            out.append(c)
+        else:
+            out.append(c)
+        pos += 1
+    return bytes(out), pos
+
+
+def _glyph_text(name):
+    """字形名 -> 文本：Adobe 字形表，其次 uniXXXX[XXXX...] / uXXXX[XX]；无法识别时返回 None"""
+    text = adobe_glyphs.get(name)
+    if text is not None: return text
+    base = name[1:].split(".", 1)[0]
+    try:
+        if base.startswith("uni") and len(base) >= 7 and (len(base) - 3) % 4 == 0:
+            return "".join(chr(int(base[i:i + 4], 16)) for i in range(3, len(base), 4))
+        if base.startswith("u") and 5 <= len(base) <= 7:
+            return chr(int(base[1:], 16))
+    except ValueError:
+        pass
+    return None
+
+
+def _parse_codespace(data):
+    ranges = []
+    for block in _CODESPACE.findall(data):
+        codes = _HEX.findall(block)
+        for lo, hi in zip(codes[0::2], codes[1::2]):
+            lo, hi = _hex_bytes(lo), _hex_bytes(hi)
+            if lo and len(lo) == len(hi) <= 4: ranges.append((len(lo), lo, hi))
+    return sorted(ranges)
+
+
+class _FontCounter:
+    """单个字体：按编码把字符串切成字形编码，再查每个编码的非空白字符数 (支持范围见文件头)"""
+
+    def __init__(self, font):
+        font = _resolve(font) or {}
+        self.composite = font.get("/Subtype") == "/Type0"
+        encoding = _resolve(font.get("/Encoding"))
+        # codespace: [(字节数, 下界, 上界)]；width 为定长编码的码长，变长编码为 None
+        self.codespace = self._cmap_codespace(encoding) if self.composite else [(1, b"\x00", b"\xff")]
+        lengths = {n for n, _lo, _hi in self.codespace}
+        self.width = lengths.pop() if len(lengths) == 1 and self._covers_all(self.codespace) else None
+        self.simple = None if self.composite else self._simple_encoding(font, encoding)
+        self.unicode = self._parse_tounicode(font.get("/ToUnicode"))
+        self.cache = {}
+
+    @staticmethod
+    def _covers_all(ranges):
+        n = ranges[0][0]
+        return any(lo == b"\x00" * n and hi == b"\xff" * n for _n, lo, hi in ranges)
+
+    @staticmethod
+    def _cmap_codespace(encoding):
+        if encoding is not None and hasattr(encoding, "get_data"):
+            try:
+                return _parse_codespace(encoding.get_data()) or _FULL_2BYTE
+            except Exception:
+                return _FULL_2BYTE
+        name = str(encoding or "")
+        for key, ranges in _PREDEFINED:
+            if key in name: return ranges
+        return _FULL_2BYTE
+
+    @staticmethod
+    def _simple_encoding(font, encoding):
+        """简单字体的 256 项编码表 (与 pypdf 的默认规则一致)"""
+        base_font = str(font.get("/BaseFont", ""))
+        if isinstance(encoding, str) and encoding in charset_encoding:
+            table = list(charset_encoding[encoding])
+        elif hasattr(encoding, "get") and str(encoding.get("/BaseEncoding", "")) in charset_encoding:
+            table = list(charset_encoding[str(encoding["/BaseEncoding"])])
+        elif base_font in charset_encoding:
+            table = list(charset_encoding[base_font])
+        else:
+            table = list(charset_encoding["/StandardEncoding"])
+        differences = _resolve(encoding.get("/Differences")) if hasattr(encoding, "get") else None
+        code = 0
+        for item in differences or []:
+            item = _resolve(item)
+            if isinstance(item, int):
+                code = item
+            elif code < 256:
+                text = _glyph_text(str(item))
+                table[code] = "?" if text is None else text  # 无法识别的字形名：按 1 个可见字形计
+                code += 1
+        return table
+
+    @staticmethod
+    def _parse_tounicode(stream):
+        stream = _resolve(stream)
+        if stream is None or not hasattr(stream, "get_data"): return {}
+        try:
+            data = stream.get_data()
+        except Exception:
+            return {}
+        mapping = {}
+        for block in _BFCHAR.findall(data):
+            codes = _HEX.findall(block)
+            for src, dst in zip(codes[0::2], codes[1::2]):
+                mapping[int(re.sub(rb"\s", b"", src) or b"0", 16)] = _utf16(dst)
+        for block in _BFRANGE.findall(data):
+            for lo, hi, dst in _RANGE.findall(block):
+                lo = int(re.sub(rb"\s", b"", lo) or b"0", 16)
+                hi = int(re.sub(rb"\s", b"", hi) or b"0", 16)
+                if hi - lo > 0xFFFF: continue
+                if dst.startswith(b"["):
+                    for code, item in zip(range(lo, hi + 1), _HEX.findall(dst)):
+                        mapping[code] = _utf16(item)
+                else:
+                    first = _hex_bytes(dst[1:-1])
+                    for offset in range(hi - lo + 1):
+                        # 目标值末字节递增 (规范约定不跨越末字节进位)
+                        value = first[:-1] + bytes([(first[-1] + offset) & 0xFF]) if first else b""
+                        mapping[lo + offset] = value.decode("utf-16-be", "ignore")
+        return mapping
+
+    def _code_chars(self, code):
+        text = self.unicode.get(code)
+        if text is None:
+            if self.composite: return 1  # 无 ToUnicode 的 CID 字体：每个编码记一个字形
+            text = self.simple[code] if code < 256 else "?"
+        return _nonspace(text)
+
+    def _code_length(self, raw, i):
+        """变长编码：在 codespace 中匹配 raw[i:] 开头的编码长度；都不匹配时按最短码长前进"""
+        for n, lo, hi in self.codespace:
+            chunk = raw[i:i + n]
+            if len(chunk) == n and all(a <= b <= c for a, b, c in zip(lo, chunk, hi)):
+                return n
+        return self.codespace[0][0]
+
+    def count(self, raw):
+        total = 0
+        cache = self.cache
+        w = self.width
+        if w is None:
+            i = 0
+            end = len(raw)
+            while i < end:
+                n = self._code_length(raw, i)
+                if i + n > end: break
+                code = int.from_bytes(raw[i:i + n], "big")
+                i += n
+                chars = cache.get(code)
+                if chars is None:
+                    chars = cache[code] = self._code_chars(code)
+                total += chars
+            return total
+        for i in range(0, len(raw) - w + 1, w):
+            code = raw[i] if w == 1 else (raw[i] << 8) | raw[i + 1] if w == 2 else int.from_bytes(raw[i:i + w], "big")
+            n = cache.get(code)
+            if n is None:
+                n = cache[code] = self._code_chars(code)
+            total += n
+        return total
+
+
+class GlyphCounter:
+    """
+    按页统计显示的非空白字形数。字体 (按间接对象复用) 与 Form XObject 的解析结果在同一 PdfReader 内缓存。
+    不支持的结构 (Type3 内部、标注外观流等) 直接跳过，与 extract_text 的覆盖范围基本一致。
+    """
+
+    def __init__(self):
+        self._fonts = {}
+
+    def _font(self, ref):
+        key = (ref.idnum, ref.generation) if isinstance(ref, IndirectObject) else id(ref)
+        font = self._fonts.get(key)
+        if font is None:
+            font = self._fonts[key] = _FontCounter(ref)
+        return font
+
+    def count_page(self, page):
+        contents = page.get_contents()
+        if contents is None: return 0
+        return self._count_stream(contents.get_data(), _resolve(page.get("/Resources")) or {}, 0)
+
+    def _count_stream(self, data, resources, depth):
+        fonts = _resolve(resources.get("/Font")) or {}
+        xobjects = _resolve(resources.get("/XObject")) or {}
+        font = None
+        total = 0
+        stack = []
+        marks = []
+        pos = 0
+        n = len(data)
+        match = _TOKEN.match
+        while pos < n:
+            m = match(data, pos)
+            if m is None:
+                pos += 1
+                continue
+            tok = m.group()
+            first = tok[0]
+            pos = m.end()
+            if first in b" \t\r\n\x0c\x00%": continue
+            if first == 0x28:  # (
+                value, pos = _literal(data, pos - 1)
+                stack.append(_Str(value))
+            elif first == 0x3C and tok != b"<<":  # <hex>
+                stack.append(_Str(_hex_bytes(tok[1:-1])))
+            elif tok in (b"[", b"<<"):
+                marks.append(len(stack))
+            elif tok in (b"]", b">>"):
+                start = marks.pop() if marks else 0
+                items = stack[start:]
+                del stack[start:]
+                stack.append(items if tok == b"]" else None)
+            elif first == 0x2F or first in b"+-.0123456789" or first in b"{}":
+                stack.append(tok)
+            else:  # 操作符
+                if tok in _SHOW_OPS:
+                    if font is not None and stack:
+                        operand = stack[-1]
+                        for item in (operand if isinstance(operand, list) else (operand,)):
+                            if isinstance(item, _Str): total += font.count(item)
+                elif tok == b"Tf":
+                    font = None
+                    if len(stack) >= 2 and isinstance(stack[-2], bytes) and stack[-2][:1] == b"/":
+                        name = stack[-2].decode("latin-1")
+                        if name in fonts: font = self._font(fonts.raw_get(name))
+                elif tok == b"Do":
+                    if depth < _MAX_FORM_DEPTH and stack and isinstance(stack[-1], bytes):
+                        total += self._count_form(xobjects, stack[-1].decode("latin-1"), resources, depth)
+                elif tok == b"BI":
+                    # 内联图像：跳过 ID 与 EI 之间的二进制数据
+                    idx = data.find(b"ID", pos)
+                    end = data.find(b"EI", idx + 2) if idx >= 0 else -1
+                    while end > 0 and not (data[end - 1:end] in b" \t\r\n\x00" and
+                                           (end + 2 >= n or data[end + 2:end + 3] in b" \t\r\n\x00")):
+                        end = data.find(b"EI", end + 2)
+                    pos = n if end < 0 else end + 2
+                stack.clear()
+                marks.clear()
+        return total
+
+    def _count_form(self, xobjects, name, resources, depth):
+        if not hasattr(xobjects, "get"): return 0
+        form = _resolve(xobjects.get(name))
+        if form is None or form.get("/Subtype") != "/Form": return 0
+        try:
+            data = form.get_data()
+        except Exception:
+            return 0
+        return self._count_stream(data, _resolve(form.get("/Resources")) or resources, depth + 1)
+
+
+def count_pages(reader, start=0, end=None, progress=None):
+    """[start, end) 每页字形数列表；progress(已完成页数, 总页数) 逐页调用。编码表不可用时按 extract_text 统计"""
+    counter = GlyphCounter() if AVAILABLE else None
+    total = len(reader.pages)
+    end = total if end is None else end
+    counts = []
+    for i in range(start, end):
+        if progress: progress(i, total)
+        try:
+            if counter is None:
+                counts.append(_nonspace(reader.pages[i].extract_text() or ""))
+            else:
+                counts.append(counter.count_page(reader.pages[i]))
+        except Exception:
+            counts.append(0)
+    return counts
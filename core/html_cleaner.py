@@ -0,0 +1,81 @@
+# core/html_cleaner.py
+# Version: v3.8.0_Lxml_Cleaner
+# Last Updated: 2026-10-17
+# Description: 基于 lxml 的章节清洗。libxml2 解析 + 单次遍历改写图片地址，取代 BeautifulSoup(html.parser) 的纯 Python 树。
+
+import html
+import re
+
+from lxml import etree
+
+# 编码声明只在文件开头查找：XML 声明或 <meta charset> / http-equiv Content-Type
+_XML_DECL = re.compile(rb'^\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?([A-Za-z0-9._:-]+)', re.I)
+_SNIFF_BYTES = 2048
+_BOMS = ((b'\xef\xbb\xbf', 'utf-8'), (b'\xff\xfe', 'utf-16'), (b'\xfe\xff', 'utf-16'))
+_parsers = {}
+
+
+def _parser(encoding):
+    # recover: 容忍网文常见的不规范标签；HTML 解析器会忽略 XHTML 命名空间，输出与旧版一致的普通标签
+    parser = _parsers.get(encoding)
+    if parser is None:
+        parser = _parsers[encoding] = etree.HTMLParser(recover=True, remove_blank_text=False, encoding=encoding)
+    return parser
+
+
+def detect_encoding(content):
+    """
+    章节字节流的编码：BOM > XML 声明 > meta charset > UTF-8。
+    显式指定给解析器，避免 libxml2 在没有声明时按 Latin-1 解码 (中文章节会变成乱码)。
+    """
+    for bom, encoding in _BOMS:
+        if content.startswith(bom): return encoding
+    head = content[:_SNIFF_BYTES]
+    m = _XML_DECL.match(head) or _META_CHARSET.search(head)
+    return m.group(1).decode('ascii').lower() if m else 'utf-8'
+
+
+def parse_body(content, rewrite_src=None):
+    """
+    解析章节内容并返回 <body> 元素 (找不到时返回 None)。
+    rewrite_src(src) -> 新地址或 None；在同一次遍历中改写所有 <img src>。
+    """
+    if not content: return None
+    if isinstance(content, str): content = content.encode('utf-8')
+    encoding = detect_encoding(content)
+    try:
+        parser = _parser(encoding)
+    except LookupError:  # 声明了 libxml2 不认识的编码
+        parser = _parser('utf-8')
+    root = etree.fromstring(content, parser)
+    if root is None: return None
+    body = root.find('body')
+    if body is None: return None
+
+    if rewrite_src:
+        for img in body.iter('img'):
+            src = img.get('src')
+            if src:
+                new_src = rewrite_src(src)
+                if new_src: img.set('src', new_src)
+    return body
+
+
+def node_html(node):
+    """序列化单个子节点 (含其尾随文本)"""
+    return etree.tostring(node, encoding='unicode', method='html', with_tail=True)
+
+
+def leading_text(node):
+    """元素起始标签后、第一个子节点前的文本 (已转义)"""
+    return html.escape(node.text, quote=False) if node.text else ""
+
+
+def trailing_text(node):
+    return html.escape(node.tail, quote=False) if node.tail else ""
+
+
+def inner_html(node):
+    """等价于 BeautifulSoup 的 decode_contents()：返回元素内部的 HTML"""
+    return leading_text(node) + ''.join(node_html(child) for child in node)
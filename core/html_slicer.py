@@ -0,0 +1,154 @@
+# core/html_slicer.py
+# Version: v3.8.0_Anchor_Slicer (lxml)
+# Last Updated: 2026-10-17
+# Description: 按目录锚点切片 spine 内容。每个 spine 文件只解析一次，目录节点取 "本锚点 -> 下一个锚点" 之间的内容。
+
+import html
+
+from lxml import etree
+
+from core.html_cleaner import leading_text, node_html, trailing_text
+
+
+class SpineSlicer:
+    """
+    将整本书的 spine 视为一条线性内容流，位置用 (spine 序号, 块序号) 表示。
+    - 块 (block) 是 body 的直接子节点；若某个包裹元素内含多个锚点 (典型的单体 XHTML)，
+      则将其展开，以其子节点作为块，直到每个块至多包含一个锚点。
+    - slice(start, end) 返回 [start, end) 区间内所有块的 HTML，可跨越多个 spine 文件。
+    parse_body(item) 由调用方提供，返回已修正图片路径的 <body> 节点 (或 None)。
+    """
+
+    def __init__(self, spine_items, parse_body):
+        self.items = spine_items
+        self.parse_body = parse_body
+        self.index = {item.get_name(): pos for pos, item in enumerate(spine_items)}
+        self.anchors = {}  # pos -> set(anchor)
+        self._cache = {}  # pos -> (blocks, marks)
+
+    def locate(self, href):
+        """href -> (spine 序号, 锚点)；文件不在 spine 中时返回 None"""
+        if not href: return None
+        parts = href.split('#', 1)
+        pos = self.index.get(parts[0])
+        if pos is None: return None
+        anchor = parts[1] if len(parts) > 1 and parts[1] else None
+        if anchor: self.anchors.setdefault(pos, set()).add(anchor)
+        return pos, anchor
+
+    def position(self, loc):
+        """(spine 序号, 锚点) -> (spine 序号, 块序号)；找不到的锚点按文件开头处理"""
+        pos, anchor = loc
+        if not anchor: return pos, 0
+        _blocks, marks = self._load(pos)
+        return pos, marks.get(anchor, 0)
+
+    def slice(self, start, end=None):
+        """返回 [start, end) 的 HTML；end 为 None 表示直到 spine 末尾"""
+        s_pos, s_blk = self.position(start)
+        e_pos, e_blk = self.position(end) if end else (len(self.items), 0)
+
+        parts = []
+        for pos in range(s_pos, min(e_pos, len(self.items) - 1) + 1):
+            blocks, _marks = self._load(pos)
+            lo = s_blk if pos == s_pos else 0
+            hi = e_blk if pos == e_pos else len(blocks)
+            parts.extend(blocks[lo:hi])
+        return ''.join(parts)
+
+    def release(self, before_pos):
+        """释放已处理完的 spine 文件，控制内存"""
+        for pos in [p for p in self._cache if p < before_pos]:
+            del self._cache[pos]
+
+    def _load(self, pos):
+        if pos not in self._cache:
+            body = self.parse_body(self.items[pos])
+            if body is None:
+                self._cache[pos] = ([], {})
+            else:
+                self._cache[pos] = self._split_blocks(body, self.anchors.get(pos, set()))
+        return self._cache[pos]
+
+    @staticmethod
+    def _split_blocks(body, anchors, max_chars=None):
+        # 1. 单次遍历定位所有锚点 (id 优先，其次旧式 <a name>)，为其祖先链登记包含的锚点
+        located = {}
+        if anchors:
+            for el in body.iter(tag=etree.Element):
+                for key in (el.get('id'), el.get('name')):
+                    if key in anchors and key not in located:
+                        located[key] = el
+
+        inside = {}  # 元素 -> [anchor, ...]
+        own = {}  # 元素 -> anchor (元素自身即锚点)
+        for anchor, el in located.items():
+            own[el] = anchor
+            node = el
+            while node is not None and node is not body:
+                inside.setdefault(node, []).append(anchor)
+                node = node.getparent()
+
+        # 2. 自上而下切块：含多个锚点的包裹元素被展开，其首尾文本各自成块；
+        #    给定 max_chars 时，序列化后超过该长度的包裹元素同样展开 (单文件整本书的外层 <div> 等)，
+        #    展开后的子块按 max_chars 分组，每组套回该元素的起止标签，保留其 class/style 等属性
+        blocks = []
+        marks = {}
+
+        def walk(node, out):
+            text = leading_text(node)
+            if text: out.append(text)
+            for child in node:
+                found = inside.get(child)
+                if found and len(found) >= 2:
+                    if child in own: marks[own[child]] = len(out)
+                    walk(child, out)
+                    tail = trailing_text(child)
+                    if tail: out.append(tail)
+                    continue
+                if found: marks[found[0]] = len(out)
+                markup = node_html(child)
+                if max_chars and len(markup) > max_chars and len(child):
+                    parts = []
+                    walk(child, parts)
+                    out.extend(_rewrap(child, parts, max_chars))
+                    tail = trailing_text(child)
+                    if tail: out.append(tail)
+                    continue
+                out.append(markup)
+
+        walk(body, blocks)
+        return blocks, marks
+
+
+def _rewrap(wrapper, parts, max_chars):
+    """
+    将包裹元素展开后的子块按 max_chars 贪心分组，每组重新包上该元素的起止标签。
+    id 只保留在第一组 (锚点不重复)；其余属性每组都保留，使分块后的样式与整体渲染一致。
+    """
+    attrib = dict(wrapper.attrib)
+    groups = []
+    group = []
+    size = 0
+    for part in parts:
+        if group and size + len(part) > max_chars:
+            groups.append(group)
+            group = []
+            size = 0
+        group.append(part)
+        size += len(part)
+    if group: groups.append(group)
+
+    # 起始标签手工拼接：HTML 解析器保留的 xml:lang 等属性名无法通过 etree.Element 重建
+    wrapped = []
+    for group in groups:
+        attrs = ''.join(f' {name}="{html.escape(value)}"' for name, value in attrib.items())
+        wrapped.append(f"<{wrapper.tag}{attrs}>{''.join(group)}</{wrapper.tag}>")
+        attrib.pop('id', None)
+    return wrapped
+
+
+def body_blocks(body, max_chars):
+    """将 <body> 切成顶层块的 HTML 列表，过大的包裹元素逐层展开，使每块尽量不超过 max_chars"""
+    blocks, _marks = SpineSlicer._split_blocks(body, set(), max_chars)
+    return blocks
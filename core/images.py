@@ -0,0 +1,128 @@
+# core/images.py
+# Version: v3.8.0_Image_Pipeline
+# Last Updated: 2026-10-17
+# Description: 按需图片管线。只提取章节实际引用的图片；按纸张版心宽度降采样到目标 DPI 并重新压缩；处理结果按内容哈希缓存。
+
+import hashlib
+import io
+import os
+import posixpath
+from urllib.parse import unquote
+
+import ebooklib
+from PIL import Image
+
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB, IMAGE_TARGET_DPI, IMAGE_JPEG_QUALITY
+from core.render_cache import RenderCache
+
+# 纸张宽度 (mm)，与界面可选纸张对应
+PAPER_WIDTH_MM = {'A4': 210, 'A5': 148, 'B5': 176}
+PIPELINE_VERSION = "1"  # 处理算法变化时递增，使旧缓存失效
+
+
+class ImagePipeline:
+    """
+    图片管线：
+    - 构造时只建立 文件名 -> EPUB 条目 的索引，不写任何文件。
+    - resolve(src) 在章节首次引用某图片时才处理并写入临时目录，返回本地路径。
+    - 宽度超过 (版心宽度 × DPI) 的位图按比例缩小；JPEG 按设定质量重压，PNG 优化压缩；
+      未缩小的图片仅在重压后体积更小时才替换原图。
+    """
+
+    def __init__(self, book, temp_dir, settings):
+        self.temp_dir = temp_dir
+        self.dpi = settings.get('image_dpi', IMAGE_TARGET_DPI)
+        self.quality = settings.get('image_quality', IMAGE_JPEG_QUALITY)
+        self.max_width = self._target_width(settings)
+        self.cache = RenderCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB, ext=".img") \
+            if settings.get('render_cache', True) else None
+
+        self.by_name = {}
+        self.by_basename = {}
+        for item in book.get_items():
+            if item.get_type() == ebooklib.ITEM_IMAGE:
+                self.by_name[item.get_name()] = item
+                self.by_basename.setdefault(os.path.basename(item.get_name()), item)
+
+        self.resolved = {}  # 条目名 -> 本地路径
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _target_width(self, settings):
+        if not self.dpi: return None
+        paper_mm = PAPER_WIDTH_MM.get(settings.get('paper'), 210)
+        content_mm = max(10, paper_mm - 2 * settings.get('margin_lr', 0))
+        return int(content_mm / 25.4 * self.dpi)
+
+    def resolve(self, src, chapter_name=""):
+        """章节中的图片 src -> 本地文件路径；找不到对应条目时返回 None"""
+        item = self._find_item(src, chapter_name)
+        if item is None: return None
+        name = item.get_name()
+        if name not in self.resolved:
+            self.resolved[name] = self._materialize(item)
+        return self.resolved[name]
+
+    def _find_item(self, src, chapter_name):
+        src = unquote(src.split('#')[0])
+        if chapter_name:
+            full = posixpath.normpath(posixpath.join(posixpath.dirname(chapter_name), src))
+            if full in self.by_name: return self.by_name[full]
+        # 与旧版一致：按文件名兜底匹配
+        return self.by_basename.get(os.path.basename(src))
+
+    def _materialize(self, item):
+        raw = item.get_content()
+        self.bytes_in += len(raw)
+        base = os.path.splitext(os.path.join(self.temp_dir, item.get_name()))[0]
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+
+        key = None
+        if self.cache:
+            h = hashlib.sha256(raw)
+            h.update(f"|{self.max_width}|{self.quality}|{PIPELINE_VERSION}".encode())
+            key = h.hexdigest()
+            meta = self.cache.get(key, base + ".tmp")
+            if meta and meta.get('ext'):
+                path = base + meta['ext']
+                os.replace(base + ".tmp", path)
+                self.bytes_out += os.path.getsize(path)
+                return path
+
+        data, ext = self._process(raw, os.path.splitext(item.get_name())[1].lower())
+        path = base + ext
+        with open(path, 'wb') as f: f.write(data)
+        self.bytes_out += len(data)
+        if key: self.cache.put(key, path, meta={'ext': ext})
+        return path
+
+    def _process(self, raw, ext):
+        """返回 (图片字节, 扩展名)；无法处理的格式 (SVG 等) 原样返回"""
+        if ext in ('.svg', '.svgz'): return raw, ext
+        try:
+            img = Image.open(io.BytesIO(raw))
+            fmt = img.format
+            resized = False
+            if self.max_width and img.width > self.max_width:
+                height = max(1, round(img.height * self.max_width / img.width))
+                if fmt == 'JPEG': img.draft(img.mode, (self.max_width, height))  # JPEG 解码阶段即缩小
+                img = img.resize((self.max_width, height), Image.LANCZOS)
+                resized = True
+
+            has_alpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+            out = io.BytesIO()
+            if fmt == 'JPEG' or (fmt not in ('PNG', 'GIF') and not has_alpha):
+                if img.mode not in ('RGB', 'L'): img = img.convert('RGB')
+                img.save(out, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+                new_ext = '.jpg'
+            else:
+                if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'): img = img.convert('RGBA')
+                img.save(out, 'PNG', optimize=True)
+                new_ext = '.png'
+
+            data = out.getvalue()
+            if not resized and len(data) >= len(raw) and fmt in ('JPEG', 'PNG', 'GIF'):
+                return raw, ext
+            return data, new_ext
+        except Exception:
+            return raw, ext
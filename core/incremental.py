@@ -0,0 +1,80 @@
+# core/incremental.py
+# Version: v3.8.0_Incremental_Batch
+# Last Updated: 2026-10-17
+# Description: 增量批量转换。每本 EPUB 旁保存指纹 (内容哈希 + 输出相关设置 + 程序版本)，指纹一致且产物完好时跳过。
+
+import hashlib
+import json
+import os
+import tempfile
+
+from config import APP_VERSION
+
+SIDECAR_SUFFIX = ".epub2pdf.json"
+# 只影响运行方式、不影响输出内容的设置，不参与指纹
+RUNTIME_KEYS = {'workers', 'render_cache', 'ram_budget_mb', 'stage_timeouts', 'resume'}
+
+
+def sidecar_path(epub_path):
+    return os.path.splitext(epub_path)[0] + SIDECAR_SUFFIX
+
+
+def _load(epub_path):
+    try:
+        with open(sidecar_path(epub_path), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def content_hash(path, block=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(epub_path, settings):
+    """
+    计算指纹。内容哈希按 (大小, 修改时间) 复用上次记录的值，文件未被改动时无需重读整本书；
+    大小或时间任一变化即重新计算哈希。
+    """
+    st = os.stat(epub_path)
+    prev = _load(epub_path)
+    if prev.get('epub_size') == st.st_size and prev.get('epub_mtime_ns') == st.st_mtime_ns and prev.get('epub_sha256'):
+        digest = prev['epub_sha256']
+    else:
+        digest = content_hash(epub_path)
+    return {
+        'epub_sha256': digest,
+        'epub_size': st.st_size,
+        'epub_mtime_ns': st.st_mtime_ns,
+        'settings': {k: v for k, v in sorted(settings.items()) if k not in RUNTIME_KEYS},
+        'app_version': APP_VERSION,
+    }
+
+
+def is_up_to_date(epub_path, fp):
+    """指纹 (内容哈希/设置/版本) 一致，且上次记录的产物仍存在、大小未变"""
+    prev = _load(epub_path)
+    for key in ('epub_sha256', 'settings', 'app_version'):
+        if prev.get(key) != fp[key]: return False
+    output = prev.get('output')
+    if not output or not os.path.exists(output): return False
+    return os.path.isdir(output) or os.path.getsize(output) == prev.get('output_size')
+
+
+def record(epub_path, fp, output_path):
+    """转换成功后写入指纹与产物信息 (原子写入)"""
+    data = dict(fp, output=os.path.abspath(output_path),
+                output_size=os.path.getsize(output_path) if os.path.isfile(output_path) else None)
+    path = sidecar_path(epub_path)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        pass
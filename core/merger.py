@@ -1,63 +1,288 @@
 # core/merger.py
+import codecs
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfWriter, PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, NameObject, NumberObject, TextStringObject
+
+from config import MERGE_STREAMING_MIN_FILES, PDF_DEDUPE, MERGE_PREFLIGHT_WORKERS, MERGE_PREFLIGHT_MIN_FILES, PX_TO_PT
+from core.pdf_stream import StreamingPdfWriter, IncrementalPdfWriter, dedupe_objects
+from utils.telemetry import Telemetry, file_size
+
+
+def _clean_title(pdf_path):
+    """书签标题：文件名去除自动分卷产生的 "01_" 序号，使目录更干净"""
+    return re.sub(r'^\d+_', '', os.path.splitext(os.path.basename(pdf_path))[0])
+
+
+def _dest_name(name):
+    """命名目标的 PDF 字符串，与 WeasyPrint (pydyf) 写出的链接 /Dest 逐字节一致：ASCII 为字面量，其余为带 BOM 的 UTF-16BE"""
+    text = TextStringObject(name)
+    if not name.isascii():
+        text.autodetect_utf16 = True
+        text.utf16_bom = codecs.BOM_UTF16_BE
+    return text
+
+
+def _open_pdf(pdf_path):
+    """打开输入文件；空密码加密 (仅限制编辑) 的文件自动解密"""
+    reader = PdfReader(pdf_path)
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError("文件已加密，需要密码")
+    return reader
+
+
+def resolve_outline(outlines, reader, page_offset=0):
+    """
+    递归解析目录：返回 [(标题, 页码 + page_offset, 子节点列表)]。
+    无法定位页码的节点跳过，其后的子目录挂到同层上一个有效节点下 (与 v3.7 的复制规则一致)。
+    """
+    nodes = []
+    for item in outlines or []:
+        if isinstance(item, list):
+            if nodes: nodes[-1][2].extend(resolve_outline(item, reader, page_offset))
+        else:
+            try:
+                page_index = reader.get_destination_page_number(item)
+                if page_index is not None:
+                    nodes.append((item.title, page_index + page_offset, []))
+            except:
+                continue
+    return nodes
+
+
+def shift_outline(nodes, offset):
+    return [(title, page + offset, shift_outline(children, offset)) for title, page, children in nodes]
+
+
+def inspect_pdf(pdf_path, keep_reader=False):
+    """
+    预检单个输入 (可在子进程中执行)：返回 (页数, 目录树 (页码相对本文件首页), 错误信息或 None, reader 或 None)。
+    没有页面的文件不算错误 (页数为 0，由调用方跳过)；keep_reader 时返回已打开的 reader 供写出阶段复用。
+    """
+    try:
+        if not os.path.isfile(pdf_path): return 0, [], "文件不存在", None
+        reader = _open_pdf(pdf_path)
+        pages = len(reader.pages)
+        outline = resolve_outline(reader.outline, reader) if pages else []
+        return pages, outline, None, reader if keep_reader and pages else None
+    except Exception as e:
+        return 0, [], f"无法解析 ({e})", None
+
 
 class PDFMergerEngine:
     """
     负责 PDF 文件合并，并支持一级目录（文件名）重构。
     """
 
-    def merge(self, file_list, output_path, update_callback):
+    def __init__(self, callback_manager=None, telemetry=None, dedupe=PDF_DEDUPE, workers=MERGE_PREFLIGHT_WORKERS):
+        self.cb = callback_manager or (telemetry.cb if telemetry else None)
+        # [v3.8.0] 结构化计时：由转换引擎调用时共用其 Telemetry，合并耗时计入该书的阶段摘要
+        self.telemetry = telemetry or Telemetry(callback_manager)
+        # [v3.8.0] 去重：各输入重复嵌入的字体程序、图片等只写出一份
+        self.dedupe = dedupe
+        self.workers = max(1, int(workers or 1))  # 预检并发进程数
+
+    def preflight(self, file_list, update_callback=None, keep_readers=False):
+        """
+        [v3.8.0] 合并前预检：并发打开全部输入，校验并预先计算页数与目录树。
+        有任何文件无法合并时抛出 ValueError 并列出全部问题文件 (此时尚未写出任何内容)；
+        没有页面的文件 (如空章节的输出) 记录警告后跳过，与 v3.7 一致。
+        返回 [(路径, 页数, 目录树, reader 或 None)]，写出阶段只需按顺序追加。
+        keep_readers：在本进程串行预检时保留已打开的 reader，写出阶段不再重复解析
+        (多进程预检的 reader 无法跨进程传回；流式合并不保留，以免全部输入同时驻留内存)。
+        """
+        total = len(file_list)
+        if not total: raise ValueError("没有需要合并的文件")
+        if update_callback: update_callback(0, total, f"预检 {total} 个文件...")
+        with self.telemetry.span('preflight', bytes_in=sum(file_size(p) for p in file_list)) as rec:
+            if self.workers > 1 and total >= MERGE_PREFLIGHT_MIN_FILES:
+                workers = min(self.workers, total)
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(inspect_pdf, file_list, chunksize=max(1, total // (workers * 4))))
+            else:
+                results = [inspect_pdf(p, keep_readers) for p in file_list]
+            rec['pages'] = sum(result[0] for result in results)
+
+        errors = [f"{os.path.basename(p)}: {result[2]}" for p, result in zip(file_list, results) if result[2]]
+        if errors:
+            more = f" 等 {len(errors)} 个" if len(errors) > 5 else ""
+            raise ValueError(f"输入文件预检未通过{more}: " + "; ".join(errors[:5]))
+        empty = [os.path.basename(p) for p, result in zip(file_list, results) if not result[0]]
+        if empty and self.cb:
+            self.cb.log(f"⚠️ 跳过 {len(empty)} 个没有页面的文件: {', '.join(empty[:5])}")
+        inputs = [(p, pages, outline, reader) for p, (pages, outline, _err, reader) in zip(file_list, results) if pages]
+        if not inputs: raise ValueError("所有输入文件都没有页面")
+        return inputs
+
+    def _write(self, writer, output_path):
+        if self.dedupe: dedupe_objects(writer)
+        writer.write(output_path)
+        writer.close()
+
+    def merge(self, file_list, output_path, update_callback, streaming=None):
+        """
+        合并 file_list 为 output_path，每个文件一个一级书签，其原有目录挂在其下。
+        [v3.8.0] streaming=True 时流式写出 (见 core.pdf_stream)，内存只取决于最大的单个输入；
+        None 表示文件数达到 MERGE_STREAMING_MIN_FILES 时自动启用。两种方式的页面与目录结构一致。
+        """
         try:
-            writer = PdfWriter()
             total_files = len(file_list)
+            output_path = os.path.abspath(output_path)
+            if not self.telemetry.book: self.telemetry.book = os.path.basename(output_path)
+            if streaming is None: streaming = total_files >= MERGE_STREAMING_MIN_FILES
+            inputs = self.preflight(file_list, update_callback, keep_readers=not streaming)
+            total_files = len(inputs)
+
+            with self.telemetry.span('merge', bytes_in=sum(file_size(p) for p in file_list),
+                                     streaming=streaming) as rec:
+                if streaming:
+                    writer = self._merge_streaming(inputs, output_path, update_callback)
+                    rec['pages'] = writer.page_count
+                    rec['deduped'] = writer.deduped
+                    rec['bytes_out'] = file_size(output_path)
+                    return True, output_path
+
+                writer = PdfWriter()
+                for idx, (pdf_path, _pages, outline, reader) in enumerate(inputs):
+                    clean_title = _clean_title(pdf_path)
+                    if update_callback:
+                        update_callback(idx, total_files, f"合并中: {clean_title}")
 
-            for idx, pdf_path in enumerate(file_list):
-                file_name = os.path.basename(pdf_path)
-                book_title = os.path.splitext(file_name)[0]
-                # 去除自动分卷产生的 "01_" 序号，使目录更干净
-                clean_title = re.sub(r'^\d+_', '', book_title)
+                    page_offset = len(writer.pages)
+                    writer.append_pages_from_reader(reader or _open_pdf(pdf_path))
+
+                    # 添加父级目录
+                    parent_bookmark = writer.add_outline_item(title=clean_title, page_number=page_offset)
+                    # 子目录使用预检时解析好的目录树
+                    self._add_outline(writer, shift_outline(outline, page_offset), parent_bookmark)
 
                 if update_callback:
-                    update_callback(idx, total_files, f"合并中: {clean_title}")
+                    update_callback(total_files, total_files, "保存合并文件...")
+
+                rec['pages'] = len(writer.pages)
+                self._write(writer, output_path)
+                rec['bytes_out'] = file_size(output_path)
+            return True, output_path
+
+        except Exception as e:
+            return False, str(e)
 
-                reader = PdfReader(pdf_path)
-                page_offset = len(writer.pages)
-                writer.append_pages_from_reader(reader)
+    # =========================================================================
+    # [v3.8.0] 增量追加：新分卷以 PDF 增量更新写在已有合并文件末尾，原有页面不重写；
+    # 目录规则与 merge 相同 (每个文件一个一级书签，接在原目录之后)。
+    # =========================================================================
+    def append(self, base_path, file_list, update_callback=None):
+        try:
+            base_path = os.path.abspath(base_path)
+            if not self.telemetry.book: self.telemetry.book = os.path.basename(base_path)
+            inputs = self.preflight(file_list, update_callback)
+            with self.telemetry.span('merge', bytes_in=sum(file_size(p) for p in file_list), append=True) as rec:
+                writer = self._merge_streaming(inputs, base_path, update_callback, IncrementalPdfWriter)
+                rec['pages'] = writer.page_count
+                rec['deduped'] = writer.deduped
+                rec['bytes_out'] = file_size(base_path)
+            return True, base_path
+
+        except Exception as e:
+            return False, str(e)
 
-                # 添加父级目录
-                parent_bookmark = writer.add_outline_item(title=clean_title, page_number=page_offset)
-                # 递归复制子目录
-                self._copy_outlines(writer, reader.outline, parent_bookmark, reader, page_offset)
+    def _merge_streaming(self, inputs, output_path, update_callback, writer_class=StreamingPdfWriter):
+        """逐个输入复制并写盘，读完即释放；目录树只保留 (标题, 页码) 骨架，最后统一写出。返回写出器"""
+        writer = writer_class(output_path, dedupe=self.dedupe)
+        outline = []
+        total_files = len(inputs)
+        try:
+            for idx, (pdf_path, _pages, tree, _reader) in enumerate(inputs):
+                clean_title = _clean_title(pdf_path)
+                if update_callback:
+                    update_callback(idx, total_files, f"合并中: {clean_title}")
+
+                page_offset = writer.page_count
+                writer.append_reader(_open_pdf(pdf_path))
+                outline.append((clean_title, page_offset, shift_outline(tree, page_offset)))
 
             if update_callback:
                 update_callback(total_files, total_files, "保存合并文件...")
+            writer.close(outline)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer
+
+    def _add_outline(self, writer, nodes, parent):
+        """将解析好的目录树写入 PdfWriter"""
+        for title, page_index, children in nodes:
+            item = writer.add_outline_item(title=title, page_number=page_index, parent=parent)
+            self._add_outline(writer, children, item)
 
+    # =========================================================================
+    # [v3.8.0] 分块单文件拼接
+    # 各分块按顺序追加；目录不逐文件复制，而是按 (层级, 标题, 全局页码) 整体重建，
+    # 使跨分块的标题层级与整本渲染时一致。
+    # 内部链接同理：WeasyPrint 把锚点写在各分块自己的命名目标表里 (拼接后丢失)，并丢弃目标不在本块内的链接，
+    # 因此由调用方汇总 anchors {锚点: (全局页码, x, y)} 与跨块链接 [(全局页码, 锚点, (x0, y0, x1, y1))]
+    # (坐标为 WeasyPrint 的 CSS px，原点在页面左上角)，在此统一重建命名目标并补上跨块的 /Link 注释。
+    # =========================================================================
+    def stitch(self, chunk_files, output_path, bookmarks, update_callback=None, anchors=None, links=None):
+        try:
+            writer = PdfWriter()
+            total_files = len(chunk_files)
             output_path = os.path.abspath(output_path)
-            writer.write(output_path)
-            writer.close()
+
+            with self.telemetry.span('stitch', bytes_in=sum(file_size(p) for p in chunk_files)) as rec:
+                for idx, pdf_path in enumerate(chunk_files):
+                    if update_callback:
+                        update_callback(idx, total_files, f"拼接分块 {idx + 1}/{total_files}")
+                    writer.append_pages_from_reader(PdfReader(pdf_path))
+
+                stack = []  # [(level, outline_item)]
+                for level, label, page_index in bookmarks:
+                    while stack and stack[-1][0] >= level: stack.pop()
+                    parent = stack[-1][1] if stack else None
+                    item = writer.add_outline_item(title=label, page_number=page_index, parent=parent)
+                    stack.append((level, item))
+
+                if anchors: self._add_link_targets(writer, anchors, links or [])
+
+                if update_callback:
+                    update_callback(total_files, total_files, "保存拼接文件...")
+
+                rec['pages'] = len(writer.pages)
+                self._write(writer, output_path)
+                rec['bytes_out'] = file_size(output_path)
             return True, output_path
 
         except Exception as e:
             return False, str(e)
 
-    def _copy_outlines(self, writer, outlines, parent, reader, page_offset):
-        """递归复制目录结构"""
-        if not outlines: return
-        last_added_item = None
-        for item in outlines:
-            if isinstance(item, list):
-                if last_added_item:
-                    self._copy_outlines(writer, item, last_added_item, reader, page_offset)
-            else:
-                try:
-                    page_index = reader.get_destination_page_number(item)
-                    if page_index is not None:
-                        last_added_item = writer.add_outline_item(
-                            title=item.title,
-                            page_number=page_index + page_offset,
-                            parent=parent
-                        )
-                except:
-                    continue
\ No newline at end of file
+    @staticmethod
+    def _add_link_targets(writer, anchors, links):
+        """重建命名目标表 (同名锚点以首次出现为准，与整本渲染一致)，并为跨分块链接添加指向该名称的 /Link 注释"""
+        def point(page_index, x, y):
+            box = writer.pages[page_index].mediabox
+            return FloatObject(box.left + x * PX_TO_PT), FloatObject(box.top - y * PX_TO_PT)
+
+        names = writer.get_named_dest_root()
+        entries = []
+        for name, (page_index, x, y) in anchors.items():
+            left, top = point(page_index, x, y)
+            dest = ArrayObject([writer.pages[page_index].indirect_reference, NameObject('/XYZ'), left, top,
+                                NumberObject(0)])
+            entries.append((_dest_name(name), dest))
+        # 名称树要求键按字节序排列；一次排序写入，避免逐个插入的平方开销
+        for key, dest in sorted(entries, key=lambda e: e[0].get_encoded_bytes()):
+            names.extend([key, dest])
+
+        for page_index, name, (x0, y0, x1, y1) in links:
+            if name not in anchors: continue
+            left, top = point(page_index, x0, y0)
+            right, bottom = point(page_index, x1, y1)
+            writer.add_annotation(page_index, DictionaryObject({
+                NameObject('/Type'): NameObject('/Annot'),
+                NameObject('/Subtype'): NameObject('/Link'),
+                NameObject('/Rect'): ArrayObject([left, bottom, right, top]),
+                NameObject('/Border'): ArrayObject([NumberObject(0)] * 3),
+                NameObject('/Dest'): _dest_name(name),
+            }))
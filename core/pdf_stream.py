@@ -0,0 +1,454 @@
+# core/pdf_stream.py
+# Version: v3.8.0_Streaming_Merge (Dedupe)
+# Last Updated: 2026-10-17
+# Description: 流式 PDF 写出。逐个输入文件复制页面及其引用的对象 (重新编号)，复制完立即写盘并释放该输入；
+#              内存只与单个最大的输入有关，而与输入总量无关。页面树、目录、xref 在结束时统一写出。
+#              [v3.8.0] 跨输入去重：字体、图片等对象按内容 (连同其引用的子对象) 哈希，相同内容只写出一次。
+#              [v3.8.0] 增量追加：以 PDF 增量更新的方式向已有文件追加页面与目录，原内容不重写。
+
+import hashlib
+import io
+import os
+import re
+
+from pypdf import PdfReader
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject,
+                           IndirectObject, NameObject, NullObject, NumberObject, StreamObject, TextStringObject)
+
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+
+
+class _NotShareable(Exception):
+    pass
+
+
+def dedupe_objects(writer):
+    """
+    合并 PdfWriter (非流式写出：合并、分割、分块拼接) 中内容相同的对象。
+    pypdf 的 compress_identical_objects 按对象号比较引用，一次只能合并最底层的重复对象 (字体程序、图片)；
+    引用它们的字体描述符、字体字典要到下一轮才相同，因此重复执行直到对象数不再减少 (轮数即引用深度)。
+    """
+    live = len(writer._objects)
+    while True:
+        writer.compress_identical_objects(remove_duplicates=True, remove_unreferenced=False)
+        remaining = sum(1 for obj in writer._objects if obj is not None)
+        if remaining == live: return
+        live = remaining
+
+
+class StreamingPdfWriter:
+    """
+    用法:
+        writer = StreamingPdfWriter(path)
+        writer.append_reader(reader)      # 可多次调用；返回追加的页数
+        writer.close(outline)             # outline: [(标题, 全局页码, 子节点列表)]
+    写出过程中使用 path + ".part"，close() 成功后才替换为目标文件；出错时调用 abort() 删除临时文件。
+    dedupe=True 时，内容相同的非页面对象 (各分卷重复嵌入的字体程序、图片等) 全文件只保留一份。
+    """
+
+    def __init__(self, path, dedupe=True):
+        self.path = path
+        self.dedupe = dedupe
+        self.shared = {}  # 内容摘要 -> 新对象号 (跨输入)
+        self.deduped = 0  # 被合并的对象数
+        self.offsets = {}  # 对象号 -> 文件偏移
+        self.generations = {}  # 对象号 -> 代号 (仅改写的已有对象可能非 0)
+        self.page_ids = []
+        self.next_id = 1
+        self._open()
+
+    def _open(self):
+        self.part_path = self.path + ".part"
+        self.f = open(self.part_path, "wb")
+        self.f.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self.root_id = self.reserve()
+        self.pages_id = self.reserve()
+
+    @property
+    def page_count(self):
+        return len(self.page_ids)
+
+    def reserve(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _ref(self, obj_id):
+        return IndirectObject(obj_id, self.generations.get(obj_id, 0), None)
+
+    def write_object(self, obj_id, obj, generation=0):
+        self.offsets[obj_id] = self.f.tell()
+        if generation: self.generations[obj_id] = generation
+        self.f.write(b"%d %d obj\n" % (obj_id, generation))
+        (NullObject() if obj is None else obj).write_to_stream(self.f)
+        self.f.write(b"\nendobj\n")
+
+    # --- 复制输入 ---
+    def append_reader(self, reader):
+        """
+        复制 reader 的全部页面。页面先分配对象号 (保证页内链接、注释 /P 等指向新页面)，
+        其余对象按引用关系广度优先复制；源文件的目录根与页面树根映射到本文件的对应对象，避免整棵树被复制。
+        """
+        mapping = {}
+        queue = []
+        digests = {}  # 源对象 -> 内容摘要 (None 表示不参与去重)
+
+        def ref(src):
+            key = (src.idnum, src.generation)
+            new_id = mapping.get(key)
+            if new_id is None:
+                digest = self._digest(src, digests) if self.dedupe else None
+                if digest is not None and digest in self.shared:
+                    new_id = mapping[key] = self.shared[digest]
+                    self.deduped += 1
+                else:
+                    new_id = mapping[key] = self.reserve()
+                    if digest is not None: self.shared[digest] = new_id
+                    queue.append((new_id, src))
+            return IndirectObject(new_id, 0, None)
+
+        root = reader.trailer.raw_get("/Root")
+        if isinstance(root, IndirectObject):
+            mapping[(root.idnum, root.generation)] = self.root_id
+            digests[(root.idnum, root.generation)] = None
+            pages_root = root.get_object().raw_get("/Pages")
+            if isinstance(pages_root, IndirectObject):
+                mapping[(pages_root.idnum, pages_root.generation)] = self.pages_id
+                digests[(pages_root.idnum, pages_root.generation)] = None
+
+        pages = {}
+        for page in reader.pages:
+            src = page.indirect_reference
+            if src is not None: digests[(src.idnum, src.generation)] = None  # 页面及引用页面的对象不去重
+            new_id = ref(src).idnum if src is not None else self.reserve()
+            pages[new_id] = page
+            self.page_ids.append(new_id)
+            if src is None: queue.append((new_id, None))
+
+        pages_ref = IndirectObject(self.pages_id, 0, None)
+        pos = 0
+        while pos < len(queue):
+            new_id, src = queue[pos]
+            pos += 1
+            page = pages.get(new_id)
+            if page is not None:
+                # 使用 reader.pages 中的页面对象：继承属性 (Resources/MediaBox 等) 已由 pypdf 展开到页面上
+                obj = self._remap(page, ref, skip=("/Parent",))
+                obj[NameObject("/Parent")] = pages_ref
+            else:
+                obj = self._remap(src.get_object(), ref)
+            self.write_object(new_id, obj)
+            queue[pos - 1] = None  # 已写出的对象不再持有
+        return len(pages)
+
+    def _digest(self, src, digests):
+        """
+        对象内容摘要：引用以被引用对象的摘要代替，因此只有整棵子树都相同的对象才会被合并。
+        成环或触及页面的对象返回 None (不去重)。
+        """
+        key = (src.idnum, src.generation)
+        if key in digests: return digests[key]
+        digests[key] = None  # 递归途中再次遇到即视为成环
+        try:
+            h = hashlib.sha256()
+            self._canonical(src.get_object(), digests, h)
+            digests[key] = h.digest()
+        except (_NotShareable, RecursionError):
+            pass
+        return digests[key]
+
+    def _canonical(self, obj, digests, h):
+        if isinstance(obj, IndirectObject):
+            digest = self._digest(obj, digests)
+            if digest is None: raise _NotShareable
+            h.update(b"R" + digest)
+        elif isinstance(obj, StreamObject):
+            self._canonical_dict(obj, digests, h, skip="/Length")
+            h.update(b"stream")
+            h.update(hashlib.sha256(obj._data).digest())
+        elif isinstance(obj, DictionaryObject):
+            self._canonical_dict(obj, digests, h)
+        elif isinstance(obj, ArrayObject):
+            h.update(b"[")
+            for value in obj: self._canonical(value, digests, h)
+            h.update(b"]")
+        else:
+            buf = io.BytesIO()
+            (NullObject() if obj is None else obj).write_to_stream(buf)
+            h.update(buf.getvalue())
+            h.update(b" ")
+
+    def _canonical_dict(self, obj, digests, h, skip=None):
+        h.update(b"<<")
+        for key in sorted(obj.keys()):
+            if key == skip: continue
+            h.update(key.encode("utf-8") + b" ")
+            self._canonical(obj.raw_get(key), digests, h)
+        h.update(b">>")
+
+    def _remap(self, obj, ref, skip=()):
+        """复制对象，间接引用替换为新对象号；流数据保持原始编码直接写出"""
+        if isinstance(obj, IndirectObject):
+            return ref(obj)
+        if isinstance(obj, StreamObject):
+            new = EncodedStreamObject() if "/Filter" in obj else DecodedStreamObject()
+            for key, value in obj.items():
+                if key != "/Length": new[NameObject(key)] = self._remap(value, ref)
+            new._data = obj._data
+            return new
+        if isinstance(obj, DictionaryObject):
+            new = DictionaryObject()
+            for key, value in obj.items():
+                if key not in skip: new[NameObject(key)] = self._remap(value, ref)
+            return new
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._remap(value, ref) for value in obj)
+        return obj
+
+    # --- 收尾 ---
+    def _write_outline_items(self, nodes, parent_id, prev_id=None):
+        """写出同一层级的目录项 (prev_id: 第一项之前已存在的同级项)；返回 (对象号列表, 含子孙的项数)"""
+        nodes = [n for n in nodes if 0 <= n[1] < len(self.page_ids)]
+        ids = [self.reserve() for _ in nodes]
+        total = len(nodes)
+        for i, (title, page_index, children) in enumerate(nodes):
+            item = DictionaryObject({
+                NameObject("/Title"): TextStringObject(title),
+                NameObject("/Parent"): self._ref(parent_id),
+                NameObject("/Dest"): ArrayObject([self._ref(self.page_ids[page_index]), NameObject("/Fit")]),
+            })
+            prev = ids[i - 1] if i > 0 else prev_id
+            if prev is not None: item[NameObject("/Prev")] = self._ref(prev)
+            if i < len(ids) - 1: item[NameObject("/Next")] = self._ref(ids[i + 1])
+            child_ids, count = self._write_outline_items(children, ids[i]) if children else ([], 0)
+            if child_ids:
+                item[NameObject("/First")] = self._ref(child_ids[0])
+                item[NameObject("/Last")] = self._ref(child_ids[-1])
+                item[NameObject("/Count")] = NumberObject(count)
+                total += count
+            self.write_object(ids[i], item)
+        return ids, total
+
+    def close(self, outline=None):
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): self._ref(self.pages_id),
+        })
+        if outline:
+            outlines_id = self.reserve()
+            ids, count = self._write_outline_items(outline, outlines_id)
+            if ids:
+                self.write_object(outlines_id, DictionaryObject({
+                    NameObject("/Type"): NameObject("/Outlines"),
+                    NameObject("/First"): self._ref(ids[0]),
+                    NameObject("/Last"): self._ref(ids[-1]),
+                    NameObject("/Count"): NumberObject(count),
+                }))
+                catalog[NameObject("/Outlines")] = self._ref(outlines_id)
+
+        self.write_object(self.pages_id, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(self._ref(i) for i in self.page_ids),
+            NameObject("/Count"): NumberObject(len(self.page_ids)),
+        }))
+        self.write_object(self.root_id, catalog)
+        self._write_xref_table(b"/Root %d 0 R" % self.root_id, full=True)
+        self.f.close()
+        os.replace(self.part_path, self.path)
+
+    def _write_xref_table(self, trailer, full):
+        """
+        写出传统 xref 表与 trailer。full=True 时覆盖 0..Size-1 全部对象号 (新文件)；
+        否则只列出本次写出的对象，按连续对象号分段 (增量更新)。
+        """
+        xref_offset = self.f.tell()
+        size = self.next_id
+        # 增量段同样以 0 号空闲项开头 (常见写法；部分阅读器据首段起始号判断 xref 是否需要修正)
+        ids = range(size) if full else [0] + sorted(self.offsets)
+        lines = [b"xref\n"]
+        run = []
+        for obj_id in ids:
+            if run and obj_id != run[-1] + 1:
+                lines.append(self._xref_section(run))
+                run = []
+            run.append(obj_id)
+        if run: lines.append(self._xref_section(run))
+        self.f.write(b"".join(lines))
+        self.f.write(b"trailer\n<< /Size %d %s >>\nstartxref\n%d\n%%%%EOF\n" % (size, trailer, xref_offset))
+
+    def _xref_section(self, run):
+        entries = [b"%d %d\n" % (run[0], len(run))]
+        for obj_id in run:
+            offset = self.offsets.get(obj_id)
+            if offset is None:
+                entries.append(b"0000000000 65535 f \n")
+            else:
+                entries.append(b"%010d %05d n \n" % (offset, self.generations.get(obj_id, 0)))
+        return b"".join(entries)
+
+    def abort(self):
+        try:
+            self.f.close()
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+
+class IncrementalPdfWriter(StreamingPdfWriter):
+    """
+    [v3.8.0] 向已有 PDF 追加页面 (PDF 增量更新)：原文件内容保持不变，只在末尾写入
+    新页面及其资源、挂在页面树根下的新 Pages 节点、改写后的页面树根/目录根 (及原最后一个一级目录项)、
+    以及一个 /Prev 指向原 xref 的新 xref 段。耗时只取决于追加的内容。
+    - 原文件使用 xref 流时，新 xref 段同样写成 xref 流；否则写传统 xref 表。
+    - 出错时 abort() 把文件截断回原长度。加密的 PDF 不支持。
+    """
+
+    def _open(self):
+        reader = PdfReader(self.path)
+        if reader.is_encrypted: raise ValueError("不支持向加密的 PDF 追加")
+        self.trailer = reader.trailer
+        self.catalog_ref = reader.trailer.raw_get("/Root")
+        self.catalog = self.catalog_ref.get_object()
+        self.base_pages_ref = self.catalog.raw_get("/Pages")
+        self.next_id = int(reader.trailer["/Size"])
+        self.root_id = self.catalog_ref.idnum
+
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            self.base_size = f.tell()
+            f.seek(max(0, self.base_size - 1024))
+            match = _STARTXREF.findall(f.read())
+            if not match: raise ValueError("找不到 startxref，文件可能已损坏")
+            self.prev_xref = int(match[-1])
+            f.seek(self.prev_xref)
+            self.xref_stream = not f.read(4).startswith(b"xref")
+
+        self.f = open(self.path, "r+b")
+        self.f.seek(0, os.SEEK_END)
+        self.f.write(b"\n")
+        # 新页面统一挂在一个新的中间 Pages 节点下，原页面树只需改写根节点
+        self.pages_id = self.reserve()
+
+    def _rewrite(self, ref, obj):
+        self.write_object(ref.idnum, obj, ref.generation)
+
+    def close(self, outline=None):
+        base_pages = self.base_pages_ref.get_object()
+        self.write_object(self.pages_id, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Parent"): self.base_pages_ref,
+            NameObject("/Kids"): ArrayObject(self._ref(i) for i in self.page_ids),
+            NameObject("/Count"): NumberObject(len(self.page_ids)),
+        }))
+        root = DictionaryObject(base_pages.items())
+        # /Kids 可能是间接数组：取解析后的内容，改写为直接数组
+        root[NameObject("/Kids")] = ArrayObject(list(base_pages["/Kids"]) + [self._ref(self.pages_id)])
+        root[NameObject("/Count")] = NumberObject(int(base_pages["/Count"]) + len(self.page_ids))
+        self._rewrite(self.base_pages_ref, root)
+
+        if outline: self._append_outline(outline)
+
+        trailer = b"/Root %d %d R /Prev %d" % (self.catalog_ref.idnum, self.catalog_ref.generation, self.prev_xref)
+        extra = {key: self.trailer.raw_get(key) for key in ("/Info", "/ID") if key in self.trailer}
+        if self.xref_stream:
+            self._write_xref_stream(extra)
+        else:
+            for key, value in extra.items():
+                buf = io.BytesIO()
+                value.write_to_stream(buf)
+                trailer += b" %s %s" % (key.encode("latin-1"), buf.getvalue())
+            self._write_xref_table(trailer, full=False)
+        self.f.close()
+
+    def _append_outline(self, outline):
+        """
+        新的一级目录项接在原目录最后一项之后；原文件没有目录时新建目录根。
+        目录根是 Catalog 中的直接字典时 (少数生成器如此输出)，将其提升为间接对象并改写 Catalog。
+        """
+        outlines_ref = self.catalog.raw_get("/Outlines") if "/Outlines" in self.catalog else None
+        indirect = isinstance(outlines_ref, IndirectObject)
+        root = outlines_ref.get_object() if outlines_ref is not None else None
+        if not hasattr(root, "raw_get"): root = None
+        last_ref = self._last_outline_item(root) if root is not None else None
+
+        outlines_id = outlines_ref.idnum if indirect else self.reserve()
+        if indirect: self.generations.setdefault(outlines_id, outlines_ref.generation)
+        if last_ref is not None: self.generations.setdefault(last_ref.idnum, last_ref.generation)
+        ids, count = self._write_outline_items(outline, outlines_id,
+                                               prev_id=last_ref.idnum if last_ref is not None else None)
+        if not ids: return
+
+        if last_ref is None:
+            new_root = DictionaryObject({
+                NameObject("/Type"): NameObject("/Outlines"),
+                NameObject("/First"): self._ref(ids[0]),
+                NameObject("/Last"): self._ref(ids[-1]),
+                NameObject("/Count"): NumberObject(count),
+            })
+        else:
+            last = DictionaryObject(last_ref.get_object().items())
+            last[NameObject("/Next")] = self._ref(ids[0])
+            self._rewrite(last_ref, last)
+
+            new_root = DictionaryObject(root.items())
+            new_root[NameObject("/Last")] = self._ref(ids[-1])
+            old = int(root.get("/Count", 0))
+            new_root[NameObject("/Count")] = NumberObject(old + count if old >= 0 else old - count)
+        self.write_object(outlines_id, new_root, self.generations.get(outlines_id, 0))
+
+        if not indirect:
+            catalog = DictionaryObject(self.catalog.items())
+            catalog[NameObject("/Outlines")] = self._ref(outlines_id)
+            self._rewrite(self.catalog_ref, catalog)
+
+    @staticmethod
+    def _last_outline_item(root):
+        """原目录的最后一个一级目录项 (间接引用)；优先取 /Last，缺失时沿 /First -> /Next 链查找；没有目录项时返回 None"""
+        last = root.raw_get("/Last") if "/Last" in root else None
+        if isinstance(last, IndirectObject): return last
+        node = root.raw_get("/First") if "/First" in root else None
+        seen = set()
+        while isinstance(node, IndirectObject) and node.idnum not in seen:
+            seen.add(node.idnum)
+            item = node.get_object()
+            following = item.raw_get("/Next") if "/Next" in item else None
+            if not isinstance(following, IndirectObject): return node
+            node = following
+        return None
+
+    def _write_xref_stream(self, extra):
+        xref_id = self.reserve()
+        offset = self.f.tell()
+        self.offsets[xref_id] = offset
+        ids = sorted(self.offsets)
+        width = max(4, (offset.bit_length() + 7) // 8)
+        index = []
+        rows = []
+        for obj_id in ids:
+            if index and index[-2] + index[-1] == obj_id:
+                index[-1] += 1
+            else:
+                index.extend([obj_id, 1])
+            rows.append(b"\x01" + self.offsets[obj_id].to_bytes(width, "big") +
+                        self.generations.get(obj_id, 0).to_bytes(2, "big"))
+        stream = DecodedStreamObject()
+        stream.set_data(b"".join(rows))
+        stream.update({
+            NameObject("/Type"): NameObject("/XRef"),
+            NameObject("/Size"): NumberObject(self.next_id),
+            NameObject("/Index"): ArrayObject(NumberObject(i) for i in index),
+            NameObject("/W"): ArrayObject([NumberObject(1), NumberObject(width), NumberObject(2)]),
+            NameObject("/Root"): self.catalog_ref,
+            NameObject("/Prev"): NumberObject(self.prev_xref),
+        })
+        for key, value in extra.items(): stream[NameObject(key)] = value
+        self.write_object(xref_id, stream)
+        self.f.write(b"startxref\n%d\n%%%%EOF\n" % offset)
+
+    def abort(self):
+        try:
+            self.f.truncate(self.base_size)
+            self.f.close()
+        except OSError:
+            pass
@@ -0,0 +1,141 @@
+# core/render_cache.py
+# Version: v3.8.0_Render_Cache
+# Last Updated: 2026-10-17
+# Description: 内容寻址的章节渲染缓存。键 = 清洗后 HTML + 生成的 CSS + 引用图片字节 + WeasyPrint 版本；按容量上限 LRU 淘汰。
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from weasyprint import __version__ as WEASYPRINT_VERSION
+
+from config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB
+
+# _clean_and_fix_html 改写后的本地图片地址：file:///<绝对路径>
+_FILE_URL_RE = re.compile(r'file:///([^"\'\s>)]+)')
+_TEMP_PLACEHOLDER = "{TEMP_DIR}"
+EVICT_TARGET_RATIO = 0.9  # 淘汰到上限的 90%，避免缓存满后每次写入都触发全量扫描
+RESCAN_PUTS = 256  # 每写入这么多条目重新扫描一次目录，校正其它进程写入造成的体积偏差
+
+
+class RenderCache:
+    """
+    磁盘渲染缓存。
+    - 每个条目为 <key><ext> (默认 .pdf)，可附带 <key>.json 元数据 (如分块的页数与书签)。
+    - 命中时刷新文件 mtime，淘汰时按 mtime 从旧到新删除，直至总体积回到上限的 EVICT_TARGET_RATIO 以内。
+    - 总体积在进程内累计维护：首次写入时扫描一次目录，之后仅在累计值超过上限 (或每 RESCAN_PUTS 次写入) 时重新扫描。
+    - 写入采用 临时文件 + os.replace，多个转换进程共享同一目录也不会读到半截文件。
+    """
+
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_mb=RENDER_CACHE_MAX_MB, ext=".pdf"):
+        self.cache_dir = cache_dir
+        self.ext = ext
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._size = None  # 缓存目录中条目的总字节数 (None 表示尚未扫描)
+        self._puts = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(html_string, css_string, temp_dir):
+        """
+        计算缓存键。HTML 中的临时目录路径每次运行都不同，先替换为占位符再参与哈希；
+        被引用的图片按文件内容计入，图片变化即视为新键。
+        """
+        temp_url = temp_dir.replace(os.sep, '/')
+        h = hashlib.sha256()
+        h.update(WEASYPRINT_VERSION.encode())
+        h.update(b"\0")
+        h.update(css_string.encode("utf-8"))
+        h.update(b"\0")
+        h.update(html_string.replace(temp_url, _TEMP_PLACEHOLDER).encode("utf-8"))
+        for path in sorted(set(_FILE_URL_RE.findall(html_string))):
+            h.update(b"\0")
+            h.update(path.replace(temp_url, _TEMP_PLACEHOLDER).encode("utf-8"))
+            try:
+                with open(path, "rb") as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+            except OSError:
+                pass
+        return h.hexdigest()
+
+    def _entry(self, key, ext):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{ext}")
+
+    def get(self, key, dest_path):
+        """命中则复制到 dest_path，返回元数据字典 (无元数据时为空字典)；未命中返回 None"""
+        entry_path = self._entry(key, self.ext)
+        try:
+            meta = {}
+            meta_path = self._entry(key, ".json")
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            shutil.copyfile(entry_path, dest_path)
+            os.utime(entry_path, None)
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, src_path, meta=None):
+        try:
+            entry_path = self._entry(key, self.ext)
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            if meta is not None:
+                self._atomic_write(self._entry(key, ".json"),
+                                   json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            try:
+                replaced = os.path.getsize(entry_path)
+            except OSError:
+                replaced = 0
+            with open(src_path, "rb") as f:
+                data = f.read()
+            self._atomic_write(entry_path, data)
+            self._puts += 1
+            if self._size is None or self._puts % RESCAN_PUTS == 0:
+                self.evict()
+            else:
+                self._size += len(data) - replaced
+                if self._size > self.max_bytes: self.evict()
+        except OSError:
+            pass
+
+    def _atomic_write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+
+    def evict(self):
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.ext): continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        self._size = total
+        if total <= self.max_bytes: return
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        for _mtime, size, path in sorted(entries):
+            try:
+                os.remove(path)
+                meta_path = path[:-len(self.ext)] + ".json"
+                if os.path.exists(meta_path): os.remove(meta_path)
+                total -= size
+            except OSError:
+                continue
+            if total <= target: break
+        self._size = total
@@ -0,0 +1,56 @@
+# core/render_context.py
+# Version: v3.8.0_Render_Context
+# Last Updated: 2026-10-17
+# Description: 进程级常驻渲染上下文。按排版设置 (生成的 CSS) 复用 FontConfiguration 与已解析的样式表，批量任务中不再逐本冷启动。
+
+import hashlib
+
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+# 预热用的样本：覆盖中文正文字体与页码所用的西文衬线体
+_WARM_UP_HTML = "<html><body><p>预热 Warm-up 0123</p></body></html>"
+
+
+class RenderContext:
+    """
+    渲染上下文：一个进程内每套排版设置只建立一次。
+    - font_config：Pango/fontconfig 字体映射与 @font-face 解析结果，跨章节、跨书籍复用。
+    - css：主样式表 (由 ConverterEngine._generate_css 生成)，只解析一次。
+    - stylesheet(extra)：附加小样式表 (如分块起始页码) 的解析缓存。
+    """
+    _contexts = {}
+    _MAX_CONTEXTS = 8  # 同一进程内很少出现多套设置，超出时淘汰最早建立的
+    _MAX_EXTRA = 256
+
+    def __init__(self, css_string):
+        self.font_config = FontConfiguration()
+        self.css = CSS(string=css_string, font_config=self.font_config)
+        self._extra = {}
+        self.warm = False
+
+    @classmethod
+    def get(cls, css_string):
+        key = hashlib.sha1(css_string.encode("utf-8")).hexdigest()
+        ctx = cls._contexts.get(key)
+        if ctx is None:
+            if len(cls._contexts) >= cls._MAX_CONTEXTS:
+                cls._contexts.pop(next(iter(cls._contexts)))
+            ctx = cls._contexts[key] = cls(css_string)
+        return ctx
+
+    def stylesheet(self, css_string):
+        sheet = self._extra.get(css_string)
+        if sheet is None:
+            if len(self._extra) >= self._MAX_EXTRA: self._extra.clear()
+            sheet = self._extra[css_string] = CSS(string=css_string, font_config=self.font_config)
+        return sheet
+
+    def warm_up(self):
+        """排版一段样本文字，提前完成 fontconfig 查询与字体加载 (每个上下文只执行一次)"""
+        if self.warm: return
+        try:
+            HTML(string=_WARM_UP_HTML).render(stylesheets=[self.css], font_config=self.font_config)
+        except Exception:
+            pass
+        self.warm = True
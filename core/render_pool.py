@@ -0,0 +1,260 @@
+# core/render_pool.py
+# Version: v3.8.0_Render_Pool
+# Last Updated: 2026-10-17
+# Description: 多进程渲染池。WeasyPrint 排版为纯 CPU 计算，按章节分发到子进程并行执行；
+#              单进程渲染 (workers=1、单文件分块、直接合并) 同样在子进程中进行，停止时可立即强杀。
+
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import psutil
+
+# [v3.8.0] 进程池在同一进程内跨书籍复用；池内每个子进程通过 RenderContext 常驻字体配置与样式表。
+# 子进程启动时经 events 队列上报自己的 PID (由本模块自行登记，强杀时不依赖 ProcessPoolExecutor 的内部字段)，
+# 运行中的任务也可经同一队列上报进度。
+_shared_pool = {'executor': None, 'workers': 0, 'events': None, 'pids': set()}
+_worker_events = None  # 子进程内：上报队列
+
+
+def _init_worker(css_string, events):
+    global _worker_events
+    _worker_events = events
+    events.put(('pid', os.getpid()))
+    from core.render_context import RenderContext
+    RenderContext.get(css_string).warm_up()
+
+
+def _report(*event):
+    """子进程内：向主进程上报进度 (队列不可用时忽略)"""
+    if _worker_events is not None: _worker_events.put(event)
+
+
+def _render_chapter(html_string, base_url, out_path, css_string):
+    """子进程入口：渲染单个章节并写入磁盘；返回 (out_path, 计时统计)"""
+    from weasyprint import HTML
+    from core.render_context import RenderContext
+    from utils.memory import PeakRssSampler
+    from utils.telemetry import RSS_SAMPLE_INTERVAL_S
+    start = time.perf_counter()
+    ctx = RenderContext.get(css_string)
+    with PeakRssSampler(os.getpid(), interval=RSS_SAMPLE_INTERVAL_S) as sampler:
+        document = HTML(string=html_string, base_url=base_url).render(
+            stylesheets=[ctx.css], font_config=ctx.font_config)
+        document.write_pdf(out_path)
+    return out_path, {'duration_s': time.perf_counter() - start, 'pages': len(document.pages),
+                      'peak_rss_mb': sampler.peak_mb}
+
+
+def render_chunk_job(html_string, base_url, out_path, css_string, extra_css=""):
+    """
+    子进程入口 (单文件分块)：排版并写盘；返回 (页数, [(层级, 标题, 块内页码)], 锚点, 未解析链接, 计时统计)。
+    锚点为 {名称: (块内页码, x, y)}，未解析链接为目标不在本块内的内部链接 [(块内页码, 锚点, (x0, y0, x1, y1))]，
+    WeasyPrint 写盘时会丢弃后者，由拼接阶段补回 (见 PDFMergerEngine.stitch)。
+    extra_css 为附加样式 (如分块起始页码)，经 RenderContext 缓存解析结果。
+    """
+    from weasyprint import HTML
+    from core.render_context import RenderContext
+    from utils.memory import PeakRssSampler
+    from utils.telemetry import RSS_SAMPLE_INTERVAL_S
+    ctx = RenderContext.get(css_string)
+    stylesheets = [ctx.css] + ([ctx.stylesheet(extra_css)] if extra_css else [])
+    with PeakRssSampler(os.getpid(), interval=RSS_SAMPLE_INTERVAL_S) as sampler:
+        start = time.perf_counter()
+        document = HTML(string=html_string, base_url=base_url).render(
+            stylesheets=stylesheets, font_config=ctx.font_config)
+        layout_s = time.perf_counter() - start
+        start = time.perf_counter()
+        document.write_pdf(out_path)
+        write_s = time.perf_counter() - start
+    marks = [(level, title, page_index)
+             for page_index, page in enumerate(document.pages)
+             for level, title, _target, _state in page.bookmarks]
+    anchors = {}
+    for page_index, page in enumerate(document.pages):
+        for name, (x, y) in page.anchors.items():
+            anchors.setdefault(name, (page_index, x, y))
+    links = [(page_index, target, tuple(rect))
+             for page_index, page in enumerate(document.pages)
+             for link_type, target, rect, _box in page.links
+             if link_type == 'internal' and target not in anchors]
+    return len(document.pages), marks, anchors, links, {'layout_s': layout_s, 'write_s': write_s,
+                                                        'peak_rss_mb': sampler.peak_mb}
+
+
+def render_direct_job(chapters, base_url, out_path, css_string):
+    """
+    子进程入口 (分卷 + 直接合并)：逐章排版并保留文档，合成一个文档一次写出全本。
+    chapters 为 [(标题, HTML)]；每章一个一级书签，章内书签降一级挂在其下 (与 PDFMergerEngine.merge 一致)。
+    每章完成时上报 ('chapter', 序号, 章数, 标题)。返回 (总页数, [(标题, 耗时, 页数)], 写出耗时, 峰值 RSS)。
+    """
+    from weasyprint import HTML
+    from core.render_context import RenderContext
+    from utils.memory import PeakRssSampler
+    from utils.telemetry import RSS_SAMPLE_INTERVAL_S
+    ctx = RenderContext.get(css_string)
+    documents = []
+    pages = []
+    stats = []
+    with PeakRssSampler(os.getpid(), interval=RSS_SAMPLE_INTERVAL_S) as sampler:
+        for n, (title, html_string) in enumerate(chapters):
+            start = time.perf_counter()
+            document = HTML(string=html_string, base_url=base_url).render(
+                stylesheets=[ctx.css], font_config=ctx.font_config)
+            stats.append((title, time.perf_counter() - start, len(document.pages)))
+            _report('chapter', n + 1, len(chapters), title)
+            if not document.pages: continue
+            for page in document.pages:
+                page.bookmarks = [(level + 1, label, target, state)
+                                  for level, label, target, state in page.bookmarks]
+            document.pages[0].bookmarks.insert(0, (1, title, (0, 0), 'open'))
+            documents.append(document)
+            pages.extend(document.pages)
+
+        write_s = 0.0
+        if pages:
+            start = time.perf_counter()
+            documents[0].copy(pages).write_pdf(out_path)
+            write_s = time.perf_counter() - start
+    return len(pages), stats, write_s, sampler.peak_mb
+
+
+def _acquire_executor(workers, css_string):
+    """取得共享进程池；进程数变化时才重建"""
+    if _shared_pool['executor'] is None or _shared_pool['workers'] != workers:
+        _release_executor(cancel=False)
+        events = multiprocessing.Queue()
+        _shared_pool['executor'] = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                       initargs=(css_string, events))
+        _shared_pool['workers'] = workers
+        _shared_pool['events'] = events
+    return _shared_pool['executor']
+
+
+def _drain_events():
+    """读取子进程上报：登记 PID，返回其它事件 (进度等)"""
+    events = _shared_pool['events']
+    other = []
+    while events is not None:
+        try:
+            event = events.get_nowait()
+        except (queue.Empty, OSError, ValueError):
+            break
+        if event[0] == 'pid':
+            _shared_pool['pids'].add(event[1])
+        else:
+            other.append(event)
+    return other
+
+
+def _reset_pool():
+    events = _shared_pool['events']
+    if events is not None:
+        events.close()
+        events.cancel_join_thread()
+    _shared_pool.update(executor=None, workers=0, events=None, pids=set())
+
+
+def _release_executor(cancel):
+    if _shared_pool['executor'] is not None:
+        _shared_pool['executor'].shutdown(wait=True, cancel_futures=cancel)
+        _reset_pool()
+
+
+def _kill_executor():
+    """强杀共享进程池的子进程 (正在执行的 write_pdf 无法在进程内中断)；池随之失效，下次使用时重建"""
+    executor = _shared_pool['executor']
+    if executor is None: return
+    _drain_events()
+    for pid in _shared_pool['pids']:
+        try:
+            psutil.Process(pid).kill()
+        except psutil.Error:
+            pass
+    executor.shutdown(wait=False, cancel_futures=True)
+    _reset_pool()
+
+
+def shutdown_shared_pool():
+    """进程退出前关闭共享进程池 (multiprocessing 子进程退出时不会执行 concurrent.futures 的 atexit 清理)"""
+    _release_executor(cancel=True)
+
+
+def default_worker_count():
+    """默认保留一个核心给 GUI 主进程"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class ChapterRenderPool:
+    """
+    章节渲染池。
+    - 始终在子进程中渲染 (workers <= 1 时为单个子进程)，terminate() 可随时强杀正在进行的排版/写出。
+    - 提交顺序与完成顺序无关，结果按章节序号回收。
+    - call() 同步执行单个任务 (单文件分块、直接合并)，等待期间轮询停止检查与子进程上报的进度。
+    """
+
+    def __init__(self, css_string, workers=1, on_done=None):
+        self.css_string = css_string
+        self.on_done = on_done  # 章节完成回调 on_done(idx, out_path, stats)，在主进程中调用
+        self.workers = max(1, int(workers or 1))
+        self.max_pending = self.workers * 2  # 限制在途任务数，避免章节 HTML 堆积在内存中
+        self.pending = {}  # future -> idx
+        self.results = {}  # idx -> out_path
+        self.executor = _acquire_executor(self.workers, css_string)
+
+    def call(self, fn, *args, check_stop=None, on_event=None):
+        """在子进程中执行 fn(*args) 并等待结果；check_stop() 抛出异常即放弃等待 (随后由 terminate 强杀)"""
+        future = self.executor.submit(fn, *args)
+        while True:
+            done, _ = wait([future], timeout=0.5)
+            for event in _drain_events():
+                if on_event: on_event(*event)
+            if done: return future.result()
+            if check_stop: check_stop()
+
+    def submit(self, idx, html_string, base_url, out_path):
+        """提交一个章节；返回本次调用期间新完成的章节数"""
+        finished = 0
+        while len(self.pending) >= self.max_pending:
+            finished += self.collect(timeout=0.5)
+        future = self.executor.submit(_render_chapter, html_string, base_url, out_path, self.css_string)
+        self.pending[future] = idx
+        return finished
+
+    def collect(self, timeout=None):
+        """回收已完成的任务；子进程中的异常在此处重新抛出"""
+        if not self.pending: return 0
+        done, _ = wait(list(self.pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        _drain_events()
+        for future in done:
+            idx = self.pending.pop(future)
+            self._record(idx, *future.result())
+        return len(done)
+
+    def add_result(self, idx, out_path):
+        """登记无需渲染的章节 (如缓存命中)，保证最终结果顺序完整"""
+        self.results[idx] = out_path
+
+    def _record(self, idx, out_path, stats):
+        self.results[idx] = out_path
+        if self.on_done: self.on_done(idx, out_path, stats)
+
+    def has_pending(self):
+        return bool(self.pending)
+
+    def ordered_results(self):
+        return [self.results[i] for i in sorted(self.results)]
+
+    def terminate(self):
+        """立即终止：强杀池内子进程，等待中的 collect() 随即抛出 BrokenProcessPool (可从其它线程调用)"""
+        if self.executor:
+            _kill_executor()
+
+    def shutdown(self, cancel=False):
+        """正常结束时保留共享进程池供下一本书复用；取消时连同子进程一并关闭"""
+        if self.executor and cancel:
+            _release_executor(cancel=True)
+        self.executor = None
+        self.pending = {}
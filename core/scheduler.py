@@ -0,0 +1,387 @@
+# core/scheduler.py
+# Version: v3.8.0_Batch_Scheduler (RSS Watchdog)
+# Last Updated: 2026-10-17
+# Description: 多书并发批量调度器。书籍分派到常驻子进程中运行 ConverterEngine，按内存预算准入，单本失败互不影响；
+#              单本 RSS 超出预算时由看门狗终止并降级重试；任一阶段超时即强杀并记为失败。
+
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+
+import psutil
+
+from config import BATCH_MAX_PARALLEL, BATCH_RAM_BUDGET_RATIO, BATCH_JOB_RAM_ESTIMATE_MB, STAGE_TIMEOUTS
+from core import incremental
+from core.watchdog import RssWatchdog
+from utils.logger import QueueCallbackManager
+from utils.memory import process_tree_rss_mb
+from utils.telemetry import TraceWriter, file_size
+
+
+def _run_job(job_id, src, out, settings, check, event_queue):
+    """
+    子进程入口：(指纹/增量检查) -> 结构分析 -> 转换 -> 清理分卷目录，结果通过队列回传。
+    check 为 'fingerprint' 时计算指纹并回传，为 'incremental' 时另外检查产物是否已是最新 (是则直接跳过)；
+    整本书的哈希在子进程中计算，不阻塞调度循环。
+    """
+    from core.converter import ConverterEngine
+
+    cb = QueueCallbackManager(event_queue, job_id)
+    try:
+        if check:
+            try:
+                fp = incremental.fingerprint(src, settings)
+            except OSError:
+                fp = None
+            event_queue.put(('fingerprint', job_id, fp))
+            if fp and check == 'incremental' and incremental.is_up_to_date(src, fp):
+                event_queue.put(('skipped', job_id))
+                return
+
+        # 分卷模式已支持锚点切片，单体结构不再强制切换为单文件，仅记录分析结果
+        _is_monolithic, report = ConverterEngine.analyze_structure(src)
+        cb.log(report.split('\n')[-2])
+
+        ok, msg, time_str, path, cleanup = ConverterEngine(src, out, settings, cb).run()
+        if ok and cleanup and os.path.exists(cleanup):
+            try:
+                shutil.rmtree(cleanup)
+            except Exception:
+                pass
+        event_queue.put(('result', job_id, ok, msg, time_str, path))
+    except Exception as e:
+        event_queue.put(('result', job_id, False, str(e), "0分0秒", ""))
+
+
+def _worker_main(inbox, outbox):
+    """常驻转换进程：依次领取任务；进程内的 RenderContext 与渲染池在书籍之间保持常驻"""
+    from core.render_pool import shutdown_shared_pool
+    try:
+        while True:
+            task = inbox.get()
+            if task is None: break
+            _run_job(*task, outbox)
+    finally:
+        shutdown_shared_pool()
+
+
+class _WorkerSlot:
+    """一个常驻转换进程及其专属收发队列 (强杀一个进程不会破坏其它进程的通信管道)"""
+
+    def __init__(self, ctx):
+        self.inbox = ctx.Queue()
+        self.outbox = ctx.Queue()
+        self.process = ctx.Process(target=_worker_main, args=(self.inbox, self.outbox))
+        self.process.start()
+        self.job = None
+
+
+class BatchJob:
+    """单本书的调度状态"""
+
+    def __init__(self, job_id, src, out, settings):
+        self.job_id = job_id
+        self.src = src
+        self.out = out
+        self.settings = settings
+        self.status = "pending"  # pending / running / success / failed / aborted
+        self.progress = 0.0
+        self.message = ""
+        self.slot = None
+        self.result = None
+        self.peak_rss_mb = 0.0  # 本书运行期间进程树 RSS 相对启动时基线的最大增量
+        self.rss_baseline_mb = 0.0  # 启动时常驻进程树的 RSS (渲染池、前几本书遗留的内存)
+        self.attempt = 0  # 看门狗降级重试次数
+        self.stage = None  # 当前流水线阶段 (read / extract / layout / write)
+        self.stage_started = 0.0
+        self.size_bytes = file_size(src)
+        self.started_at = 0.0
+        self.elapsed_s = 0.0
+        self.fingerprint = None  # 增量模式指纹 (首次运行时由子进程计算并回传)
+        self.skipped = False
+
+    @property
+    def name(self):
+        return os.path.basename(self.src)
+
+
+class BatchScheduler:
+    """
+    并发批量调度器。
+    - 至多 max_parallel 个常驻转换子进程，书籍依次分派给空闲进程，渲染上下文跨书籍复用。
+    - 新任务仅在 (运行中任务的实测 RSS + 预估值) 不超过内存预算时启动；至少保证一个任务在运行。
+    - 每本书的内存预算为 ram_budget_mb / max_parallel，按进程树 RSS 相对该书启动时基线的增量计
+      (常驻进程的渲染池与前几本书遗留的内存不算在后面的书上)；超出时看门狗强杀该进程，
+      以降级设置 (更小分块/更低图片 DPI/单进程，保留用户选择的模式) 重新排队，决定通过 cb (CallbackManager) 记录。
+    - 子进程上报阶段切换；单次停留在某阶段超过 STAGE_TIMEOUTS (可由 settings['stage_timeouts'] 覆盖) 即强杀并记为失败。
+    - 子进程上报的计时 span 转发为 'span' 事件，并可写入批次追踪文件 (trace_path，JSONL)。
+    - 成功的书籍在 EPUB 旁写入指纹；incremental=True 时指纹一致且产物完好的书籍直接跳过 (记为成功，skipped=True)。
+    - eta_seconds() 按已完成书籍的实测吞吐 (字节/秒) 与运行中书籍的进度估算剩余时间。
+    - stop_all() 在下一轮循环 (≤0.2 秒) 内强杀所有运行中的子进程 (含其渲染池)，未开始的任务标记为中止。
+    事件回调签名: on_event(kind, job, *payload)，kind 为 'start' / 'progress' / 'log' / 'stage' / 'span' / 'finish'。
+    """
+
+    def __init__(self, jobs, on_event=None, max_parallel=BATCH_MAX_PARALLEL, ram_budget_mb=None, cb=None,
+                 trace_path=None, incremental=False):
+        self.jobs = [BatchJob(i, src, out, settings) for i, (src, out, settings) in enumerate(jobs)]
+        self.on_event = on_event
+        self.max_parallel = max(1, int(max_parallel or 1))
+        if ram_budget_mb is None:
+            ram_budget_mb = psutil.virtual_memory().total / (1024 * 1024) * BATCH_RAM_BUDGET_RATIO
+        self.ram_budget_mb = ram_budget_mb
+        self.stop_requested = False
+        self.ctx = multiprocessing.get_context("spawn")
+        self.slots = []
+        self.watchdog = RssWatchdog(cb)
+        self.trace_path = trace_path
+        self.incremental = incremental
+        self.trace = None
+
+    # --- 对外接口 ---
+    def run(self):
+        """阻塞运行直到所有任务结束；返回 (成功数, 失败数, 中止数)"""
+        pending = list(self.jobs)
+        running = {}
+        if self.trace_path: self.trace = TraceWriter(self.trace_path)
+
+        while pending or running:
+            if self.stop_requested:
+                for job in pending: self._finish(job, "aborted", "任务中止")
+                pending = []
+                for job in list(running.values()): self._kill(job)
+            else:
+                while pending and len(running) < self.max_parallel and self._can_admit(running):
+                    job = pending.pop(0)
+                    self._start(job)
+                    running[job.job_id] = job
+
+            self._drain_events(running, timeout=0.2)
+            self._sample_memory(running)
+            self._enforce_budget(running, pending)
+            self._enforce_deadlines(running)
+            self._reap_dead(running)
+
+        self._close_slots()
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+        return (sum(j.status == "success" for j in self.jobs),
+                sum(j.status == "failed" for j in self.jobs),
+                sum(j.status == "aborted" for j in self.jobs))
+
+    def stop_all(self):
+        self.stop_requested = True
+
+    def overall_progress(self):
+        if not self.jobs: return 100.0
+        return sum(100.0 if j.status in ("success", "failed", "aborted") else j.progress
+                   for j in self.jobs) / len(self.jobs)
+
+    def eta_seconds(self):
+        """剩余时间估算 (秒)；尚无可用数据时返回 None"""
+        now = time.time()
+        done = [j for j in self.jobs if j.status == "success" and not j.skipped and j.elapsed_s > 0]
+        done_bytes = sum(j.size_bytes for j in done)
+        rate = done_bytes / sum(j.elapsed_s for j in done) if done_bytes else None  # 字节/秒
+
+        remaining = 0.0
+        for job in self.jobs:
+            if job.status == "running":
+                elapsed = now - job.started_at
+                if job.progress >= 5:
+                    remaining += elapsed * (100 - job.progress) / job.progress
+                elif rate:
+                    remaining += max(0.0, job.size_bytes / rate - elapsed)
+                else:
+                    return None
+            elif job.status == "pending":
+                if not rate: return None
+                remaining += job.size_bytes / rate
+        return remaining / self.max_parallel
+
+    # --- 内部逻辑 ---
+    def _emit(self, kind, job, *payload):
+        if self.on_event:
+            self.on_event(kind, job, *payload)
+
+    def _start(self, job):
+        slot = next((s for s in self.slots if s.job is None), None)
+        if slot is None:
+            slot = _WorkerSlot(self.ctx)
+            self.slots.append(slot)
+        job.status = "running"
+        job.started_at = time.time()
+        job.stage = None
+        job.slot = slot
+        job.rss_baseline_mb = self._slot_rss_mb(job)
+        slot.job = job
+        # 成本模型与看门狗都按单本书可用的内存份额决策
+        job.settings = dict(job.settings)
+        job.settings.setdefault('ram_budget_mb', self.ram_budget_mb / self.max_parallel)
+        # 指纹只按首次 (未降级) 的设置计算；降级重试的产物不记录，无需再算
+        check = None if job.attempt else ('incremental' if self.incremental else 'fingerprint')
+        slot.inbox.put((job.job_id, job.src, job.out, job.settings, check))
+        self._emit("start", job)
+
+    def _finish(self, job, status, message):
+        if job.started_at: job.elapsed_s = time.time() - job.started_at
+        job.status = status
+        job.message = message
+        job.progress = 100.0
+        if job.slot:
+            job.slot.job = None
+            job.slot = None
+        self._emit("finish", job)
+
+    def _close_slots(self):
+        for slot in self.slots:
+            slot.inbox.put(None)
+        for slot in self.slots:
+            slot.process.join(timeout=5)
+            if slot.process.is_alive(): self._kill_slot(slot)
+        self.slots = []
+
+    @staticmethod
+    def _slot_rss_mb(job):
+        """常驻进程及其渲染池的总 RSS"""
+        return process_tree_rss_mb(job.slot.process.pid) if job.slot else 0.0
+
+    def _job_rss_mb(self, job):
+        """本书占用的内存：进程树 RSS 相对启动时基线的增量"""
+        return max(0.0, self._slot_rss_mb(job) - job.rss_baseline_mb)
+
+    def _estimate_job_mb(self):
+        observed = [j.peak_rss_mb for j in self.jobs if j.peak_rss_mb > 0]
+        return max(observed) if observed else BATCH_JOB_RAM_ESTIMATE_MB
+
+    def _can_admit(self, running):
+        if not running: return True
+        in_use = sum(self._slot_rss_mb(j) for j in running.values())
+        estimate = self._estimate_job_mb()
+        available = psutil.virtual_memory().available / (1024 * 1024)
+        return in_use + estimate <= self.ram_budget_mb and estimate <= available
+
+    def _sample_memory(self, running):
+        for job in running.values():
+            job.peak_rss_mb = max(job.peak_rss_mb, self._job_rss_mb(job))
+
+    def _enforce_budget(self, running, pending):
+        """看门狗：RSS 超出单本预算的任务立即强杀，按降级设置插回队首，或在重试用尽后记为失败"""
+        if self.stop_requested: return
+        for job in list(running.values()):
+            rss = self._job_rss_mb(job)
+            if not self.watchdog.over_budget(job, rss): continue
+
+            self._discard(running, job)
+            new_settings = self.watchdog.plan_retry(job, rss)
+            if new_settings is None:
+                self._finish(job, "failed", f"内存超限 (RSS {rss:.0f}MB)")
+                continue
+            job.settings = new_settings
+            job.attempt += 1
+            job.status = "pending"
+            job.progress = 0.0
+            pending.insert(0, job)
+
+    def _enforce_deadlines(self, running):
+        """阶段超时：异常书籍 (如排版陷入病态布局) 直接强杀，不再拖住整批任务"""
+        now = time.time()
+        for job in list(running.values()):
+            if not job.stage: continue
+            limits = dict(STAGE_TIMEOUTS, **job.settings.get('stage_timeouts', {}))
+            limit = limits.get(job.stage)
+            if limit and now - job.stage_started > limit:
+                stage = job.stage
+                self._discard(running, job)
+                self._finish(job, "failed", f"阶段超时: {stage} 超过 {limit} 秒")
+
+    def _discard(self, running, job):
+        """强杀任务所在的常驻进程并移出运行表 (进程不再复用)"""
+        slot = job.slot
+        self._kill_slot(slot)
+        slot.process.join(timeout=5)
+        self.slots.remove(slot)
+        slot.job = None
+        job.slot = None
+        running.pop(job.job_id)
+
+    def _drain_events(self, running, timeout):
+        if not running:
+            return
+        time.sleep(timeout)
+        for job in list(running.values()):
+            self._drain_job(running, job)
+
+    def _drain_job(self, running, job):
+        while job.job_id in running:
+            try:
+                event = job.slot.outbox.get_nowait()
+            except queue.Empty:
+                return
+            kind = event[0]
+
+            if kind == "progress":
+                job.progress, job.message = float(event[2]), event[3]
+                self._emit("progress", job, event[2], event[3])
+            elif kind == "log":
+                self._emit("log", job, event[2])
+            elif kind == "stage":
+                job.stage, job.stage_started = event[2], time.time()
+                self._emit("stage", job, event[2])
+            elif kind == "fingerprint":
+                job.fingerprint = event[2]
+            elif kind == "skipped":
+                running.pop(job.job_id)
+                job.skipped = True
+                self._finish(job, "success", "已是最新，跳过")
+            elif kind == "span":
+                record = dict(event[2], job_id=job.job_id, attempt=job.attempt)
+                if self.trace: self.trace.write(record)
+                self._emit("span", job, record)
+            elif kind == "result":
+                ok, msg, time_str, path = event[2:]
+                running.pop(job.job_id)
+                if ok:
+                    status = "success"
+                elif "中止" in msg:
+                    status = "aborted"
+                else:
+                    status = "failed"
+                job.result = (ok, msg, time_str, path)
+                # 指纹按原始设置计算；看门狗降级重试的产物 (单文件模式、低 DPI 等) 不记为最新，下次增量运行仍会重新转换
+                if ok and path and job.fingerprint and job.attempt == 0 and os.path.exists(path):
+                    incremental.record(job.src, job.fingerprint, path)
+                self._finish(job, status, msg)
+
+    def _reap_dead(self, running):
+        """子进程异常退出 (崩溃/被系统杀死) 且未回传结果时，记为失败"""
+        for job_id, job in list(running.items()):
+            slot = job.slot
+            if slot and not slot.process.is_alive():
+                self._drain_job(running, job)  # 结果可能刚好在队列中
+                self.slots.remove(slot)
+                if job_id in running:
+                    running.pop(job_id)
+                    if self.stop_requested:
+                        self._finish(job, "aborted", "任务中止")
+                    else:
+                        self._finish(job, "failed", f"进程异常退出 (exit code {slot.process.exitcode})")
+
+    def _kill(self, job):
+        if job.slot: self._kill_slot(job.slot)
+
+    @staticmethod
+    def _kill_slot(slot):
+        """强杀常驻进程及其渲染池子进程"""
+        try:
+            proc = psutil.Process(slot.process.pid)
+            for child in proc.children(recursive=True):
+                try:
+                    child.kill()
+                except psutil.Error:
+                    pass
+        except psutil.Error:
+            pass
+        slot.process.kill()
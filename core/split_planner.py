@@ -0,0 +1,77 @@
+# core/split_planner.py
+# Version: v3.8.0_Split_Planner
+# Last Updated: 2026-10-17
+# Description: 按字数分割的切割规划。基于每页字数的前缀和，任意阈值的方案均为 O(卷数 × log 页数)，写文件前即可预览。
+
+from bisect import bisect_left
+from itertools import accumulate
+
+STRATEGIES = {
+    'greedy': '逐页累加',  # v3.7 行为：累计达到阈值即切 (末卷可能很小)
+    'nearest': '就近边界',  # 每卷在最接近目标字数的页边界处切
+    'balanced': '均衡分卷',  # 卷数 = round(总字数 / 阈值)，各卷字数尽量相等
+}
+
+
+class SplitPlanner:
+    """
+    切割规划器。page_chars 为每页字数 (来自文本索引)。
+    方案以 [(起始页, 结束页), ...] 表示，页号从 0 开始，结束页不包含。
+    """
+
+    def __init__(self, page_chars):
+        self.prefix = [0] + list(accumulate(page_chars))
+        self.pages = len(page_chars)
+        self.total = self.prefix[-1]
+
+    def chars(self, start, end):
+        return self.prefix[end] - self.prefix[start]
+
+    def plan(self, threshold, strategy='greedy'):
+        if self.pages == 0: return []
+        threshold = max(1, int(threshold))
+        if strategy == 'balanced':
+            return self._balanced(threshold)
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的分割策略: {strategy}")
+
+        cuts = []
+        start = 0
+        while start < self.pages:
+            target = self.prefix[start] + threshold
+            end = bisect_left(self.prefix, target, start + 1)  # 首个累计字数达到阈值的页边界
+            if end > self.pages:
+                end = self.pages
+            elif strategy == 'nearest' and end - 1 > start and \
+                    target - self.prefix[end - 1] < self.prefix[end] - target:
+                end -= 1  # 少切一页更接近目标
+            cuts.append((start, end))
+            start = end
+        return cuts
+
+    def plan_many(self, thresholds, strategy='greedy'):
+        """一次返回多个阈值的方案 {阈值: 方案}"""
+        return {t: self.plan(t, strategy) for t in thresholds}
+
+    def _balanced(self, threshold):
+        volumes = max(1, min(self.pages, round(self.total / threshold)))
+        cuts = []
+        start = 0
+        for j in range(1, volumes):
+            target = self.total * j / volumes
+            end = bisect_left(self.prefix, target, start + 1)
+            if end > start + 1 and end <= self.pages and \
+                    target - self.prefix[end - 1] < self.prefix[end] - target:
+                end -= 1
+            # 为剩余卷保留至少一页
+            end = min(max(end, start + 1), self.pages - (volumes - j))
+            cuts.append((start, end))
+            start = end
+        cuts.append((start, self.pages))
+        return cuts
+
+    def describe(self, plan):
+        """方案摘要：(卷数, 最少字数, 最多字数, 末卷字数)"""
+        sizes = [self.chars(s, e) for s, e in plan]
+        if not sizes: return 0, 0, 0, 0
+        return len(sizes), min(sizes), max(sizes), sizes[-1]
@@ -1,37 +1,65 @@
 # core/splitter.py
-# Version: v3.7.1_Split_Logic_Fix
-# Last Updated: 2026-01-06
-# Description: [v3.7.1] 修复分割逻辑：将“提取选定章节”改为“以选定章节为切割点切分整书”；确保内容不丢失。
+# Version: v3.8.0_Glyph_Count
+# Last Updated: 2026-10-17
+# Description: [v3.8.0] 逐页字数改由持久化文本索引提供，统计与按字数分割不再重复提取文本；扫描与分卷写出记录计时 span；
+#              count_method='glyph' 时改用内容流字形计数 (快速、近似)。
+#              [v3.7.1] 修复分割逻辑：将“提取选定章节”改为“以选定章节为切割点切分整书”；确保内容不丢失。
 
 import os
 import re
 from pypdf import PdfReader, PdfWriter
 
+from config import PDF_DEDUPE
+from core.pdf_stream import dedupe_objects
+from core.split_planner import SplitPlanner, STRATEGIES
+from core.text_index import PageTextIndex, COUNT_METHODS
+from utils.telemetry import Telemetry, file_size
+
 
 class PDFSplitterEngine:
     """
     PDF 工具箱引擎：分割、统计
     """
 
-    def __init__(self, callback_manager=None):
+    def __init__(self, callback_manager=None, text_index=None, count_method='extract', dedupe=PDF_DEDUPE):
         self.cb = callback_manager
+        self.dedupe = dedupe  # [v3.8.0] 每个分卷写出前合并内容相同的对象
+        self.index = text_index or PageTextIndex()
+        if count_method not in COUNT_METHODS: raise ValueError(f"未知的计数方式: {count_method}")
+        self.count_method = count_method
+        # [v3.8.0] 结构化计时：扫描与每一卷的写出各记录一个 span
+        self.telemetry = Telemetry(callback_manager)
 
     def log(self, msg):
         if self.cb: self.cb.log(msg)
 
+    def _write_part(self, writer, out_path):
+        if self.dedupe: dedupe_objects(writer)
+        with open(out_path, "wb") as f:
+            writer.write(f)
+
+    def _page_chars(self, pdf_path, reader):
+        """每页字数：命中文本索引时无需提取"""
+        logged = [-1]
+
+        def progress(i, total):
+            # 串行时逐页回调、并行时按分片回调：每跨过 50 页汇报一次
+            if i // 50 != logged[0] and i < total:
+                logged[0] = i // 50
+                self.log(f"正在扫描第 {i}/{total} 页...")
+
+        with self.telemetry.span('scan', bytes_in=file_size(pdf_path), method=self.count_method) as rec:
+            chars = self.index.page_chars(pdf_path, reader, progress, self.count_method)
+            rec['pages'] = len(chars)
+        return chars
+
     def get_pdf_info(self, pdf_path):
         """统计 PDF 信息：页数、字数"""
         try:
+            self.telemetry.book = os.path.basename(pdf_path)
             reader = PdfReader(pdf_path)
             num_pages = len(reader.pages)
-            char_count = 0
-
-            for i, page in enumerate(reader.pages):
-                if i % 50 == 0:
-                    self.log(f"正在扫描第 {i}/{num_pages} 页...")
-                text = page.extract_text()
-                if text:
-                    char_count += len("".join(text.split()))
+            char_count = sum(self._page_chars(pdf_path, reader))
 
             return True, num_pages, char_count
         except Exception as e:
@@ -39,46 +67,42 @@ class PDFSplitterEngine:
 
     # =========================================================================
     # [v3.7.0] 按字数分割 (页级对齐)
+    # [v3.8.0] 切割点由 SplitPlanner 基于前缀和计算；strategy 见 core.split_planner.STRATEGIES
     # =========================================================================
-    def split_by_word_count(self, pdf_path, threshold_words, output_dir):
+    def plan_by_word_count(self, pdf_path, thresholds, strategy='greedy'):
+        """只规划不写文件：返回 (True, planner, {阈值: [(起始页, 结束页), ...]}) 或 (False, 错误信息, None)"""
         try:
             reader = PdfReader(pdf_path)
-            total_pages = len(reader.pages)
+            planner = SplitPlanner(self._page_chars(pdf_path, reader))
+            return True, planner, planner.plan_many(thresholds, strategy)
+        except Exception as e:
+            return False, str(e), None
 
-            start_page = 0
-            current_segment_chars = 0
-            file_index = 1
+    def split_by_word_count(self, pdf_path, threshold_words, output_dir, strategy='greedy'):
+        try:
+            self.telemetry.book = os.path.basename(pdf_path)
+            reader = PdfReader(pdf_path)
+            planner = SplitPlanner(self._page_chars(pdf_path, reader))
+            plan = planner.plan(threshold_words, strategy)
             generated_files = []
 
-            self.log(f"开始按字数分割，阈值: {threshold_words} 字/卷")
-
-            for i in range(total_pages):
-                page_text = reader.pages[i].extract_text() or ""
-                page_chars = len("".join(page_text.split()))
-
-                current_segment_chars += page_chars
-
-                is_last_page = (i == total_pages - 1)
-                if current_segment_chars >= threshold_words or is_last_page:
-                    end_page = i + 1  # 切割点（不包含）
+            self.log(f"开始按字数分割，阈值: {threshold_words} 字/卷 ({STRATEGIES.get(strategy, strategy)})")
 
+            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+            for file_index, (start_page, end_page) in enumerate(plan, start=1):
+                out_name = f"{file_index:02d}_{base_name}_part{file_index}.pdf"
+                out_path = os.path.join(output_dir, out_name)
+                with self.telemetry.span('split', chapter=out_name, pages=end_page - start_page) as rec:
                     writer = PdfWriter()
                     for p in range(start_page, end_page):
                         writer.add_page(reader.pages[p])
 
-                    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-                    out_name = f"{file_index:02d}_{base_name}_part{file_index}.pdf"
-                    out_path = os.path.join(output_dir, out_name)
-
-                    with open(out_path, "wb") as f:
-                        writer.write(f)
+                    self._write_part(writer, out_path)
+                    rec['bytes_out'] = file_size(out_path)
 
-                    generated_files.append(out_path)
-                    self.log(f"✅ 生成第 {file_index} 卷 (P{start_page + 1}-P{end_page}): 约 {current_segment_chars} 字")
-
-                    start_page = end_page
-                    current_segment_chars = 0
-                    file_index += 1
+                generated_files.append(out_path)
+                self.log(f"✅ 生成第 {file_index} 卷 (P{start_page + 1}-P{end_page}): "
+                         f"约 {planner.chars(start_page, end_page)} 字")
 
             return True, f"成功分割为 {len(generated_files)} 个文件"
 
@@ -91,6 +115,7 @@ class PDFSplitterEngine:
     # =========================================================================
     def split_by_toc_indices(self, pdf_path, selected_indices, output_dir):
         try:
+            self.telemetry.book = os.path.basename(pdf_path)
             reader = PdfReader(pdf_path)
             total_pages = len(reader.pages)
 
@@ -143,15 +168,15 @@ class PDFSplitterEngine:
                 if len(safe_title) > 50: safe_title = safe_title[:50]
 
                 # 写入文件
-                writer = PdfWriter()
-                for p in range(start, end):
-                    writer.add_page(reader.pages[p])
-
                 out_name = f"{i + 1:02d}_{safe_title}.pdf"
                 out_path = os.path.join(output_dir, out_name)
+                with self.telemetry.span('split', chapter=out_name, pages=end - start) as rec:
+                    writer = PdfWriter()
+                    for p in range(start, end):
+                        writer.add_page(reader.pages[p])
 
-                with open(out_path, "wb") as f:
-                    writer.write(f)
+                    self._write_part(writer, out_path)
+                    rec['bytes_out'] = file_size(out_path)
 
                 generated.append(out_path)
                 self.log(f"✅ 生成分卷: {out_name} (P{start + 1}-P{end})")
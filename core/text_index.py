@@ -0,0 +1,178 @@
+# core/text_index.py
+# Version: v3.8.0_Text_Index (Parallel + Glyph Count)
+# Last Updated: 2026-10-17
+# Description: PDF 逐页文本索引。按 PDF 内容哈希持久化每页字数 (可选保存全文)，统计与按字数分割共用，同一文件只提取一次文本；
+#              大文件按页段分片到进程池并行提取；可选 "glyph" 快速计数 (扫描内容流，不重建版面)。
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pypdf
+
+from core import glyph_counter
+from core.glyph_counter import count_pages
+from config import (TEXT_INDEX_DIR, TEXT_INDEX_MAX_MB, TEXT_INDEX_STORE_TEXT, TEXT_EXTRACT_WORKERS,
+                    TEXT_EXTRACT_MIN_PAGES, TEXT_EXTRACT_SHARD_PAGES)
+
+
+# 计数方式 -> (索引字段, 显示名)
+COUNT_METHODS = {
+    'extract': ('chars', '精确 (提取文本)'),
+    'glyph': ('glyphs', '快速 (字形计数)'),
+}
+
+
+def page_char_count(text):
+    """与 v3.7 统计口径一致：去除所有空白后的字符数"""
+    return len("".join(text.split())) if text else 0
+
+
+def _extract_range(pdf_path, start, end, keep_text, method='extract'):
+    """子进程入口：独立打开 PdfReader，提取 [start, end) 页；返回 (start, 字数列表, 文本列表或 None)"""
+    reader = pypdf.PdfReader(pdf_path)
+    if method == 'glyph': return start, count_pages(reader, start, end), None
+    chars = []
+    texts = [] if keep_text else None
+    for i in range(start, end):
+        text = reader.pages[i].extract_text() or ""
+        chars.append(page_char_count(text))
+        if texts is not None: texts.append(text)
+    return start, chars, texts
+
+
+def pdf_hash(path, block=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PageTextIndex:
+    """
+    索引条目: {index_dir}/<hash[:2]>/<hash>.json
+    {"pypdf": 版本, "chars": [每页字数], "glyphs": [每页字形数], "text": [每页文本] (仅 store_text 时)}
+    - chars / glyphs 分别由 extract / glyph 两种计数方式按需生成，同一条目可同时保存两者。
+    - pypdf 版本不同 (提取结果可能变化) 的条目视为失效。
+    - 写入采用 临时文件 + os.replace；总体积超过上限时按 mtime 淘汰最旧的条目。
+    """
+
+    def __init__(self, index_dir=TEXT_INDEX_DIR, store_text=TEXT_INDEX_STORE_TEXT, max_mb=TEXT_INDEX_MAX_MB,
+                 workers=TEXT_EXTRACT_WORKERS):
+        self.index_dir = index_dir
+        self.store_text = store_text
+        self.workers = max(1, int(workers or 1))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._hashes = {}  # (path, size, mtime_ns) -> hash，同一进程内重复操作同一文件时免去重复哈希
+
+    def _key(self, pdf_path):
+        st = os.stat(pdf_path)
+        memo = (os.path.abspath(pdf_path), st.st_size, st.st_mtime_ns)
+        if memo not in self._hashes: self._hashes[memo] = pdf_hash(pdf_path)
+        return self._hashes[memo]
+
+    def _entry(self, key):
+        return os.path.join(self.index_dir, key[:2], f"{key}.json")
+
+    def load(self, pdf_path, need_text=False):
+        """返回索引条目 (字典)；不存在或已失效时返回 None"""
+        try:
+            path = self._entry(self._key(pdf_path))
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('pypdf') != pypdf.__version__: return None
+            if need_text and 'text' not in data: return None
+            os.utime(path, None)
+            return data
+        except (OSError, ValueError):
+            return None
+
+    def save(self, pdf_path, data):
+        data = dict(data, pypdf=pypdf.__version__)
+        try:
+            path = self._entry(self._key(pdf_path))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            self.evict()
+        except OSError:
+            pass
+
+    def page_chars(self, pdf_path, reader=None, progress=None, method='extract'):
+        """
+        每页字数列表 (method 见 COUNT_METHODS)。命中索引时直接返回；否则提取并写入索引。
+        progress(已完成页数, 总页数) 在提取过程中调用 (串行时每页一次，并行时每个分片一次)。
+        """
+        # 快速计数依赖的 pypdf 编码表不可用时退回精确提取 (结果存入 chars 字段，与 extract 共用)
+        if method == 'glyph' and not glyph_counter.AVAILABLE: method = 'extract'
+        field = COUNT_METHODS[method][0]
+        data = self.load(pdf_path) or {}
+        if field in data: return data[field]
+
+        reader = reader or pypdf.PdfReader(pdf_path)
+        total = len(reader.pages)
+        if self.workers > 1 and total >= TEXT_EXTRACT_MIN_PAGES:
+            chars, texts = self._extract_parallel(pdf_path, total, progress, method)
+        elif method == 'glyph':
+            chars, texts = count_pages(reader, progress=progress), None
+        else:
+            chars, texts = self._extract_serial(reader, total, progress)
+        data[field] = chars
+        if texts is not None: data['text'] = texts
+        self.save(pdf_path, data)
+        return chars
+
+    def _extract_serial(self, reader, total, progress):
+        chars = []
+        texts = [] if self.store_text else None
+        for i, page in enumerate(reader.pages):
+            if progress: progress(i, total)
+            text = page.extract_text() or ""
+            chars.append(page_char_count(text))
+            if texts is not None: texts.append(text)
+        return chars, texts
+
+    def _extract_parallel(self, pdf_path, total, progress, method='extract'):
+        """按页段分片，各子进程独立解析 PDF；结果按起始页号归位，与串行提取逐页一致"""
+        shards = [(s, min(s + TEXT_EXTRACT_SHARD_PAGES, total)) for s in range(0, total, TEXT_EXTRACT_SHARD_PAGES)]
+        chars = [0] * total
+        texts = [""] * total if self.store_text and method == 'extract' else None
+        done = 0
+        if progress: progress(0, total)
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(shards))) as pool:
+            futures = [pool.submit(_extract_range, pdf_path, s, e, texts is not None, method) for s, e in shards]
+            for future in as_completed(futures):
+                start, part_chars, part_texts = future.result()
+                chars[start:start + len(part_chars)] = part_chars
+                if texts is not None: texts[start:start + len(part_texts)] = part_texts
+                done += len(part_chars)
+                if progress: progress(done, total)
+        return chars, texts
+
+    def evict(self):
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.index_dir):
+            for name in files:
+                if not name.endswith(".json"): continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total <= self.max_bytes: return
+        for _mtime, size, path in sorted(entries):
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            if total <= self.max_bytes: break
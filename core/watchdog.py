@@ -0,0 +1,65 @@
+# core/watchdog.py
+# Version: v3.8.0_RSS_Watchdog
+# Last Updated: 2026-10-17
+# Description: 内存看门狗。转换进程树的 RSS 增量超出单本预算时终止渲染，并按降级阶梯 (更小分块/更低图片 DPI/单进程) 自动重试。
+
+from config import SINGLE_CHUNK_CHARS, WATCHDOG_MAX_RETRIES, WATCHDOG_MIN_CHUNK_CHARS
+
+# 降级阶梯：每一级在上一级 (已降级) 设置的基础上进一步压缩内存
+DEGRADE_LADDER = [
+    {'chunk_divisor': 4, 'image_dpi': 96, 'image_quality': 75},
+    {'chunk_divisor': 4, 'image_dpi': 72, 'image_quality': 60},
+]
+
+
+def degrade_settings(settings, level):
+    """
+    返回第 level 级 (从 1 开始) 的降级设置。保留用户选择的模式 (分卷的逐章输出不会变成单个文件)：
+    - 单文件分块的块上限按阶梯缩小；
+    - 单进程渲染；分卷模式关闭直接合并 (全本排版结果不再同时驻留，改为逐章写出后合并)；
+    - 图片降采样 DPI 与 JPEG 质量逐级降低。
+    """
+    step = DEGRADE_LADDER[min(level, len(DEGRADE_LADDER)) - 1]
+    new = dict(settings)
+    base_chunk = settings.get('chunk_chars', SINGLE_CHUNK_CHARS)
+    new['workers'] = 1
+    if new.get('direct_merge'): new['direct_merge'] = False
+    new['chunk_chars'] = max(WATCHDOG_MIN_CHUNK_CHARS, base_chunk // step['chunk_divisor'])
+    dpi = settings.get('image_dpi') or step['image_dpi']
+    new['image_dpi'] = min(dpi, step['image_dpi'])
+    new['image_quality'] = min(settings.get('image_quality', 100), step['image_quality'])
+    return new
+
+
+class RssWatchdog:
+    """
+    由调度器在每轮采样后调用：
+    - over_budget(job, rss_mb)：是否超出该书的内存预算 (settings['ram_budget_mb'])；
+    - plan_retry(job, rss_mb)：给出下一级降级设置，重试次数用尽时返回 None。
+    每一次终止与降级决定都通过 CallbackManager 记录。
+    """
+
+    def __init__(self, cb=None, max_retries=WATCHDOG_MAX_RETRIES):
+        self.cb = cb
+        self.max_retries = max_retries
+
+    def log(self, msg):
+        if self.cb: self.cb.log(msg)
+
+    @staticmethod
+    def over_budget(job, rss_mb):
+        budget = job.settings.get('ram_budget_mb')
+        return bool(budget) and rss_mb > budget
+
+    def plan_retry(self, job, rss_mb):
+        budget = job.settings.get('ram_budget_mb')
+        if job.attempt >= self.max_retries:
+            self.log(f"🐶 看门狗: {job.name} RSS {rss_mb:.0f}MB 超出预算 {budget:.0f}MB，"
+                     f"已降级重试 {job.attempt} 次，放弃该书")
+            return None
+
+        new = degrade_settings(job.settings, job.attempt + 1)
+        self.log(f"🐶 看门狗: {job.name} RSS {rss_mb:.0f}MB 超出预算 {budget:.0f}MB，终止渲染并降级重试 "
+                 f"(第 {job.attempt + 1} 次): 分块 {new['chunk_chars']} 字符 | "
+                 f"图片 {new['image_dpi']}DPI/质量 {new['image_quality']} | 单进程渲染")
+        return new
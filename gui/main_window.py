@@ -1,22 +1,24 @@
 # gui/main_window.py
-# Version: v3.7.1_Feedback_Fix
-# Last Updated: 2026-01-06
-# Description: [v3.7.1] 修复分割任务的控制台反馈，确保任务结束有明确提示。
+# Version: v3.8.0_Batch_Scheduler
+# Last Updated: 2026-10-17
+# Description: [v3.8.0] 批量转换改由 BatchScheduler 多进程并发调度；新增并行进程数与并发书籍数设置。
 
 import os
 import threading
-import shutil
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import psutil
 import datetime
 import glob
 
-from config import APP_VERSION
+from config import APP_VERSION, BATCH_MAX_PARALLEL, IMAGE_TARGET_DPI, IMAGE_JPEG_QUALITY, TRACE_DIR
 from utils.logger import CallbackManager
-from core.converter import ConverterEngine
+from core.analyzer import scan_epub
+from core.render_pool import default_worker_count
+from core.scheduler import BatchScheduler
 from core.merger import PDFMergerEngine
 from core.splitter import PDFSplitterEngine
+from core.split_planner import STRATEGIES
 
 
 class AppGUI:
@@ -38,7 +40,7 @@ class AppGUI:
         self._init_merge_tab()
 
         self._start_sys_monitor()
-        self.current_engine = None
+        self.scheduler = None
         self.is_running = False
         self.batch_file_paths = []
         self.is_counting = False  # 统计锁
@@ -73,6 +75,14 @@ class AppGUI:
         self.cv_mt = tk.IntVar(value=25)
         self.cv_mode = tk.StringVar(value="auto")
         self.cv_auto_merge = tk.BooleanVar(value=True)
+        self.cv_direct_merge = tk.BooleanVar(value=False)
+        self.cv_workers = tk.IntVar(value=default_worker_count())
+        self.cv_jobs = tk.IntVar(value=BATCH_MAX_PARALLEL)
+        self.cv_render_cache = tk.BooleanVar(value=True)
+        self.cv_img_dpi = tk.IntVar(value=IMAGE_TARGET_DPI)
+        self.cv_img_quality = tk.IntVar(value=IMAGE_JPEG_QUALITY)
+        self.cv_trace = tk.BooleanVar(value=False)
+        self.cv_incremental = tk.BooleanVar(value=False)
         self.cv_prog = tk.DoubleVar()
         self.cv_status = tk.StringVar(value="准备就绪")
 
@@ -90,6 +100,7 @@ class AppGUI:
         ttk.Frame(btn_bar, width=20).pack(side="left")
         ttk.Button(btn_bar, text="➖ 移除选中", command=self.cv_remove_sel).pack(side="left", padx=2)
         ttk.Button(btn_bar, text="🗑️ 清空列表", command=self.cv_clear_list).pack(side="left", padx=2)
+        ttk.Button(btn_bar, text="🔍 结构预检", command=self.cv_triage).pack(side="right", padx=2)
 
         list_frame = ttk.Frame(g1);
         list_frame.pack(fill="x", expand=True)
@@ -109,7 +120,19 @@ class AppGUI:
         ttk.Radiobutton(m_row1, text="智能自动 (推荐)", variable=self.cv_mode, value="auto").pack(side="left", padx=10)
         ttk.Radiobutton(m_row1, text="强制单文件", variable=self.cv_mode, value="single").pack(side="left", padx=10)
         ttk.Radiobutton(m_row1, text="强制分卷", variable=self.cv_mode, value="split").pack(side="left", padx=10)
+        # [v3.8.0] 直接合并：章节排版结果在内存中合成全本，不生成分卷文件 (内存占用与单文件整本相当)
+        ttk.Checkbutton(m_row1, text="直接合并", variable=self.cv_direct_merge).pack(side="right")
         ttk.Checkbutton(m_row1, text="分卷后自动合并", variable=self.cv_auto_merge).pack(side="right", padx=10)
+        m_row2 = ttk.Frame(g_mode);
+        m_row2.pack(fill="x", anchor="w", pady=(5, 0))
+        ttk.Label(m_row2, text="分卷并行进程:").pack(side="left")
+        ttk.Spinbox(m_row2, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.cv_workers, width=5).pack(
+            side="left", padx=5)
+        ttk.Label(m_row2, text="同时转换书籍:").pack(side="left", padx=(15, 0))
+        ttk.Spinbox(m_row2, from_=1, to=16, textvariable=self.cv_jobs, width=5).pack(side="left", padx=5)
+        ttk.Checkbutton(m_row2, text="使用渲染缓存", variable=self.cv_render_cache).pack(side="right", padx=10)
+        ttk.Checkbutton(m_row2, text="记录追踪文件", variable=self.cv_trace).pack(side="right", padx=10)
+        ttk.Checkbutton(m_row2, text="增量 (跳过未变化)", variable=self.cv_incremental).pack(side="right", padx=10)
 
         # 区域 3: 美学设置
         g2 = ttk.LabelFrame(frame, text="美学设置", padding=10)
@@ -124,6 +147,13 @@ class AppGUI:
         ttk.Label(r1, text="边距(左右/上下):").pack(side="left", padx=(15, 0))
         ttk.Spinbox(r1, from_=0, to=80, textvariable=self.cv_ml, width=5).pack(side="left")
         ttk.Spinbox(r1, from_=0, to=80, textvariable=self.cv_mt, width=5).pack(side="left", padx=5)
+        r2 = ttk.Frame(g2);
+        r2.pack(fill="x", pady=2)
+        ttk.Label(r2, text="图片 DPI (0=原图):").pack(side="left")
+        ttk.Spinbox(r2, from_=0, to=600, increment=50, textvariable=self.cv_img_dpi, width=5).pack(side="left", padx=5)
+        ttk.Label(r2, text="JPEG 质量:").pack(side="left", padx=(15, 0))
+        ttk.Spinbox(r2, from_=30, to=100, increment=5, textvariable=self.cv_img_quality, width=5).pack(side="left",
+                                                                                                      padx=5)
 
         # 区域 4: 控制台
         g3 = ttk.LabelFrame(frame, text="控制台", padding=10)
@@ -164,6 +194,30 @@ class AppGUI:
         self.cv_listbox.delete(0, "end");
         self.batch_file_paths = []
 
+    # [v3.8.0] 队列预检：zip 级扫描，不解压正文，万本书库也可在转换前快速分诊
+    def cv_triage(self):
+        paths = list(self.batch_file_paths)
+        if not paths: return messagebox.showwarning("提示", "队列为空")
+
+        def run():
+            self.cv_log_msg(f"=== 结构预检，共 {len(paths)} 个文件 ===")
+            monolithic = 0
+            for src in paths:
+                try:
+                    info = scan_epub(src)
+                except Exception as e:
+                    self.cv_log_msg(f"❌ {os.path.basename(src)}: 分析失败 {e}")
+                    continue
+                if info['is_monolithic']: monolithic += 1
+                self.cv_log_msg(
+                    f"{'⚠️' if info['is_monolithic'] else '✅'} {os.path.basename(src)} | "
+                    f"章节 {info['toc_count']} | spine {info['spine_count']} | 密度 {info['density']:.2f} | "
+                    f"正文 {info['text_bytes'] / 1024:.0f}KB | 图片 {info['image_count']} 张 "
+                    f"{info['image_bytes'] / 1024 / 1024:.1f}MB")
+            self.cv_log_msg(f"=== 预检完成：单体结构 {monolithic} 本 ===")
+
+        threading.Thread(target=run, daemon=True).start()
+
     def cv_log_msg(self, msg):
         self.root.after(0, lambda: self.cv_log.insert("end",
                                                       f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}\n") or self.cv_log.see(
@@ -174,7 +228,7 @@ class AppGUI:
             if messagebox.askyesno("确认", "确定要中止所有任务吗？"):
                 self.btn_start.config(state="disabled", text="中止中...")
                 self.is_running = False
-                if self.current_engine: self.current_engine.stop()
+                if self.scheduler: self.scheduler.stop_all()
             return
 
         if not self.batch_file_paths: return messagebox.showwarning("提示", "队列为空")
@@ -184,69 +238,63 @@ class AppGUI:
         self.cv_log.delete(1.0, "end")
         threading.Thread(target=self._run_batch_process).start()
 
+    # [v3.8.0] 批量任务交给 BatchScheduler：多本书在独立子进程中并发转换，单本失败不影响其它任务
     def _run_batch_process(self):
         total_files = len(self.batch_file_paths)
-        success_count = 0
-        fail_count = 0
-
-        self.cv_log_msg(f"=== 开始批量任务，共 {total_files} 个文件 ===")
-
-        for idx, src in enumerate(self.batch_file_paths):
-            if not self.is_running:
-                self.cv_log_msg(">>> 🚫 用户中止任务。");
-                break
-
-            filename = os.path.basename(src)
-            current_idx = idx + 1
-
-            self.root.after(0,
-                            lambda s=f"[进度 {current_idx}/{total_files}] 正在处理: {filename}": self.cv_status.set(s))
-            self.cv_log_msg(f"\n--------- 处理第 {current_idx} / {total_files} 本: {filename} ---------")
-
-            try:
-                is_monolithic, report = ConverterEngine.analyze_structure(src)
-                self.cv_log_msg(report.split('\n')[-2])
-
-                final_mode = self.cv_mode.get()
-                if is_monolithic and final_mode != 'single':
-                    self.cv_log_msg(">>> ⚠️ 自动切换为【强制单文件】模式")
-                    final_mode = 'single'
-
-                out = os.path.splitext(src)[0] + ".pdf"
-                settings = {'paper': self.cv_paper.get(), 'font_size': self.cv_font.get(),
-                            'margin_lr': self.cv_ml.get(), 'margin_tb': self.cv_mt.get(), 'mode': final_mode,
-                            'auto_merge': self.cv_auto_merge.get()}
-
-                cb = CallbackManager(self.cv_prog, None, self.cv_log_msg)
-                self.current_engine = ConverterEngine(src, out, settings, cb)
-
-                ok, msg, time_str, path, cleanup = self.current_engine.run()
-
-                if ok:
-                    success_count += 1
-                    self.cv_log_msg(f"✅ [成功] {filename}")
-                    if cleanup and os.path.exists(cleanup):
-                        try:
-                            shutil.rmtree(cleanup)
-                        except:
-                            pass
-                else:
-                    if "中止" in msg:
-                        self.cv_log_msg(f"🚫 [中止] {filename}"); break
-                    else:
-                        fail_count += 1
-                        self.cv_log_msg(f"❌ [失败] {filename}: {msg}")
-                        self.cv_log_msg(">>> 跳过此文件，继续下一本...")
-
-            except Exception as e:
-                fail_count += 1
-                self.cv_log_msg(f"❌ [异常] {filename}: {str(e)}")
-
-            finally:
-                self.current_engine = None
-
+        self.cv_log_msg(f"=== 开始批量任务，共 {total_files} 个文件 (并发 {self.cv_jobs.get()} 本) ===")
+
+        parallel = max(1, self.cv_jobs.get())
+        settings = {'paper': self.cv_paper.get(), 'font_size': self.cv_font.get(),
+                    'margin_lr': self.cv_ml.get(), 'margin_tb': self.cv_mt.get(), 'mode': self.cv_mode.get(),
+                    'auto_merge': self.cv_auto_merge.get(), 'direct_merge': self.cv_direct_merge.get(),
+                    'render_cache': self.cv_render_cache.get(),
+                    'image_dpi': self.cv_img_dpi.get(), 'image_quality': self.cv_img_quality.get(),
+                    # 多本并发时平分渲染进程，避免 CPU 超额订阅
+                    'workers': max(1, self.cv_workers.get() // parallel)}
+        jobs = [(src, os.path.splitext(src)[0] + ".pdf", settings) for src in self.batch_file_paths]
+
+        trace_path = None
+        if self.cv_trace.get():
+            trace_path = os.path.join(TRACE_DIR, f"batch_{datetime.datetime.now():%Y%m%d_%H%M%S}.jsonl")
+        self.scheduler = BatchScheduler(jobs, on_event=self._on_batch_event, max_parallel=parallel,
+                                        cb=CallbackManager(None, None, self.cv_log_msg), trace_path=trace_path,
+                                        incremental=self.cv_incremental.get())
+        try:
+            success_count, fail_count, abort_count = self.scheduler.run()
+        finally:
+            self.scheduler = None
+
+        if abort_count: self.cv_log_msg(f">>> 🚫 用户中止任务，{abort_count} 本未完成。")
+        if trace_path: self.cv_log_msg(f"📈 追踪文件: {trace_path}")
         self.root.after(0, lambda: self._on_batch_finish(success_count, fail_count, total_files))
 
+    def _on_batch_event(self, kind, job, *payload):
+        total = len(self.batch_file_paths)
+        if kind == "finish" and job.skipped:
+            self.cv_log_msg(f"⏭️ [跳过] {job.name} (已是最新)")
+        elif kind == "start":
+            self.cv_log_msg(f"\n--------- 开始第 {job.job_id + 1} / {total} 本: {job.name} ---------")
+        elif kind == "log":
+            self.cv_log_msg(f"[{job.name}] {payload[0]}")
+        elif kind == "finish":
+            if job.status == "success":
+                self.cv_log_msg(f"✅ [成功] {job.name}")
+            elif job.status == "aborted":
+                self.cv_log_msg(f"🚫 [中止] {job.name}")
+            else:
+                self.cv_log_msg(f"❌ [失败] {job.name}: {job.message}")
+
+        if self.scheduler:
+            done = sum(j.status in ("success", "failed", "aborted") for j in self.scheduler.jobs)
+            running = sum(j.status == "running" for j in self.scheduler.jobs)
+            prog = self.scheduler.overall_progress()
+            status = f"[进度 {done}/{total}] 正在处理 {running} 本"
+            eta = self.scheduler.eta_seconds()
+            if eta is not None:
+                m, s = divmod(int(eta), 60)
+                status += f" | 预计剩余 {m}分{s}秒"
+            self.root.after(0, lambda: self.cv_prog.set(prog) or self.cv_status.set(status))
+
     def _on_batch_finish(self, success, fail, total):
         self.cv_prog.set(100)
         self.root.update()
@@ -269,6 +317,8 @@ class AppGUI:
         self.tl_file = tk.StringVar()
         self.tl_mode = tk.StringVar(value="toc")
         self.tl_word_limit = tk.DoubleVar(value=2.0)
+        self.tl_strategy = tk.StringVar(value=STRATEGIES['greedy'])
+        self.tl_fast_count = tk.BooleanVar(value=False)
 
         frame = self.tab_merge
         pad = {'padx': 10, 'pady': 5}
@@ -295,6 +345,8 @@ class AppGUI:
         ttk.Button(tb_merge, text="⬇️ 下移", command=self.mg_down).pack(side="left", padx=2)
 
         ttk.Button(group_merge, text="🔗 开始合并为单文件", command=self.mg_start).pack(fill="x", pady=(5, 0))
+        # [v3.8.0] 增量追加：列表中的文件以增量更新方式追加到已有 PDF 末尾，原有页面不重写
+        ttk.Button(group_merge, text="📎 追加到已有 PDF", command=self.mg_append).pack(fill="x", pady=(5, 0))
 
         # 区块 B: 智能分割
         group_split = ttk.LabelFrame(frame, text="✂️ 智能分割与统计", padding=10)
@@ -314,6 +366,8 @@ class AppGUI:
         f_stat = ttk.Labelframe(row_panel, text="基础信息", padding=5)
         f_stat.pack(side="left", fill="both", expand=True, padx=(0, 5))
         ttk.Button(f_stat, text="📊 统计页数与字数", command=self.tl_count_words).pack(fill="x", pady=5)
+        # [v3.8.0] 快速计数：扫描内容流统计字形，不做文本提取 (结果为近似值；同时用于按字数分割)
+        ttk.Checkbutton(f_stat, text="⚡ 快速计数 (字形统计)", variable=self.tl_fast_count).pack(anchor="w")
 
         f_strat = ttk.Labelframe(row_panel, text="分割策略", padding=5)
         f_strat.pack(side="right", fill="both", expand=True, padx=(5, 0))
@@ -332,6 +386,15 @@ class AppGUI:
         self.ent_limit.pack(side="left", padx=2)
         ttk.Label(f_word, text="万字").pack(side="left")
 
+        # [v3.8.0] 切割策略与方案预览 (基于文本索引与前缀和，不写文件)
+        f_plan = ttk.Frame(f_strat)
+        f_plan.pack(anchor="w", pady=2)
+        self.cb_strategy = ttk.Combobox(f_plan, textvariable=self.tl_strategy, values=list(STRATEGIES.values()),
+                                        state="readonly", width=10)
+        self.cb_strategy.pack(side="left", padx=(20, 2))
+        self.btn_preview = ttk.Button(f_plan, text="👁 预览分卷", command=self.tl_preview_split)
+        self.btn_preview.pack(side="left", padx=2)
+
         ttk.Button(group_split, text="🚀 执行分割", command=self.tl_run_split).pack(fill="x", pady=5)
 
         self.tl_log = tk.Text(group_split, height=6, font=("Consolas", 8), fg="#333")
@@ -340,8 +403,12 @@ class AppGUI:
     def _update_ui_state(self):
         if self.tl_mode.get() == "word":
             self.ent_limit.config(state="normal")
+            self.cb_strategy.config(state="readonly")
+            self.btn_preview.config(state="normal")
         else:
             self.ent_limit.config(state="disabled")
+            self.cb_strategy.config(state="disabled")
+            self.btn_preview.config(state="disabled")
 
     def tl_log_msg(self, msg):
         self.root.after(0, lambda: self.tl_log.insert("end",
@@ -397,6 +464,19 @@ class AppGUI:
         ok, path = eng.merge(self.mg_files, out, lambda c, t, m: self.tl_log_msg(f"合并: {m}"))
         self.tl_log_msg(f"✅ 合并完成: {os.path.basename(path)}" if ok else "❌ 失败")
 
+    def mg_append(self):
+        if not self.mg_files: return messagebox.showwarning("提示", "请先添加要追加的文件")
+        base = filedialog.askopenfilename(title="选择要追加到的 PDF", filetypes=[("PDF", "*.pdf")])
+        if not base: return
+        if os.path.abspath(base) in map(os.path.abspath, self.mg_files):
+            return messagebox.showwarning("提示", "目标文件不能同时出现在追加列表中")
+        self.tl_log_msg(f"正在追加到 {os.path.basename(base)}...")
+        threading.Thread(target=self.mg_run_append, args=(base, list(self.mg_files))).start()
+
+    def mg_run_append(self, base, files):
+        ok, msg = PDFMergerEngine().append(base, files, lambda c, t, m: self.tl_log_msg(f"追加: {m}"))
+        self.tl_log_msg(f"✅ 追加完成: {os.path.basename(msg)} (+{len(files)} 个文件)" if ok else f"❌ 追加失败: {msg}")
+
     def tl_count_words(self):
         if self.is_counting: return  # 防双击
         src = self.tl_file.get()
@@ -405,10 +485,11 @@ class AppGUI:
         self.is_counting = True
         self.tl_log_msg("正在分析全文字数...")
 
+        splitter = self._tl_splitter(CallbackManager(None, None, self.tl_log_msg))
+
         def run():
             try:
-                cb = CallbackManager(None, None, self.tl_log_msg)
-                ok, p, c = PDFSplitterEngine(cb).get_pdf_info(src)
+                ok, p, c = splitter.get_pdf_info(src)
                 if ok:
                     self.tl_log_msg(f"📊 统计报告: 共 {p} 页 | 约 {c} 字符")
                 else:
@@ -418,6 +499,45 @@ class AppGUI:
 
         threading.Thread(target=run).start()
 
+    def _tl_count_method(self):
+        return 'glyph' if self.tl_fast_count.get() else 'extract'
+
+    def _tl_splitter(self, cb=None):
+        return PDFSplitterEngine(cb, count_method=self._tl_count_method())
+
+    def _tl_strategy_key(self):
+        return next((k for k, v in STRATEGIES.items() if v == self.tl_strategy.get()), 'greedy')
+
+    # [v3.8.0] 预览：当前阈值的逐卷字数，以及若干备选阈值的卷数/大小分布
+    def tl_preview_split(self):
+        src = self.tl_file.get()
+        if not src: return messagebox.showwarning("提示", "请选择源文件")
+        try:
+            limit_w = float(self.tl_word_limit.get())
+            if limit_w <= 0: raise ValueError
+        except:
+            return messagebox.showerror("错误", "请输入有效的字数阈值")
+
+        threshold = int(limit_w * 10000)
+        strategy = self._tl_strategy_key()
+        alternatives = sorted({max(1, int(threshold * f)) for f in (0.5, 1.0, 1.5, 2.0)})
+        self.tl_log_msg(f"正在规划分卷 ({STRATEGIES[strategy]})...")
+
+        splitter = self._tl_splitter(CallbackManager(None, None, self.tl_log_msg))
+
+        def run():
+            ok, planner, plans = splitter.plan_by_word_count(src, alternatives, strategy)
+            if not ok: return self.tl_log_msg(f"❌ 规划失败: {planner}")
+            sizes = [planner.chars(s, e) for s, e in plans[threshold]]
+            self.tl_log_msg(f"📐 每 {limit_w} 万字 -> {len(sizes)} 卷: " +
+                            " ".join(f"{c / 10000:.1f}w" for c in sizes))
+            for t in alternatives:
+                n, lo, hi, last = planner.describe(plans[t])
+                self.tl_log_msg(f"   阈值 {t / 10000:g}w: {n} 卷 | 最小 {lo / 10000:.1f}w | "
+                                f"最大 {hi / 10000:.1f}w | 末卷 {last / 10000:.1f}w")
+
+        threading.Thread(target=run).start()
+
     def tl_run_split(self):
         src = self.tl_file.get()
         if not src: return messagebox.showwarning("提示", "请选择源文件")
@@ -462,7 +582,9 @@ class AppGUI:
             os.makedirs(tgt, exist_ok=True)
 
             self.tl_log_msg(f"正在执行字数分割 (阈值: {threshold}字)...")
-            threading.Thread(target=lambda: self._run_split_word(src, threshold, tgt)).start()
+            strategy = self._tl_strategy_key()
+            method = self._tl_count_method()
+            threading.Thread(target=lambda: self._run_split_word(src, threshold, tgt, strategy, method)).start()
 
     # [v3.7.1] 新增的线程包装函数，用于输出结束日志
     def _run_split_toc(self, src, sel, tgt):
@@ -470,7 +592,7 @@ class AppGUI:
         ok, msg = PDFSplitterEngine(cb).split_by_toc_indices(src, sel, tgt)
         self.tl_log_msg(f">>> {msg}")  # 输出总结
 
-    def _run_split_word(self, src, threshold, tgt):
+    def _run_split_word(self, src, threshold, tgt, strategy='greedy', count_method='extract'):
         cb = CallbackManager(None, None, self.tl_log_msg)
-        ok, msg = PDFSplitterEngine(cb).split_by_word_count(src, threshold, tgt)
+        ok, msg = PDFSplitterEngine(cb, count_method=count_method).split_by_word_count(src, threshold, tgt, strategy)
         self.tl_log_msg(f">>> {msg}")  # 输出总结
\ No newline at end of file
@@ -1,8 +1,11 @@
 # main.py
+import multiprocessing
 import tkinter as tk
 from gui.main_window import AppGUI
 
 if __name__ == "__main__":
+    # 渲染进程池需要：PyInstaller 打包后的子进程入口
+    multiprocessing.freeze_support()
     root = tk.Tk()
     # 尝试开启高DPI支持 (Windows)
     try:
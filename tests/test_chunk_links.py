@@ -0,0 +1,63 @@
+# tests/test_chunk_links.py
+# Description: 单文件分块渲染的回归测试：超大包裹元素切开后保留属性；跨分块的内部链接在拼接后仍然有效
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
+
+from core.html_cleaner import parse_body
+from core.html_slicer import body_blocks
+from core.merger import PDFMergerEngine, _dest_name
+
+PARAS = ''.join(f'<p>{c * 40}</p>' for c in 'abc')
+
+
+def test_oversized_wrapper_keeps_attributes():
+    body = parse_body(f'<html><body><div id="w" class="poem" xml:lang="zh">{PARAS}</div>尾</body></html>')
+    blocks = body_blocks(body, 100)
+    assert len(blocks) == 3 and blocks[-1] == '尾'
+    assert blocks[0].startswith('<div id="w" class="poem" xml:lang="zh"><p>aaaa')
+    assert blocks[1].startswith('<div class="poem" xml:lang="zh"><p>cccc')  # id 只保留在第一组
+    assert all(b.endswith('</div>') for b in blocks[:2])
+
+
+def test_small_wrapper_is_untouched():
+    body = parse_body(f'<html><body><div class="poem">{PARAS}</div></body></html>')
+    assert body_blocks(body, 10_000) == [f'<div class="poem">{PARAS}</div>']
+
+
+def _chunk(path, pages, link_to=None):
+    """两页以内的分块 PDF；link_to 模拟 WeasyPrint 写出的块内链接 (/Dest 为命名目标字符串)"""
+    writer = PdfWriter()
+    for _ in range(pages): writer.add_blank_page(595, 842)
+    if link_to:
+        writer.add_annotation(0, DictionaryObject({
+            NameObject('/Type'): NameObject('/Annot'),
+            NameObject('/Subtype'): NameObject('/Link'),
+            NameObject('/Rect'): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(10), NumberObject(10)]),
+            NameObject('/Dest'): _dest_name(link_to),
+        }))
+    writer.write(path)
+    return str(path)
+
+
+def test_stitch_restores_internal_links(tmp_path):
+    chunks = [_chunk(tmp_path / 'c0.pdf', 2, link_to='注释1'), _chunk(tmp_path / 'c1.pdf', 2)]
+    anchors = {'注释1': (1, 0, 0), 'far': (3, 100, 200)}
+    links = [(0, 'far', (10, 20, 110, 40)), (0, 'missing', (0, 0, 1, 1))]
+    out = tmp_path / 'book.pdf'
+    ok, msg = PDFMergerEngine().stitch(chunks, str(out), [(1, '第一章', 0), (1, '第二章', 2)],
+                                       anchors=anchors, links=links)
+    assert ok, msg
+
+    reader = PdfReader(out, strict=True)
+    assert len(reader.pages) == 4
+    dests = reader.named_destinations
+    assert reader.get_destination_page_number(dests['far']) == 3
+    assert float(dests['far'].left) == 75 and float(dests['far'].top) == 842 - 150
+    assert reader.get_destination_page_number(dests['注释1']) == 1
+
+    # 块内链接原样保留并指向重建的命名目标；跨块链接补上 /Link，目标不存在的链接不添加
+    annots = [a.get_object() for a in reader.pages[0]['/Annots']]
+    assert sorted(str(a['/Dest']) for a in annots) == ['far', '注释1']
+    far = next(a for a in annots if a['/Dest'] == 'far')
+    assert [float(v) for v in far['/Rect']] == [7.5, 842 - 30, 82.5, 842 - 15]
@@ -0,0 +1,31 @@
+# tests/test_html_cleaner.py
+# Description: core.html_cleaner 编码探测回归测试 (没有编码声明的中文章节不能按 Latin-1 解码)
+
+from core.html_cleaner import detect_encoding, inner_html, parse_body
+
+CHAPTER = '<html><body><p>中文测试</p><img src="a.jpg"/></body></html>'
+
+
+def test_chapter_without_declaration_is_utf8():
+    body = parse_body(CHAPTER.encode('utf-8'))
+    assert body.find('p').text == '中文测试'
+
+
+def test_xml_declaration_and_meta_charset():
+    xml = '<?xml version="1.0" encoding="GBK"?>' + CHAPTER
+    assert parse_body(xml.encode('gbk')).find('p').text == '中文测试'
+    meta = CHAPTER.replace('<body>', '<head><meta charset="gb18030"/></head><body>')
+    assert detect_encoding(meta.encode('gb18030')) == 'gb18030'
+    assert parse_body(meta.encode('gb18030')).find('p').text == '中文测试'
+
+
+def test_bom_str_and_unknown_encoding():
+    assert parse_body(b'\xef\xbb\xbf' + CHAPTER.encode('utf-8')).find('p').text == '中文测试'
+    assert parse_body(CHAPTER).find('p').text == '中文测试'
+    bogus = '<?xml version="1.0" encoding="x-bogus"?>' + CHAPTER
+    assert parse_body(bogus.encode('utf-8')).find('p').text == '中文测试'
+
+
+def test_rewrite_src():
+    body = parse_body(CHAPTER.encode('utf-8'), lambda src: 'file:///tmp/' + src)
+    assert 'file:///tmp/a.jpg' in inner_html(body)
@@ -0,0 +1,97 @@
+# tests/test_incremental_append.py
+# Description: PDFMergerEngine.append (PDF 增量更新) 回归测试：传统 xref 表与 xref 流两种底稿，
+#              检查页数、目录链 (/First /Last /Count /Next /Prev) 与严格模式重新解析
+
+import io
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DecodedStreamObject, NameObject, NumberObject
+
+from core.merger import PDFMergerEngine
+
+
+def _pdf(path, pages, outline=()):
+    """pages 页空白 PDF；outline 为 [(标题, 页码, [(子标题, 页码)])]"""
+    writer = PdfWriter()
+    for _ in range(pages): writer.add_blank_page(595, 842)
+    for title, page, children in outline:
+        parent = writer.add_outline_item(title, page)
+        for child, child_page in children: writer.add_outline_item(child, child_page, parent=parent)
+    writer.write(path)
+    return str(path)
+
+
+def _to_xref_stream(path):
+    """将 pypdf 写出的传统 xref 文件原样重写为 xref 流 (pypdf 本身不输出 xref 流)"""
+    reader = PdfReader(path)
+    size = int(reader.trailer['/Size'])
+    out = io.BytesIO()
+    out.write(b'%PDF-1.5\n')
+    rows = [b'\x00\x00\x00\x00\x00\xff\xff']
+    for num in range(1, size):
+        obj = reader.get_object(num)
+        if obj is None:
+            rows.append(b'\x00' * 7)
+            continue
+        rows.append(b'\x01' + out.tell().to_bytes(4, 'big') + b'\x00\x00')
+        out.write(b'%d 0 obj\n' % num)
+        obj.write_to_stream(out)
+        out.write(b'\nendobj\n')
+    offset = out.tell()
+    rows.append(b'\x01' + offset.to_bytes(4, 'big') + b'\x00\x00')
+    xref = DecodedStreamObject()
+    xref.set_data(b''.join(rows))
+    xref.update({
+        NameObject('/Type'): NameObject('/XRef'),
+        NameObject('/Size'): NumberObject(size + 1),
+        NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)]),
+        NameObject('/Root'): reader.trailer.raw_get('/Root'),
+    })
+    out.write(b'%d 0 obj\n' % size)
+    xref.write_to_stream(out)
+    out.write(b'\nendobj\nstartxref\n%d\n%%%%EOF\n' % offset)
+    with open(path, 'wb') as f: f.write(out.getvalue())
+
+
+def _top_level(root):
+    """沿 /First -> /Next 遍历一级目录项，同时核对 /Prev 反向链"""
+    items = []
+    node = root['/First']
+    while node is not None:
+        item = node.get_object()
+        if items: assert item['/Prev'].get_object() == items[-1]
+        items.append(item)
+        node = item.get('/Next')
+    return items
+
+
+@pytest.mark.parametrize('xref_stream', [False, True], ids=['xref-table', 'xref-stream'])
+def test_append_to_merged_pdf(tmp_path, xref_stream):
+    base = _pdf(tmp_path / 'base.pdf', 3, [('A', 0, []), ('B', 1, [('B1', 2)])])
+    if xref_stream: _to_xref_stream(base)
+    with open(base, 'rb') as f: original = f.read()
+    base_count = int(PdfReader(base).trailer['/Root']['/Outlines']['/Count'])
+    inputs = [_pdf(tmp_path / '01_卷一.pdf', 1), _pdf(tmp_path / '02_卷二.pdf', 2, [('sec', 1, [])])]
+
+    ok, msg = PDFMergerEngine().append(base, inputs)
+    assert ok, msg
+
+    with open(base, 'rb') as f: data = f.read()
+    assert data.startswith(original)  # 原内容不重写
+    tail = data[data.rindex(b'startxref'):].split()[1]
+    assert data[int(tail):].startswith(b'xref') != xref_stream
+
+    reader = PdfReader(base, strict=True)
+    assert len(reader.pages) == 6
+    root = reader.trailer['/Root']['/Outlines']
+    items = _top_level(root)
+    assert [str(i['/Title']) for i in items] == ['A', 'B', '卷一', '卷二']
+    assert root['/First'].get_object() == items[0]
+    assert root['/Last'].get_object() == items[-1] and '/Next' not in items[-1]
+    assert int(root['/Count']) == base_count + 3  # 两个新一级项 + 卷二下的 sec
+
+    vol2 = items[-1]
+    assert vol2['/First'].get_object()['/Title'] == 'sec' and int(vol2['/Count']) == 1
+    assert [reader.get_destination_page_number(o) for o in reader.outline if not isinstance(o, list)] == [0, 1, 3, 4]
+    assert reader.get_destination_page_number(reader.outline[-1][0]) == 5
@@ -0,0 +1,75 @@
+# tests/test_merge_dedupe.py
+# Description: 合并时的跨输入去重回归测试：各分卷重复嵌入的字体与图片只写出一次，所有页面仍可正常解析
+
+import pytest
+from pypdf import PdfReader
+
+from core.merger import PDFMergerEngine
+
+FONT_PROGRAM = bytes(range(256)) * 16
+IMAGE = bytes(range(64))
+
+
+def _volume(path, volume, pages):
+    """手工构造的分卷：每卷各自嵌入同一份字体程序与同一张图片 (对象号与其它卷相同，内容相同)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % (7 + 2 * i) for i in range(pages)), pages),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding /FontDescriptor 4 0 R >>",
+        b"<< /Type /FontDescriptor /FontName /Helvetica /Flags 32 /FontBBox [0 0 1000 1000] /ItalicAngle 0 "
+        b"/Ascent 718 /Descent -207 /CapHeight 718 /StemV 88 /FontFile3 5 0 R >>",
+        b"<< /Subtype /Type1C /Length %d >>\nstream\n%s\nendstream" % (len(FONT_PROGRAM), FONT_PROGRAM),
+        b"<< /Type /XObject /Subtype /Image /Width 8 /Height 8 /ColorSpace /DeviceGray /BitsPerComponent 8 "
+        b"/Length %d >>\nstream\n%s\nendstream" % (len(IMAGE), IMAGE),
+    ]
+    for i in range(pages):
+        content = b"q 80 0 0 80 72 600 cm /Im1 Do Q BT /F1 12 Tf 72 720 Td (Volume %d page %d) Tj ET" % (volume, i)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 6 0 R >> >> >>" % (8 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+
+    data = bytearray(b"%PDF-1.7\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f: f.write(data)
+    return str(path)
+
+
+def _objects(reader):
+    """xref 中登记的全部对象 (pypdf 去重后留下的空号不在其中)"""
+    return [reader.get_object(num) for entries in reader.xref.values() for num in entries if num]
+
+
+def _count(objects, key, value):
+    return sum(1 for obj in objects if hasattr(obj, 'get') and obj.get(key) == value)
+
+
+@pytest.mark.parametrize('streaming', [True, False], ids=['streaming', 'pypdf-writer'])
+@pytest.mark.parametrize('dedupe', [True, False], ids=['dedupe', 'no-dedupe'])
+def test_shared_fonts_and_images_written_once(tmp_path, streaming, dedupe):
+    volumes = [_volume(tmp_path / f"{v:02d}_卷{v}.pdf", v, 2) for v in range(1, 4)]
+    out = tmp_path / 'merged.pdf'
+    ok, msg = PDFMergerEngine(dedupe=dedupe).merge(volumes, str(out), None, streaming=streaming)
+    assert ok, msg
+
+    reader = PdfReader(out, strict=True)
+    objects = _objects(reader)
+    copies = 1 if dedupe else len(volumes)
+    assert _count(objects, '/Type', '/Font') == copies
+    assert _count(objects, '/Type', '/FontDescriptor') == copies
+    assert _count(objects, '/Subtype', '/Type1C') == copies
+    assert _count(objects, '/Subtype', '/Image') == copies
+
+    # 页面本身与各页内容流不参与合并：每页仍指向自己的文本，字体/图片引用可解析
+    assert len(reader.pages) == 6
+    for n, page in enumerate(reader.pages):
+        assert page.extract_text() == f"Volume {n // 2 + 1} page {n % 2}"
+        assert page['/Resources']['/XObject']['/Im1'].get_data() == IMAGE
+        assert page['/Resources']['/Font']['/F1']['/FontDescriptor']['/FontFile3'].get_data() == FONT_PROGRAM
+    assert [o.title for o in reader.outline if not isinstance(o, list)] == ['卷1', '卷2', '卷3']
@@ -0,0 +1,76 @@
+# tests/test_split_planner.py
+# Description: core.split_planner 回归测试：greedy 与 v3.7 逐页累加算法逐卷一致；nearest / balanced 的切割性质
+
+import random
+
+import pytest
+
+from core.split_planner import SplitPlanner
+
+# 含空白页 (插图、分隔页) 与超过阈值的单页
+PAGE_CHARS = [0, 812, 795, 1203, 0, 0, 640, 4100, 388, 901, 950, 12, 0, 777, 1500, 730, 690, 0, 845, 60]
+
+
+def _v37_cuts(page_chars, threshold):
+    """v3.7 PDFSplitterEngine.split_by_word_count 的切割循环 (去掉写文件部分)"""
+    cuts = []
+    start_page = 0
+    current = 0
+    for i in range(len(page_chars)):
+        current += page_chars[i]
+        if current >= threshold or i == len(page_chars) - 1:
+            cuts.append((start_page, i + 1))
+            start_page = i + 1
+            current = 0
+    return cuts
+
+
+@pytest.mark.parametrize('threshold', [1, 500, 1000, 2000, 3000, 5000, 100_000])
+def test_greedy_matches_v37(threshold):
+    assert SplitPlanner(PAGE_CHARS).plan(threshold) == _v37_cuts(PAGE_CHARS, threshold)
+
+
+def test_greedy_matches_v37_random():
+    rng = random.Random(37)
+    for _ in range(200):
+        pages = [rng.choice([0, rng.randint(1, 3000)]) for _ in range(rng.randint(1, 60))]
+        threshold = rng.randint(1, 8000)
+        assert SplitPlanner(pages).plan(threshold) == _v37_cuts(pages, threshold)
+
+
+def _assert_covers(plan, pages):
+    assert plan[0][0] == 0 and plan[-1][1] == pages
+    assert all(s < e for s, e in plan)
+    assert all(a[1] == b[0] for a, b in zip(plan, plan[1:]))
+
+
+@pytest.mark.parametrize('threshold', [500, 1000, 2000, 3000])
+def test_nearest_cuts_at_closest_boundary(threshold):
+    planner = SplitPlanner(PAGE_CHARS)
+    plan = planner.plan(threshold, 'nearest')
+    _assert_covers(plan, len(PAGE_CHARS))
+    for start, end in plan[:-1]:
+        target = planner.prefix[start] + threshold
+        # 每个切点都不比相邻的另一个页边界更远离目标
+        candidates = [e for e in (end - 1, end + 1) if start < e <= len(PAGE_CHARS)]
+        assert all(abs(planner.prefix[end] - target) <= abs(planner.prefix[e] - target) for e in candidates)
+
+
+@pytest.mark.parametrize('threshold', [1000, 2000, 3000, 7000])
+def test_balanced_volume_count_and_spread(threshold):
+    planner = SplitPlanner(PAGE_CHARS)
+    plan = planner.plan(threshold, 'balanced')
+    _assert_covers(plan, len(PAGE_CHARS))
+    assert len(plan) == max(1, round(planner.total / threshold))
+    # 没有 greedy 那样的小末卷：各卷与平均值的偏差不超过最大单页字数
+    mean = planner.total / len(plan)
+    assert all(abs(planner.chars(s, e) - mean) <= max(PAGE_CHARS) for s, e in plan)
+
+
+def test_edge_cases():
+    assert SplitPlanner([]).plan(1000) == []
+    assert SplitPlanner([0, 0, 0]).plan(1000, 'balanced') == [(0, 3)]
+    assert SplitPlanner([10] * 3).plan(1, 'balanced') == [(0, 1), (1, 2), (2, 3)]  # 卷数不超过页数
+    with pytest.raises(ValueError):
+        SplitPlanner(PAGE_CHARS).plan(1000, 'unknown')
+    assert SplitPlanner(PAGE_CHARS).describe([(0, 4), (4, 20)])[0] == 2
@@ -0,0 +1,110 @@
+# tests/test_text_index.py
+# Description: core.text_index 回归测试：索引按 PDF 内容哈希命中与失效
+
+import json
+import shutil
+
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from core import glyph_counter
+from core import text_index
+from core.text_index import PageTextIndex, pdf_hash
+
+PAGES = ["Hello world", "", "The quick brown fox", "jumps over the lazy dog", "42"]
+
+
+def _text_pdf(path, texts):
+    """每页一行 Helvetica 文本的 PDF"""
+    writer = PdfWriter()
+    for text in texts:
+        page = writer.add_blank_page(595, 842)
+        page[NameObject('/Resources')] = DictionaryObject({NameObject('/Font'): DictionaryObject({
+            NameObject('/F1'): DictionaryObject({
+                NameObject('/Type'): NameObject('/Font'),
+                NameObject('/Subtype'): NameObject('/Type1'),
+                NameObject('/BaseFont'): NameObject('/Helvetica'),
+            })})})
+        content = DecodedStreamObject()
+        content.set_data(b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode('latin-1'))
+        page.replace_contents(content)
+    writer.write(path)
+    return str(path)
+
+
+def _expected(texts):
+    return [len(''.join(t.split())) for t in texts]
+
+
+def _poison(index, pdf_path, field='chars'):
+    """改写索引条目中的字数：之后返回该值即说明命中了索引而没有重新提取"""
+    entry = index._entry(pdf_hash(pdf_path))
+    with open(entry, encoding='utf-8') as f: data = json.load(f)
+    data[field] = [-1] * len(data[field])
+    with open(entry, 'w', encoding='utf-8') as f: json.dump(data, f)
+    return data
+
+
+def test_index_hit_is_keyed_by_content(tmp_path):
+    pdf = _text_pdf(tmp_path / 'a.pdf', PAGES)
+    index = PageTextIndex(index_dir=str(tmp_path / 'idx'), workers=1)
+    assert index.page_chars(pdf) == _expected(PAGES)
+    _poison(index, pdf)
+
+    # 新实例 (无进程内哈希缓存)、同内容的另一路径均命中同一条目
+    copy = shutil.copy(pdf, tmp_path / 'b.pdf')
+    assert PageTextIndex(index_dir=str(tmp_path / 'idx'), workers=1).page_chars(pdf) == [-1] * len(PAGES)
+    assert index.page_chars(copy) == [-1] * len(PAGES)
+
+
+def test_index_invalidated_by_content_and_pypdf_version(tmp_path):
+    pdf = str(tmp_path / 'a.pdf')
+    index_dir = str(tmp_path / 'idx')
+    _text_pdf(pdf, PAGES)
+    PageTextIndex(index_dir=index_dir, workers=1).page_chars(pdf)
+    _poison(PageTextIndex(index_dir=index_dir), pdf)
+
+    # 内容变化 -> 哈希变化 -> 重新提取
+    changed = PAGES[:-1] + ["4242"]
+    _text_pdf(pdf, changed)
+    assert PageTextIndex(index_dir=index_dir, workers=1).page_chars(pdf) == _expected(changed)
+
+    # 条目记录的 pypdf 版本不符 -> 视为失效
+    index = PageTextIndex(index_dir=index_dir, workers=1)
+    data = _poison(index, pdf)
+    data['pypdf'] = '0.0.0'
+    with open(index._entry(pdf_hash(pdf)), 'w', encoding='utf-8') as f: json.dump(data, f)
+    assert index.page_chars(pdf) == _expected(changed)
+
+
+def test_glyph_and_extract_share_one_entry(tmp_path):
+    pdf = _text_pdf(tmp_path / 'a.pdf', PAGES)
+    index = PageTextIndex(index_dir=str(tmp_path / 'idx'), workers=1)
+    chars = index.page_chars(pdf)
+    glyphs = index.page_chars(pdf, method='glyph')
+    assert glyphs == chars
+    # 快速计数不可用时退回精确提取，结果与 extract 共用 chars 字段
+    fields = {'chars', 'glyphs'} if glyph_counter.AVAILABLE else {'chars'}
+    with open(index._entry(pdf_hash(pdf)), encoding='utf-8') as f:
+        assert set(json.load(f)) == fields | {'pypdf'}
+
+
+def test_parallel_extraction_matches_serial(tmp_path, monkeypatch):
+    texts = [f"Page {i} " + "lorem ipsum " * (i % 7) for i in range(23)]
+    pdf = _text_pdf(tmp_path / 'a.pdf', texts)
+    # 缩小分片，使 23 页分成 5 个乱序完成的分片
+    monkeypatch.setattr(text_index, 'TEXT_EXTRACT_MIN_PAGES', 1)
+    monkeypatch.setattr(text_index, 'TEXT_EXTRACT_SHARD_PAGES', 5)
+
+    for method in ('extract', 'glyph'):
+        serial = PageTextIndex(index_dir=str(tmp_path / f'serial-{method}'), store_text=True, workers=1)
+        parallel = PageTextIndex(index_dir=str(tmp_path / f'parallel-{method}'), store_text=True, workers=3)
+        progress = []
+        result = parallel.page_chars(pdf, method=method, progress=lambda done, total: progress.append(done))
+        assert result == serial.page_chars(pdf, method=method) == _expected(texts)
+        assert progress[0] == 0 and progress[-1] == len(texts) and len(progress) == 6
+
+    # 精确提取时保存的全文同样按页归位
+    extract_parallel = PageTextIndex(index_dir=str(tmp_path / 'parallel-extract'))
+    extract_serial = PageTextIndex(index_dir=str(tmp_path / 'serial-extract'))
+    assert extract_parallel.load(pdf, need_text=True)['text'] == extract_serial.load(pdf, need_text=True)['text']
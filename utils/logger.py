@@ -26,4 +26,39 @@ class CallbackManager:
         :param msg: 日志内容
         """
         if self.l:
-            self.l(msg)
\ No newline at end of file
+            self.l(msg)
+
+    def stage(self, name):
+        """
+        标记转换流水线进入新阶段 (read / extract / layout / write)
+        主界面无需处理；跨进程版本上报给调度器，用于阶段超时监控
+        """
+        pass
+
+    def span(self, record):
+        """
+        结构化计时记录 (见 utils.telemetry)
+        主界面无需处理；跨进程版本上报给调度器，用于追踪文件与剩余时间估算
+        """
+        pass
+
+class QueueCallbackManager(CallbackManager):
+    """
+    跨进程版本的回调管理器：子进程中的引擎把进度与日志投递到队列，由主进程转发给 GUI。
+    """
+    def __init__(self, queue, job_id):
+        super().__init__(None, None, None)
+        self.queue = queue
+        self.job_id = job_id
+
+    def update_progress(self, val, msg):
+        self.queue.put(('progress', self.job_id, val, msg))
+
+    def log(self, msg):
+        self.queue.put(('log', self.job_id, msg))
+
+    def stage(self, name):
+        self.queue.put(('stage', self.job_id, name))
+
+    def span(self, record):
+        self.queue.put(('span', self.job_id, record))
@@ -0,0 +1,52 @@
+# utils/memory.py
+import threading
+
+import psutil
+
+
+def process_tree_rss_mb(pid):
+    """进程及其全部子进程 (渲染池) 的 RSS 总和，单位 MB；进程不存在时返回 0"""
+    try:
+        proc = psutil.Process(pid)
+        rss = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss / (1024 * 1024)
+    except psutil.Error:
+        return 0.0
+
+
+class PeakRssSampler:
+    """
+    后台线程定时采样进程树 RSS，记录峰值。
+    用法: with PeakRssSampler(pid) as s: ...;  s.peak_mb
+    """
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self.peak_mb = max(self.peak_mb, process_tree_rss_mb(self.pid))
+        return self.peak_mb
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        return False
@@ -0,0 +1,132 @@
+# utils/telemetry.py
+# Version: v3.8.0_Telemetry
+# Last Updated: 2026-10-17
+# Description: 结构化阶段计时。转换/合并/分割引擎以 span 事件 (阶段、书名、章节、耗时、字节、页数、RSS) 通过 CallbackManager 上报，
+#              可选写入每个批次一个的 JSONL 追踪文件。
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.memory import process_tree_rss_mb
+
+STAGE_NAMES = {
+    'book': '整本', 'features': '特征', 'read': '读取', 'extract': '解析', 'layout': '排版',
+    'write': '写出', 'stitch': '拼接', 'merge': '合并', 'scan': '扫描', 'split': '分割', 'preflight': '预检',
+}
+RSS_SAMPLE_INTERVAL_S = 0.1
+RSS_SAMPLER_LINGER_S = 2.0  # 没有进行中的 span 超过此时长后采样线程退出 (连续的分卷/分块共用一个线程)
+
+
+class Telemetry:
+    """
+    span 计时器，一个引擎实例一个。
+    - span(stage, ...)：上下文管理器，返回记录字典，调用方可在块内补充 bytes_out / pages 等字段。
+    - emit(stage, duration_s, ...)：登记在别处计时的 span (如渲染池子进程回传的章节耗时)。
+    - summary()：各阶段累计耗时的一行摘要 ('book' 为外层 span，不计入)。
+    峰值 RSS：一个实例共用一个后台采样线程，每 RSS_SAMPLE_INTERVAL_S 采样一次进程树，
+    同时更新所有进行中 (含嵌套) 的 span；span 开始与结束时各补采一次，短于采样间隔的 span 也有读数。
+    """
+
+    def __init__(self, cb=None, book=""):
+        self.cb = cb
+        self.book = book
+        self.totals = {}  # stage -> 累计秒数
+        self._open = []  # 进行中的 span 记录
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    @contextmanager
+    def span(self, stage, chapter=None, **fields):
+        rec = self._record(stage, chapter, fields)
+        self._track(rec)
+        start = time.perf_counter()
+        try:
+            yield rec
+        except BaseException as e:
+            rec['error'] = type(e).__name__
+            raise
+        finally:
+            rec['duration_s'] = round(time.perf_counter() - start, 4)
+            self._untrack(rec)
+            rec['peak_rss_mb'] = round(rec['peak_rss_mb'], 1)
+            self._publish(rec)
+
+    # --- 峰值 RSS 采样 ---
+    def _track(self, rec):
+        rec['peak_rss_mb'] = process_tree_rss_mb(os.getpid())
+        with self._lock:
+            self._open.append(rec)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+                self._sampler.start()
+
+    def _untrack(self, rec):
+        rss = process_tree_rss_mb(os.getpid())
+        with self._lock:
+            self._open.remove(rec)
+        rec['peak_rss_mb'] = max(rec['peak_rss_mb'], rss)
+
+    def _sample_loop(self):
+        idle_since = None
+        while True:
+            time.sleep(RSS_SAMPLE_INTERVAL_S)
+            with self._lock:
+                recs = list(self._open)
+                if not recs:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since > RSS_SAMPLER_LINGER_S:
+                        self._sampler = None
+                        return
+                    continue
+            idle_since = None
+            rss = process_tree_rss_mb(os.getpid())
+            for rec in recs:
+                rec['peak_rss_mb'] = max(rec['peak_rss_mb'], rss)
+
+    def emit(self, stage, duration_s, chapter=None, **fields):
+        rec = self._record(stage, chapter, fields)
+        rec['duration_s'] = round(duration_s, 4)
+        self._publish(rec)
+
+    def summary(self):
+        parts = [f"{STAGE_NAMES.get(stage, stage)} {secs:.1f}s"
+                 for stage, secs in self.totals.items() if stage != 'book']
+        return "⏱ 阶段耗时: " + " | ".join(parts) if parts else ""
+
+    def _record(self, stage, chapter, fields):
+        rec = {'stage': stage, 'book': self.book, 'chapter': chapter,
+               'bytes_in': 0, 'bytes_out': 0, 'pages': 0, 'peak_rss_mb': 0.0}
+        rec.update(fields)
+        return rec
+
+    def _publish(self, rec):
+        rec['ts'] = round(time.time(), 3)
+        self.totals[rec['stage']] = self.totals.get(rec['stage'], 0.0) + rec['duration_s']
+        if self.cb: self.cb.span(rec)
+
+
+class TraceWriter:
+    """批次追踪文件：每个 span 一行 JSON，逐行刷新，进程崩溃时已写入的记录不丢失"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, rec):
+        self.file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def file_size(path):
+    """文件字节数；不存在时为 0"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0